@@ -11,12 +11,19 @@ class Settings(BaseSettings):
     # API Keys
     deepgram_api_key: str = os.getenv("DEEPGRAM_API_KEY", "")
     openai_api_key: str = os.getenv("OPENAI_API_KEY", "")
+    # API endpoints; empty uses the providers' own (set for proxies or local stubs)
+    deepgram_url: str = ""
+    openai_base_url: str = ""
     
     # Redis Configuration
     redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379")
+    # "memory" for a single worker, "redis" to share rooms and captions across workers
+    room_backend: str = os.getenv("ROOM_BACKEND", "memory")
     
     # Application Settings
     debug: bool = os.getenv("DEBUG", "True").lower() == "true"
+    # Restart on code changes when run with `python -m app.main`; follows DEBUG unless set
+    reload: bool = os.getenv("RELOAD", os.getenv("DEBUG", "True")).lower() == "true"
     host: str = os.getenv("HOST", "0.0.0.0")
     # Cloud Run sets PORT automatically, so we need to use it
     port: int = int(os.getenv("PORT", "8000"))
@@ -24,17 +31,83 @@ class Settings(BaseSettings):
     # Translation Settings
     source_language: str = "ko"  # Default source language (Korean)
     target_language: str = "en"  # Default target language (English)
+    max_languages_per_room: int = 8  # Distinct target languages translated per room
     
     # WebSocket Settings
     ws_heartbeat_interval: int = 30  # seconds
+    ws_heartbeat_timeout: int = 15  # Seconds a viewer has to answer a ping before it's closed
+    # uvicorn's own ping frames run a keepalive task per socket; 0 leaves liveness to the heartbeat
+    ws_protocol_ping_interval: float = 0.0
+    ws_protocol_ping_timeout: float = 20.0  # Seconds to wait for a pong when protocol pings are on
+    fanout_queue_size: int = 64  # Frames a viewer may fall behind before the slow policy applies
+    fanout_slow_policy: str = "coalesce"  # "coalesce" (skip to latest) or "disconnect"
+    caption_history_size: int = 200  # Captions kept per room for reconnecting viewers
+    # Compress WebSocket frames when the client offers permessage-deflate
+    ws_per_message_deflate: bool = os.getenv("WS_PER_MESSAGE_DEFLATE", "True").lower() == "true"
     
     # STT Settings
     sample_rate: int = 16000
     channels: int = 1
     encoding: str = "linear16"
+    stt_interim_results: bool = True  # Send interim hypotheses to viewers as caption_partial
+    stt_max_buffered_chunks: int = 50  # Audio chunks buffered per session before new ones are dropped
+    stt_provider: str = "deepgram"  # "deepgram", "local" (CPU engine in worker processes) or "replay"
+    local_stt_engine: str = "whisper"  # "whisper" (faster-whisper) or "vosk"
+    local_stt_model: str = "small"  # faster-whisper model size or path, or Vosk model directory
+    local_stt_workers: int = 1  # Engine processes; each holds a copy of the model
+    local_stt_compute_type: str = "int8"  # faster-whisper weight precision on CPU
+    local_stt_threads: int = 0  # CPU threads per engine process (0 lets the engine decide)
+    local_stt_step: float = 1.0  # Seconds of new audio between interim decodes (whisper)
+    stt_replay_path: str = ""  # Script of transcripts played by the "replay" provider
     
     # Model Settings
     openai_model: str = "gpt-4o"
+    stream_translations: bool = True  # Push translations to viewers as they are generated
+    translation_stream_interval: float = 0.1  # Minimum seconds between streamed updates per caption
+    translation_max_in_flight: int = 3  # Concurrent translations per room (captions stay in order)
+    broadcast_drain_timeout: float = 5.0  # Seconds to finish a room's last captions after its broadcaster leaves
+    translation_context_size: int = 4  # Recent source/translation pairs sent as context
+    translation_provider: str = "openai"  # "openai" or "local"; broadcasters can pick per room with ?translation=
+    translation_fallback: str = ""  # "local" to translate locally when OpenAI fails or is slow
+    translation_fallback_timeout: float = 3.0  # Seconds to wait for OpenAI (its first token when streaming)
+    local_translation_models: str = ""  # CTranslate2 model per pair, e.g. "ko-en=/models/opus-mt-ko-en,*=/models/nllb"
+    local_translation_workers: int = 1  # Engine processes; each holds every model
+    local_translation_threads: int = 0  # CPU threads per engine process (0 lets CTranslate2 decide)
+    local_translation_max_batch: int = 16  # Most segments translated in one batch
+    
+    # Segmentation Settings
+    segment_max_delay: float = 0.8  # Seconds to hold fragments waiting for a sentence boundary
+    segment_max_chars: int = 200  # Flush merged fragments at this length
+    
+    # Translation Cache Settings
+    translation_cache_size: int = 10000  # Entries kept in memory
+    translation_cache_ttl: int = 7 * 24 * 3600  # seconds
+    translation_cache_path: str = os.getenv("TRANSLATION_CACHE_PATH", "")  # SQLite file; empty keeps the cache in memory
+    
+    # Transcript Journal Settings
+    journal_dir: str = os.getenv("JOURNAL_DIR", "")  # Directory for per-room transcript journals; empty disables them
+    journal_max_segment_bytes: int = 16 * 1024 * 1024  # Start a new journal file after this size
+    journal_max_segment_age: float = 3600.0  # ...or after this many seconds
+    journal_flush_interval: float = 1.0  # Seconds between buffered journal writes
+    
+    # Segmented WebVTT Settings
+    vtt_segment_duration: float = 6.0  # Seconds of captions per segment
+    vtt_window_segments: int = 10  # Segments listed in each rolling playlist
+    vtt_languages: str = os.getenv("VTT_LANGUAGES", "")  # Comma-separated languages always translated for VTT output
+    
+    # Page and Static Asset Settings
+    page_cache_size: int = 512  # Rendered pages kept in memory
+    page_max_age: int = 0  # Seconds browsers/CDNs may reuse a page without revalidating
+    
+    # Metrics Settings
+    metrics_enabled: bool = True  # Serve Prometheus metrics at /metrics
+    trace_receipt_sample: int = 16  # Ask one in this many viewers for display receipts (0 = none)
+    trace_receipt_window: int = 256  # Glass-to-glass samples kept per room for /debug/rooms
+    
+    # Logging Settings
+    log_level: str = "INFO"  # Level for the app's loggers
+    log_levels: str = ""  # Per-module overrides, e.g. "app.services.stt=DEBUG,app.routes.viewer=WARNING"
+    log_format: str = "text"  # "text", or "json" for Cloud Logging
     
     class Config:
         env_file = ".env"
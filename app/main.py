@@ -1,14 +1,18 @@
 from fastapi import FastAPI, Request
-from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 import os
 from pathlib import Path
+import asyncio
 from app.middleware import add_https_middleware
 
 from app.config import settings
-from app.routes import broadcast, viewer, pages
+from app.utils.log import setup_logging, shutdown_logging
+from app.routes import broadcast, viewer, pages, sse, vtt, export, assets, metrics
+
+# Log through a queue so writes happen off the event loop
+setup_logging(settings.log_level, settings.log_levels, settings.log_format)
 
 # Create FastAPI app
 app = FastAPI(
@@ -19,9 +23,6 @@ app = FastAPI(
     redoc_url="/redoc" if settings.debug else None,
 )
 
-# Mount static files
-app.mount("/static", StaticFiles(directory=Path(__file__).parent.parent / "static"), name="static")
-
 # Set up templates
 templates = Jinja2Templates(directory=Path(__file__).parent.parent / "templates")
 
@@ -40,28 +41,58 @@ app.add_middleware(
 
 # Include routers
 app.include_router(pages.router)
+app.include_router(assets.router)
 app.include_router(broadcast.router)
 app.include_router(viewer.router)
+app.include_router(sse.router)
+app.include_router(vtt.router)
+app.include_router(export.router)
+app.include_router(metrics.router)
 
 # Add HTTPS middleware to ensure all URLs use HTTPS
 add_https_middleware(app)
 
+# Background task sampling event loop lag for /metrics
+loop_lag_task = None
+
 # Startup event
 @app.on_event("startup")
 async def startup_event():
-    # Initialize services if needed
-    pass
+    global loop_lag_task
+    # Load and compress static files before the first page links to them
+    from app.utils import get_static_assets
+    get_static_assets()
+    
+    from app.services.metrics import watch_loop_lag
+    loop_lag_task = asyncio.create_task(watch_loop_lag())
 
 # Shutdown event
 @app.on_event("shutdown")
 async def shutdown_event():
-    # Clean up resources if needed
-    pass
+    # Disconnect from the room backend, stop the heartbeat and STT/translation workers, close the translation cache, and write out buffered journal records
+    from app.utils import get_broadcast_service, get_heartbeat_manager, get_journal, get_stt_service, get_local_translation_service, get_translation_cache
+    if loop_lag_task is not None:
+        loop_lag_task.cancel()
+    await get_broadcast_service().close()
+    await get_heartbeat_manager().close()
+    if get_stt_service.cache_info().currsize:
+        await get_stt_service().close()
+    if get_local_translation_service.cache_info().currsize:
+        await get_local_translation_service().close()
+    if get_translation_cache.cache_info().currsize:
+        get_translation_cache().close()
+    journal = get_journal()
+    if journal is not None:
+        await journal.close()
+    shutdown_logging()
 
 if __name__ == "__main__":
     uvicorn.run(
         "app.main:app",
         host=settings.host,
         port=settings.port,
-        reload=settings.debug,
+        reload=settings.reload,
+        ws_per_message_deflate=settings.ws_per_message_deflate,
+        ws_ping_interval=settings.ws_protocol_ping_interval or None,
+        ws_ping_timeout=settings.ws_protocol_ping_timeout,
     )
@@ -1,48 +1,67 @@
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response, HTMLResponse
+from starlette.types import ASGIApp, Scope, Receive, Send
 from fastapi import FastAPI
+from typing import Optional
 import os
-import re
 
 # Check if we're running in Cloud Run
 def is_cloud_run():
     return os.environ.get("K_SERVICE") is not None
 
-class HTTPSRedirectMiddleware(BaseHTTPMiddleware):
-    """Middleware to ensure all URLs are using HTTPS in Cloud Run"""
-    
-    async def dispatch(self, request: Request, call_next):
-        # Set the scheme to HTTPS if we're in Cloud Run
-        if is_cloud_run() and request.url.scheme == "http":
-            request.scope["scheme"] = "https"
-        
-        response = await call_next(request)
-        
-        # Only process HTML responses in Cloud Run
-        if is_cloud_run() and isinstance(response, HTMLResponse):
-            # Get the response body
-            body = b""
-            async for chunk in response.body_iterator:
-                body += chunk
-            
-            # Decode the body
-            body_str = body.decode("utf-8")
-            
-            # Replace http:// URLs with https:// for static resources
-            # This regex looks for http:// URLs that are part of src or href attributes
-            body_str = re.sub(r'(src|href)=(["\'])http://', r'\1=\2https://', body_str)
-            
-            # Create a new response with the modified body
-            response = Response(
-                content=body_str,
-                status_code=response.status_code,
-                headers=dict(response.headers),
-                media_type=response.media_type
-            )
-        
-        return response
+def forwarded_proto(headers) -> Optional[str]:
+    """Client-facing scheme from X-Forwarded-Proto or Forwarded, if present.
+
+    Args:
+        headers: Raw ASGI header pairs
+
+    Returns:
+        "http" or "https", or None if no proxy header says
+    """
+    for name, value in headers:
+        if name == b"x-forwarded-proto":
+            # The first entry was set by the proxy nearest the client
+            proto = value.split(b",")[0].strip().lower()
+        elif name == b"forwarded":
+            proto = None
+            for pair in value.split(b",")[0].split(b";"):
+                key, _, param = pair.strip().partition(b"=")
+                if key.lower() == b"proto":
+                    proto = param.strip(b'"').lower()
+        else:
+            continue
+        if proto in (b"http", b"https"):
+            return proto.decode()
+    return None
+
+class HTTPSSchemeMiddleware:
+    """Pure ASGI middleware that sets the request scheme the client actually used.
+
+    Behind Cloud Run (or any TLS-terminating proxy) the app sees plain
+    http; rewriting the scope's scheme from the forwarded headers makes
+    url_for() and request.url produce https/wss URLs in the first place,
+    so responses pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp, default_https: Optional[bool] = None):
+        """Initialize the middleware.
+
+        Args:
+            app: Wrapped ASGI app
+            default_https: Assume https when no forwarded header is present;
+                defaults to whether we're running in Cloud Run
+        """
+        self.app = app
+        self.default_https = is_cloud_run() if default_https is None else default_https
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] in ("http", "websocket"):
+            proto = forwarded_proto(scope["headers"])
+            secure = proto == "https" or (proto is None and self.default_https)
+            if secure:
+                scheme = "https" if scope["type"] == "http" else "wss"
+                if scope.get("scheme") != scheme:
+                    scope = dict(scope, scheme=scheme)
+        await self.app(scope, receive, send)
 
 def add_https_middleware(app: FastAPI):
-    """Add the HTTPS redirect middleware to the FastAPI app"""
-    app.add_middleware(HTTPSRedirectMiddleware)
+    """Add the HTTPS scheme middleware to the FastAPI app"""
+    app.add_middleware(HTTPSSchemeMiddleware)
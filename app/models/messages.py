@@ -16,6 +16,36 @@ class CaptionMessage(BaseModel):
     ts: float = Field(default_factory=time.time, description="Timestamp")
     original: str = Field(..., description="Original text in source language")
     translation: str = Field(..., description="Translated text in target language")
+    language: Optional[str] = Field(None, description="Target language code of the translation")
+    segment_id: Optional[int] = Field(None, description="Segment this caption finalizes")
+    segment_ids: List[int] = Field(default_factory=list, description="STT segments merged into this caption")
+    seq: Optional[int] = Field(None, description="Per-room caption sequence number")
+    trace: List[int] = Field(
+        default_factory=list,
+        description="Stage times: audio end as epoch ms, then ms after it for STT final, translation start, translation end and fan-out"
+    )
+
+class CaptionPartialMessage(BaseModel):
+    """Interim caption revised in place until its segment is finalized."""
+    type: str = Field("caption_partial", description="Message type")
+    segment_id: int = Field(..., description="Segment being revised")
+    original: str = Field(..., description="Interim text in source language")
+
+class CaptionStreamMessage(BaseModel):
+    """Translation in progress; replaced by a caption with the same segment ID."""
+    type: str = Field("caption_stream", description="Message type")
+    segment_id: Optional[int] = Field(None, description="Segment being translated")
+    language: str = Field(..., description="Target language code of the translation")
+    original: str = Field(..., description="Original text in source language")
+    translation: str = Field(..., description="Translated text produced so far")
+    seq: Optional[int] = Field(None, description="Per-room caption sequence number")
+
+class CaptionHistoryMessage(BaseModel):
+    """Captions a reconnecting viewer missed, sent once before live delivery."""
+    type: str = Field("caption_history", description="Message type")
+    since: int = Field(..., description="Sequence number the viewer resumed after")
+    captions: List[CaptionMessage] = Field(default_factory=list, description="Missed captions, oldest first")
+    truncated: bool = Field(False, description="Whether older missed captions had already been dropped")
 
 class ConnectionMessage(BaseModel):
     """Connection status message."""
@@ -26,10 +56,11 @@ class ConnectionMessage(BaseModel):
 class LanguageCommand(BaseModel):
     """Command to change language settings."""
     type: str = Field("set_language", description="Command type")
-    language: str = Field(..., description="Target language code")
+    language: str = Field(..., min_length=2, max_length=16, description="Target language code")
 
 class TranscriptData(BaseModel):
     """Data from speech-to-text service."""
     text: str = Field(..., description="Transcribed text")
     is_final: bool = Field(..., description="Whether this is a final transcript")
     confidence: float = Field(default=0.0, description="Confidence score")
+    segment_id: int = Field(default=0, description="Segment ID shared by interim and final results")
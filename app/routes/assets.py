@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import Response
+
+from app.services.assets import StaticAssets
+from app.utils import get_static_assets
+
+router = APIRouter(tags=["assets"])
+
+# Fingerprinted URLs change whenever the file does
+FINGERPRINTED_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Plain URLs can change on deploy; let caches keep them but revalidate
+PLAIN_CACHE_CONTROL = "public, no-cache"
+
+@router.get("/static/{path:path}", name="static")
+async def static_file(
+    request: Request,
+    path: str,
+    assets: StaticAssets = Depends(get_static_assets),
+):
+    """Static file from memory, precompressed, with long-lived caching for fingerprinted URLs."""
+    asset, fingerprinted = assets.get(path)
+    if asset is None:
+        return Response(status_code=404, headers={"Cache-Control": "no-store"})
+    return asset.response(request, FINGERPRINTED_CACHE_CONTROL if fingerprinted else PLAIN_CACHE_CONTROL)
@@ -2,45 +2,74 @@ from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, De
 from starlette.websockets import WebSocketState
 import json
 import asyncio
+import logging
+import time
 import uuid
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional, Tuple
 
 from app.config import settings
-from app.services.stt import DeepgramSTTService
-from app.services.translation import OpenAITranslationService
+from app.services.stt import STTService
+from app.services.translation import TranslationService, TranslationContext, TRANSLATION_ERROR_PREFIX
+from app.services.segmenter import Segmenter
+from app.services.scheduler import TranslationScheduler
 from app.services.broadcast import BroadcastService
-from app.utils import get_stt_service, get_translation_service, get_broadcast_service
+from app.services.vtt import VttService
+from app.services.journal import TranscriptJournal
+from app.services.trace import DeliveryTracker, encode_trace
+from app.services import metrics
+from app.utils import get_stt_service, get_translation_service, get_room_translation_service, get_broadcast_service, get_vtt_service, get_journal, get_delivery_tracker
+from app.utils.log import RateLimitedLog
 from app.utils.state import active_rooms
 
 router = APIRouter(tags=["broadcast"])
 
+logger = logging.getLogger(__name__)
+
+# Audio arrives many times a second; log it at most every few seconds per room
+_audio_log = RateLimitedLog(logger)
+
 @router.get("/debug/rooms")
-async def debug_rooms():
+async def debug_rooms(
+    broadcast_service: BroadcastService = Depends(get_broadcast_service),
+    translation_service: TranslationService = Depends(get_translation_service),
+    delivery_tracker: DeliveryTracker = Depends(get_delivery_tracker),
+):
     """Debug endpoint to view active rooms."""
     room_info = {}
     
-    for room_id, room_data in active_rooms.items():
+    # Rooms registered by any worker; local details where this worker has them
+    rooms = await broadcast_service.backend.list_rooms()
+    for room_id in set(rooms) | set(active_rooms):
+        room_data = active_rooms.get(room_id, {})
         room_info[room_id] = {
             "has_broadcaster": "broadcaster" in room_data,
             "viewer_count": len(room_data.get("viewers", set())),
-            "language": room_data.get("language", "unknown")
+            "language": room_data.get("language") or rooms.get(room_id, {}).get("language", "unknown"),
+            "target_languages": await broadcast_service.active_languages(room_id),
+            "translation": room_data["scheduler"].stats() if "scheduler" in room_data else None,
+            "translation_engine": room_data.get("translation_engine"),
+            "glass_to_glass": delivery_tracker.stats(room_id)
         }
     
     return {
         "active_rooms": room_info,
-        "total_rooms": len(active_rooms)
+        "total_rooms": len(room_info),
+        "translation_cache": translation_service.cache.stats() if translation_service.cache else None
     }
 
 @router.websocket("/ws/stream/{room_id}")
 async def websocket_stream(
     websocket: WebSocket,
     room_id: str,
-    stt_service: DeepgramSTTService = Depends(get_stt_service),
-    translation_service: OpenAITranslationService = Depends(get_translation_service),
+    stt_service: STTService = Depends(get_stt_service),
+    translation_service: TranslationService = Depends(get_translation_service),
     broadcast_service: BroadcastService = Depends(get_broadcast_service),
+    vtt_service: VttService = Depends(get_vtt_service),
+    journal: Optional[TranscriptJournal] = Depends(get_journal),
+    delivery_tracker: DeliveryTracker = Depends(get_delivery_tracker),
 ):
     await websocket.accept()
-    print("INFO:     connection open")
+    logger.info("Broadcaster connected", extra={"room": room_id})
     
     # Initialize room if it doesn't exist
     if room_id not in active_rooms:
@@ -49,129 +78,368 @@ async def websocket_stream(
             "viewers": set(),
             "language": "ko-KR"  # Default language
         }
-        print(f"Created new room: {room_id}")
+        logger.info("Created new room", extra={"room": room_id})
     else:
         # Update broadcaster websocket
         active_rooms[room_id]["broadcaster"] = websocket
-        print(f"Updated broadcaster for room: {room_id}")
+        logger.info("Updated broadcaster for room", extra={"room": room_id})
+    
+    # Broadcasters can choose the room's translation engine, e.g. ?translation=local
+    requested_engine = websocket.query_params.get("translation")
+    if requested_engine:
+        try:
+            translation_service = get_room_translation_service(requested_engine)
+        except ValueError as e:
+            logger.warning("Using the default translation engine: %s", e, extra={"room": room_id})
+    active_rooms[room_id]["translation_engine"] = translation_service.name
+    
+    # Make the room visible to viewers connected to other workers; the owner
+    # token keeps this broadcast's teardown from removing a newer one's room
+    broadcast_owner = uuid.uuid4().hex
+    await broadcast_service.backend.register_room(room_id, {
+        "language": active_rooms[room_id].get("language", "ko-KR"),
+        "owner": broadcast_owner
+    })
+    
+    # Captions are echoed back to the broadcaster like any other viewer
+    broadcaster_channel = await broadcast_service.subscribe(room_id, websocket, settings.target_language)
     
     # Initialize STT session
     session_id = None
     
-    # Create a simple event-based approach
-    async def on_transcript(transcript: Dict[str, Any]):
-        """Handle transcript from Deepgram."""
-        try:
-            print(f"Received transcript: {transcript}")
-            # Process the transcript directly
-            text = transcript.get('text', '')
-            if not text.strip():
-                print("Empty transcript, ignoring")
-                return
-                
-            print(f"Processing transcript text: '{text}'")
-            
-            # Translate the text
-            print(f"Translating text from {settings.source_language} to {settings.target_language}")
+    # Pipeline queues: final segments -> translation -> fan-out
+    final_queue: asyncio.Queue = asyncio.Queue()
+    caption_queue: asyncio.Queue = asyncio.Queue()
+    
+    # Fragments are merged into sentences; each language keeps recent pairs as context
+    segmenter = Segmenter(settings.segment_max_delay, settings.segment_max_chars)
+    contexts: Dict[str, TranslationContext] = {}
+    
+    # Captions are also cut into cacheable WebVTT segments for CDN delivery
+    vtt_languages = [l.strip() for l in settings.vtt_languages.split(",") if l.strip()]
+    vtt_epoch = vtt_service.start_room(room_id, asyncio.get_event_loop().time())
+    
+    async def translate_caption(segment: Dict[str, Any], language: str) -> Tuple[str, Dict[str, Any]]:
+        """Translate a merged segment into a caption for one target language."""
+        text = segment["text"]
+        segment_id = segment.get("segment_id")
+        context = contexts.setdefault(language, TranslationContext(settings.translation_context_size))
+        translate_start = time.time()
+        if settings.stream_translations:
+            translated = await stream_caption(text, language, segment, context)
+        else:
             translated = await translation_service.translate(
                 text, 
                 settings.source_language, 
-                settings.target_language
+                language,
+                context
             )
-            print(f"Translation result: '{translated}'")
-            
-            # Debug room state
-            print(f"Room state before broadcast: {active_rooms.get(room_id, {})}")
-            print(f"Number of viewers: {len(active_rooms.get(room_id, {}).get('viewers', set()))}")
-            
-            # Prepare message
-            message = {
-                "type": "caption",
-                "ts": asyncio.get_event_loop().time(),
-                "original": text,
-                "translation": translated
-            }
-            print(f"Broadcasting message: {message}")
+        return language, {
+            "type": "caption",
+            "ts": asyncio.get_event_loop().time(),
+            "original": text,
+            "translation": translated,
+            "language": language,
+            "segment_id": segment_id,
+            "segment_ids": segment.get("segment_ids", []),
+            "seq": segment.get("seq"),
+            # Stage wall times so far; deliver_captions adds fan-out and encodes them
+            "trace": [
+                segment.get("audio_end") or segment.get("stt_at") or segment["final_at"],
+                segment.get("stt_at") or segment["final_at"],
+                translate_start,
+                time.time()
+            ]
+        }
+    
+    async def stream_caption(text: str, language: str, segment: Dict[str, Any], context: TranslationContext) -> str:
+        """Push the translation to viewers as it is generated; return the full text.
+        
+        Only the segment next in line streams, so in-progress text never
+        lands ahead of an earlier caption that is still translating.
+        """
+        loop = asyncio.get_event_loop()
+        translated = ""
+        last_sent = 0.0
+        async for delta in translation_service.translate_stream(
+            text, 
+            settings.source_language, 
+            language,
+            context
+        ):
+            translated += delta
             
-            # Broadcast the original and translated text
-            await broadcast_service.broadcast_to_room(
-                room_id=room_id,
-                message=message
-            )
-            print(f"Broadcast complete for room: {room_id}")
+            # Send the text so far, throttled so long outputs don't flood viewers
+            now = loop.time()
+            if now - last_sent >= settings.translation_stream_interval and scheduler.is_next(segment["seq"]):
+                last_sent = now
+                caption_queue.put_nowait((language, {
+                    "type": "caption_stream",
+                    "original": text,
+                    "translation": translated,
+                    "language": language,
+                    "segment_id": segment.get("segment_id"),
+                    "seq": segment["seq"]
+                }))
+        return translated.strip()
+    
+    async def on_transcript(segment: Dict[str, Any]) -> List[Tuple[str, Dict[str, Any]]]:
+        """Translate a merged segment into one caption per watched language."""
+        try:
+            if not segment.get('text', '').strip():
+                return []
             
-            # Debug check if message was sent
-            if room_id in active_rooms and "viewers" in active_rooms[room_id]:
-                print(f"Message should have been sent to {len(active_rooms[room_id]['viewers'])} viewers")
-            else:
-                print("No viewers to receive the message")
+            # Translate once per distinct language that currently has subscribers,
+            # plus any always published as WebVTT
+            languages = await broadcast_service.active_languages(room_id)
+            languages += [
+                language for language in vtt_languages
+                if language not in languages
+            ]
+            for language in list(contexts):
+                if language not in languages:
+                    del contexts[language]
+            captions = await asyncio.gather(*(
+                translate_caption(segment, language)
+                for language in languages
+            ))
+            segment["translated_at"] = time.time()
+            return captions
                 
-        except Exception as e:
-            print(f"Error handling transcript: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error handling transcript", extra={"room": room_id, "seq": segment.get("seq")})
+            return []
     
-    try:
-        # Create STT session with Deepgram
-        session_id = await stt_service.create_connection(on_transcript)
-        print(f"Created STT session: {session_id}")
-        
-        # Process incoming audio data
+    async def receive_audio():
+        """Read audio from the broadcaster socket and forward it to STT."""
         while True:
             try:
-                # Check for pending transcripts
-                session_data = stt_service.active_sessions.get(session_id, {})
-                pending_transcripts = session_data.get("pending_transcripts", [])
-                
-                if pending_transcripts:
-                    # Get the first transcript
-                    transcript = pending_transcripts.pop(0)
-                    print(f"Processing pending transcript: {transcript}")
-                    
-                    # Process the transcript
-                    await on_transcript(transcript)
+                audio_data = await websocket.receive_bytes()
+                metrics.AUDIO_BYTES.inc(len(audio_data))
+                _audio_log.debug(
+                    room_id, "Received audio data: %d bytes", len(audio_data),
+                    extra={"room": room_id, "session": session_id},
+                )
                 
-                # Try to receive audio data with a short timeout
-                try:
-                    audio_data = await asyncio.wait_for(
-                        websocket.receive_bytes(), 
-                        timeout=0.1  # Short timeout to check for transcripts frequently
-                    )
-                    print(f"Received audio data: {len(audio_data)} bytes")
-                    
-                    # Send to STT service
-                    await stt_service.send_audio(session_id, audio_data)
-                except asyncio.TimeoutError:
-                    # No audio data received, continue to check for transcripts
-                    continue
-                    
+                # Send to STT service
+                await stt_service.send_audio(session_id, audio_data)
             except WebSocketDisconnect:
-                print("WebSocket disconnected")
-                break
+                logger.info("Broadcaster disconnected", extra={"room": room_id})
+                return
             except Exception as e:
-                print(f"Error processing audio data: {e}")
-                import traceback
-                traceback.print_exc()
+                _audio_log.warning(
+                    ("error", room_id), "Error processing audio data: %s", e,
+                    extra={"room": room_id, "session": session_id},
+                )
                 # Don't break on errors, try to continue
                 await asyncio.sleep(0.1)  # Avoid tight loop on errors
-    except Exception as e:
-        print(f"Error in websocket connection: {e}")
-        import traceback
-        traceback.print_exc()
+    
+    async def dispatch_transcripts():
+        """Send interim text straight to viewers; queue finals for translation."""
+        async for transcript in stt_service.transcripts(session_id):
+            if transcript.get("is_final", True):
+                final_queue.put_nowait(transcript)
+                if settings.stt_interim_results and transcript.get("text"):
+                    # Show the finalized text while it waits to be merged and translated
+                    caption_queue.put_nowait((None, {
+                        "type": "caption_partial",
+                        "segment_id": transcript.get("segment_id"),
+                        "original": transcript["text"]
+                    }))
+            else:
+                # Interim text is untranslated, so every language gets it
+                caption_queue.put_nowait((None, {
+                    "type": "caption_partial",
+                    "segment_id": transcript.get("segment_id"),
+                    "original": transcript.get("text", "")
+                }))
+    
+    def deliver_captions(segment: Dict[str, Any], captions: List[Tuple[str, Dict[str, Any]]]) -> None:
+        """Hand a segment's captions to fan-out once every earlier segment is out."""
+        released_at = time.time()
+        # Shown from release rather than from when its translation finished,
+        # so captions' times follow their order (WebVTT cues rely on it)
+        shown_at = asyncio.get_event_loop().time()
+        for language, message in captions:
+            message["ts"] = shown_at
+            message["trace"] = encode_trace(message["trace"] + [released_at])
+            caption_queue.put_nowait((language, message))
+            # Pairs enter the context in caption order, not as translations finish,
+            # so later prompts share the same prefix
+            context = contexts.get(language)
+            if context is not None and not message["translation"].startswith(TRANSLATION_ERROR_PREFIX):
+                context.add(message["original"], message["translation"])
+        if captions:
+            released_from = segment.get("audio_end") or segment.get("final_at")
+            if released_from is not None:
+                metrics.CAPTION_LATENCY.observe(max(0.0, released_at - released_from))
+        
+        # Record the segment, its translations and stage times in order
+        if journal is not None and segment.get("text", "").strip():
+            journal.append(room_id, {
+                "seq": segment["seq"],
+                "segment_ids": segment.get("segment_ids", []),
+                "original": segment["text"],
+                "translations": {language: message["translation"] for language, message in captions},
+                "timestamps": {
+                    "final": segment.get("final_at"),
+                    "translated": segment.get("translated_at"),
+                    "released": released_at
+                }
+            })
+    
+    # Several segments translate at once; captions are still released in order
+    # Sequence numbers continue from the room's last caption so reconnecting viewers can resume
+    scheduler = TranslationScheduler(
+        on_transcript,
+        deliver_captions,
+        settings.translation_max_in_flight,
+        start_seq=await broadcast_service.next_caption_seq(room_id)
+    )
+    active_rooms[room_id]["scheduler"] = scheduler
+    
+    async def translate_transcripts():
+        """Merge finalized fragments into segments and schedule their translation."""
+        loop = asyncio.get_event_loop()
+        ended = False
+        while not ended:
+            # Wait for the next fragment, but no longer than the latency budget allows
+            try:
+                transcript = await asyncio.wait_for(
+                    final_queue.get(),
+                    timeout=segmenter.time_until_flush(loop.time())
+                )
+            except asyncio.TimeoutError:
+                segment = segmenter.flush()
+            else:
+                if transcript is None:
+                    # The transcript stream has ended; translate what is still held
+                    ended = True
+                    segment = segmenter.flush()
+                elif not transcript.get("text", "").strip():
+                    # Nothing to translate; clear any interim text shown for the segment
+                    if transcript.get("segment_id") is not None:
+                        caption_queue.put_nowait((None, {
+                            "type": "caption_partial",
+                            "segment_id": transcript["segment_id"],
+                            "original": ""
+                        }))
+                    continue
+                else:
+                    segment = segmenter.add(transcript, loop.time())
+            
+            if segment is not None:
+                segment["final_at"] = time.time()
+                scheduler.submit(segment)
+                metrics.SEGMENTS.inc()
+    
+    async def broadcast_captions():
+        """Fan translated captions out to the room."""
+        while True:
+            language, message = await caption_queue.get()
+            if message["type"] == "caption":
+                vtt_service.add_caption(room_id, message)
+            try:
+                # Broadcast the original and translated text to that language's viewers
+                await broadcast_service.broadcast_to_room(
+                    room_id=room_id,
+                    message=message,
+                    language=language
+                )
+            except Exception:
+                logger.exception("Error broadcasting caption", extra={"room": room_id, "seq": message.get("seq")})
+            finally:
+                caption_queue.task_done()
+    
+    async def share_vtt():
+        """Keep the room's WebVTT output available to every worker as segments finish."""
+        while True:
+            await asyncio.sleep(settings.vtt_segment_duration / 2)
+            try:
+                await vtt_service.share(room_id, vtt_epoch, broadcast_service.backend, asyncio.get_event_loop().time())
+            except Exception:
+                logger.exception("Error sharing WebVTT segments", extra={"room": room_id})
+    
+    async def drain_pipeline(dispatch_task: asyncio.Task, translate_task: asyncio.Task) -> None:
+        """Caption everything transcribed before the broadcaster left, in order."""
+        # The STT session is closed, so its remaining transcripts come out and end
+        await asyncio.gather(dispatch_task, return_exceptions=True)
+        final_queue.put_nowait(None)
+        await asyncio.gather(translate_task, return_exceptions=True)
+        await scheduler.drain()
+        await caption_queue.join()
+    
+    tasks: List[asyncio.Task] = []
+    try:
+        # Create STT session with the configured provider
+        session_id = await stt_service.create_connection()
+        
+        # Run each stage independently so translation never stalls audio ingest
+        scheduler.start()
+        # Ingest comes first: teardown stops it before draining the other stages
+        tasks = [
+            asyncio.create_task(receive_audio()),
+            asyncio.create_task(dispatch_transcripts()),
+            asyncio.create_task(translate_transcripts()),
+            asyncio.create_task(broadcast_captions()),
+            asyncio.create_task(share_vtt()),
+        ]
+        
+        # The pipeline lives as long as the first stage to finish (normally ingest)
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+    except Exception:
+        logger.exception("Error in websocket connection", extra={"room": room_id, "session": session_id})
     finally:
-        # Clean up STT session
+        # Stop taking audio and end the STT stream, then let the segments
+        # already spoken finish translating before stopping the pipeline
+        if tasks:
+            tasks[0].cancel()
+            await asyncio.gather(tasks[0], return_exceptions=True)
         if session_id:
             try:
                 await stt_service.close_connection(session_id)
-                print(f"Closed STT session: {session_id}")
-            except Exception as e:
-                print(f"Error closing STT session: {e}")
+            except Exception:
+                logger.exception("Error closing STT session", extra={"room": room_id, "session": session_id})
+        if tasks:
+            try:
+                await asyncio.wait_for(drain_pipeline(tasks[1], tasks[2]), timeout=settings.broadcast_drain_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Timed out sending the last captions", extra={"room": room_id})
         
-        # Clean up any pending transcripts
-        if session_id in stt_service.active_sessions and "pending_transcripts" in stt_service.active_sessions[session_id]:
-            stt_service.active_sessions[session_id]["pending_transcripts"] = []
-            print("Cleared pending transcripts")
+        # Stop the remaining pipeline stages
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await scheduler.close()
+        vtt_service.end_room(room_id, vtt_epoch, asyncio.get_event_loop().time())
+        try:
+            # Other workers' copies get the last segment and the end marker
+            await vtt_service.share(room_id, vtt_epoch, broadcast_service.backend, asyncio.get_event_loop().time())
+        except Exception:
+            logger.exception("Error sharing WebVTT segments", extra={"room": room_id})
+        delivery_tracker.end_room(room_id)
+        if journal is not None:
+            await journal.close_room(room_id)
+        if active_rooms.get(room_id, {}).get("scheduler") is scheduler:
+            del active_rooms[room_id]["scheduler"]
+        await broadcast_service.unsubscribe(room_id, broadcaster_channel)
+        
+        # Close the room unless a reconnected broadcaster has taken it over
+        room = active_rooms.get(room_id)
+        if room is not None and room.get("broadcaster") is websocket:
+            del room["broadcaster"]
+            if not room.get("viewers"):
+                del active_rooms[room_id]
+        try:
+            await broadcast_service.backend.unregister_room(room_id, broadcast_owner)
+        except Exception:
+            logger.exception("Error unregistering room", extra={"room": room_id})
                 
-        print("WebSocket connection closed")
+        logger.info("Broadcast ended", extra={"room": room_id})
 
 # End of file
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional, List
+import asyncio
+
+from app.services.journal import TranscriptJournal, export_srt, export_vtt, export_jsonl, safe_name
+from app.utils import get_journal
+
+router = APIRouter(tags=["export"])
+
+# Format -> (renderer, media type)
+EXPORT_FORMATS = {
+    "srt": (export_srt, "application/x-subrip; charset=utf-8"),
+    "vtt": (export_vtt, "text/vtt; charset=utf-8"),
+    "jsonl": (export_jsonl, "application/x-ndjson; charset=utf-8"),
+}
+
+# Rendered text is sent in chunks of about this many characters
+EXPORT_CHUNK_SIZE = 16 * 1024
+
+@router.get("/export/{room_id}/transcript.{fmt}")
+async def export_transcript(
+    room_id: str,
+    fmt: str,
+    language: Optional[str] = None,
+    journal: Optional[TranscriptJournal] = Depends(get_journal),
+):
+    """Download a room's transcript from its journal.
+
+    SRT and WebVTT contain the translation into ?language=, or the source
+    text if no language is given; JSONL contains every record (only that
+    language's translation if one is given). The transcript is streamed
+    from disk as it is rendered.
+    """
+    if journal is None:
+        raise HTTPException(status_code=404, detail="Transcript journal is disabled")
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown transcript format")
+    if room_id not in journal.rooms and not await asyncio.to_thread(journal.segment_files, room_id):
+        raise HTTPException(status_code=404, detail="No transcript for this room")
+
+    render, media_type = EXPORT_FORMATS[fmt]
+
+    async def body() -> AsyncIterator[bytes]:
+        buffered: List[str] = []
+        size = 0
+        async for text in render(journal.records(room_id), language):
+            buffered.append(text)
+            size += len(text)
+            if size >= EXPORT_CHUNK_SIZE:
+                yield "".join(buffered).encode("utf-8")
+                buffered, size = [], 0
+        if buffered:
+            yield "".join(buffered).encode("utf-8")
+
+    suffix = f"-{safe_name(language)}" if language else ""
+    filename = f"{safe_name(room_id)}{suffix}.{fmt}"
+    return StreamingResponse(
+        body(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -4,29 +4,34 @@ from fastapi.responses import HTMLResponse
 import uuid
 from pathlib import Path
 
+from app.config import settings
+from app.services.assets import PageCache
+from app.utils import get_static_assets
+
 router = APIRouter(tags=["pages"])
 
 # Set up templates
 templates = Jinja2Templates(directory=Path(__file__).parent.parent.parent / "templates")
 
+# Fingerprinted static paths: url_for('static', path=asset_path('css/styles.css'))
+templates.env.globals["asset_path"] = lambda path: get_static_assets().url_path(path)
+
+# Rendered pages; in debug mode every hit re-renders so template edits show up
+page_cache = PageCache(templates, max_entries=0 if settings.debug else settings.page_cache_size)
+
+# Pages only change on deploy, but the static URLs they link to change with them
+PAGE_CACHE_CONTROL = f"public, max-age={settings.page_max_age}" if settings.page_max_age else "public, no-cache"
+
 @router.get("/", response_class=HTMLResponse)
 async def index(request: Request):
     """Landing page with 'Start Broadcast' button."""
-    return templates.TemplateResponse(
-        "index.html", 
-        {"request": request}
-    )
+    return page_cache.render(request, "index.html", {}).response(request, PAGE_CACHE_CONTROL)
 
 @router.get("/broadcast/{room_id}", response_class=HTMLResponse)
 async def broadcast_page(request: Request, room_id: str):
     """Broadcaster control panel page."""
-    return templates.TemplateResponse(
-        "broadcast.html", 
-        {
-            "request": request, 
-            "room_id": room_id
-        }
-    )
+    page = page_cache.render(request, "broadcast.html", {"room_id": room_id})
+    return page.response(request, PAGE_CACHE_CONTROL)
 
 @router.get("/broadcast", response_class=HTMLResponse)
 async def create_broadcast(request: Request):
@@ -40,16 +45,12 @@ async def create_broadcast(request: Request):
         {
             "request": request, 
             "room_id": room_id
-        }
+        },
+        headers={"Cache-Control": "no-store"},
     )
 
 @router.get("/view/{room_id}", response_class=HTMLResponse)
 async def view_page(request: Request, room_id: str):
     """Viewer page with live captions."""
-    return templates.TemplateResponse(
-        "view.html", 
-        {
-            "request": request, 
-            "room_id": room_id
-        }
-    )
+    page = page_cache.render(request, "view.html", {"room_id": room_id})
+    return page.response(request, PAGE_CACHE_CONTROL)
@@ -0,0 +1,87 @@
+from fastapi import APIRouter, Request, HTTPException, Depends
+from fastapi.responses import StreamingResponse
+from typing import AsyncIterator, Optional
+
+from pydantic import ValidationError
+
+from app.config import settings
+from app.models.messages import LanguageCommand
+from app.routes.viewer import language_available
+from app.services.broadcast import BroadcastService
+from app.services.wire import encode_json
+from app.utils import get_broadcast_service
+from app.utils.state import active_rooms
+
+router = APIRouter(tags=["sse"])
+
+# Seconds between keepalive comments on an idle stream
+SSE_KEEPALIVE_INTERVAL = 15.0
+
+# Milliseconds browsers wait before reconnecting
+SSE_RETRY_MS = 3000
+
+def parse_seq(value: Optional[str]) -> Optional[int]:
+    """Parse a caption sequence number from a header or query parameter."""
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+@router.get("/sse/view/{room_id}")
+async def sse_view(
+    request: Request,
+    room_id: str,
+    language: Optional[str] = None,
+    since: Optional[str] = None,
+    broadcast_service: BroadcastService = Depends(get_broadcast_service),
+):
+    """Server-Sent Events stream of a room's captions for read-only viewers.
+
+    Sends the same messages as /ws/view/{room_id}, read straight from the
+    room's shared frame log, so a viewer costs no socket writer or ping
+    task. Browsers resume with Last-Event-ID; ?since=<seq> does the same
+    for the first connection.
+    """
+    if "broadcaster" not in active_rooms.get(room_id, {}) and not await broadcast_service.backend.room_exists(room_id):
+        raise HTTPException(status_code=404, detail="Room not found")
+
+    try:
+        language = LanguageCommand(language=language or settings.target_language).language
+    except ValidationError:
+        language = settings.target_language
+    if not await language_available(broadcast_service, room_id, language):
+        language = settings.target_language
+
+    # Last-Event-ID is the seq of the last caption the browser received
+    resume = parse_seq(request.headers.get("last-event-id"))
+    if resume is None:
+        resume = parse_seq(since)
+
+    welcome = encode_json({
+        "type": "connection_established",
+        "room_id": room_id,
+        "message": "Connected to viewing room",
+        "format": "json"
+    })
+
+    async def events() -> AsyncIterator[bytes]:
+        # Subscribe inside the stream so the finally below always pairs with
+        # it: a client that disconnects before the first chunk never starts
+        # the generator, and a channel subscribed earlier would leak
+        channel = await broadcast_service.subscribe(room_id, None, language, since=resume)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\nevent: connection_established\ndata: {welcome}\n\n".encode()
+            async for frame in channel.frames(idle_timeout=SSE_KEEPALIVE_INTERVAL):
+                # Comments keep proxies from timing out idle streams
+                yield frame.event if frame is not None else b": keepalive\n\n"
+        finally:
+            await broadcast_service.unsubscribe(room_id, channel)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # Don't let nginx-style proxies buffer the stream
+        },
+    )
@@ -1,45 +1,76 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends
 from starlette.websockets import WebSocketState
+import itertools
 import json
-import asyncio
-from typing import Dict, Set, Any
+import logging
+from typing import Dict, Set, Any, Optional, Tuple
 
+from pydantic import ValidationError
+
+from app.config import settings
+from app.models.messages import LanguageCommand
+from app.services.broadcast import BroadcastService
+from app.services.heartbeat import HeartbeatManager
+from app.services.trace import ClockOffset, DeliveryTracker, now_ms
+from app.services.wire import FORMAT_COMPACT, TS_BASE, negotiate, send_message
+from app.utils import get_broadcast_service, get_heartbeat_manager, get_delivery_tracker
 from app.utils.state import active_rooms
 
 router = APIRouter(tags=["viewer"])
 
+logger = logging.getLogger(__name__)
+
+# Counts viewers able to send receipts, to ask one in trace_receipt_sample
+_receipt_candidates = itertools.count()
+
+def wants_receipts(websocket: WebSocket) -> bool:
+    """Whether to ask this viewer for display receipts (sampled among viewers that support them)."""
+    if settings.trace_receipt_sample <= 0 or websocket.query_params.get("receipts") != "1":
+        return False
+    return next(_receipt_candidates) % settings.trace_receipt_sample == 0
+
+def parse_pong(data: str) -> Optional[Tuple[int, int]]:
+    """(server ms, client ms) from a timed "pong <server ms> <client ms>" reply."""
+    parts = data.split()
+    if len(parts) != 3:
+        return None
+    try:
+        return int(parts[1]), int(parts[2])
+    except ValueError:
+        return None
+
+async def language_available(broadcast_service: BroadcastService, room_id: str, language: str) -> bool:
+    """Check whether a room can take on another target language."""
+    active = await broadcast_service.active_languages(room_id)
+    return language in active or len(active) < settings.max_languages_per_room
+
 @router.websocket("/ws/view/{room_id}")
-async def websocket_view(websocket: WebSocket, room_id: str):
+async def websocket_view(
+    websocket: WebSocket,
+    room_id: str,
+    broadcast_service: BroadcastService = Depends(get_broadcast_service),
+    heartbeat_manager: HeartbeatManager = Depends(get_heartbeat_manager),
+    delivery_tracker: DeliveryTracker = Depends(get_delivery_tracker),
+):
     """WebSocket endpoint for viewers to receive translated captions."""
-    await websocket.accept()
+    # Viewers opt into the compact binary format by offering its subprotocol
+    wire_format, subprotocol = negotiate(websocket)
+    await websocket.accept(subprotocol=subprotocol)
     
-    # Set up ping/pong heartbeat
-    ping_task = None
-    last_ping_time = asyncio.get_event_loop().time()
-    ping_interval = 30  # Send ping every 30 seconds
-    pong_timeout = 15   # Wait 15 seconds for pong response
+    # Outbound caption channel, drained by its own writer task
+    channel = None
     
-    async def send_periodic_pings():
-        nonlocal last_ping_time
-        try:
-            while True:
-                # Send ping message
-                if websocket.client_state == WebSocketState.CONNECTED:
-                    await websocket.send_text("ping")
-                    last_ping_time = asyncio.get_event_loop().time()
-                
-                # Wait for next ping interval
-                await asyncio.sleep(ping_interval)
-        except asyncio.CancelledError:
-            # Task was cancelled, clean up
-            return
-        except Exception as e:
-            print(f"Error in ping task: {e}")
+    # Liveness is tracked by the process-wide heartbeat wheel
+    heartbeat = None
+    
+    # Sampled viewers report when captions are shown; their clock offset
+    # comes from timed pings
+    clock = ClockOffset() if wants_receipts(websocket) else None
     
     try:
-        # Check if room exists
-        if room_id not in active_rooms:
-            await websocket.send_json({
+        # Check if room exists (the broadcaster may be on another worker)
+        if "broadcaster" not in active_rooms.get(room_id, {}) and not await broadcast_service.backend.room_exists(room_id):
+            await send_message(websocket, wire_format, {
                 "type": "error",
                 "message": "Room not found"
             })
@@ -47,68 +78,105 @@ async def websocket_view(websocket: WebSocket, room_id: str):
             return
         
         # Add viewer to room
-        if "viewers" not in active_rooms[room_id]:
-            active_rooms[room_id]["viewers"] = set()
+        room = active_rooms.setdefault(room_id, {})
+        if "viewers" not in room:
+            room["viewers"] = set()
         
-        active_rooms[room_id]["viewers"].add(websocket)
+        room["viewers"].add(websocket)
         
         # Send welcome message
-        await websocket.send_json({
+        welcome = {
             "type": "connection_established",
             "room_id": room_id,
-            "message": "Connected to viewing room"
-        })
+            "message": "Connected to viewing room",
+            "format": wire_format
+        }
+        if wire_format == FORMAT_COMPACT:
+            # Compact timestamps are milliseconds after this base
+            welcome["ts_base"] = TS_BASE
+        if clock is not None:
+            # The viewer answers with a timed pong right away, giving a first clock sample
+            welcome["receipts"] = True
+            welcome["server_time"] = now_ms()
+        await send_message(websocket, wire_format, welcome)
         
-        # Start ping task
-        ping_task = asyncio.create_task(send_periodic_pings())
+        # Start receiving captions for the room in the requested language
+        language = websocket.query_params.get("language") or settings.target_language
+        try:
+            language = LanguageCommand(language=language).language
+        except ValidationError:
+            language = settings.target_language
+        if not await language_available(broadcast_service, room_id, language):
+            language = settings.target_language
+        
+        # Resume after the last caption the viewer saw (sent again on reconnect)
+        since = websocket.query_params.get("since")
+        try:
+            since = int(since) if since is not None else None
+        except ValueError:
+            since = None
+        channel = await broadcast_service.subscribe(room_id, websocket, language, since=since, wire_format=wire_format)
+        
+        # Ping the viewer every interval; it's closed if it stops answering
+        heartbeat = heartbeat_manager.register(websocket, timed=clock is not None)
         
         # Keep connection alive until disconnect
         while True:
             # Periodically check if room still exists
             if room_id not in active_rooms:
-                await websocket.send_json({
+                await send_message(websocket, wire_format, {
                     "type": "error",
                     "message": "Room closed"
                 })
                 break
             
-            # Wait for a message with timeout
+            # Wait for a message; a dead client is closed by the heartbeat,
+            # which ends this receive with a disconnect
+            data = await websocket.receive_text()
+            
+            # Anything from the client shows it's alive
+            heartbeat_manager.touch(heartbeat)
+            
+            # Check for ping/pong messages
+            if data == "ping":
+                # Respond to client ping with pong
+                await websocket.send_text("pong")
+                continue
+            elif data.startswith("pong"):
+                # Client responded to our ping, with its clock if the ping was timed
+                if clock is not None:
+                    times = parse_pong(data)
+                    if times is not None:
+                        clock.add(times[0], times[1], now_ms())
+                continue
+            
+            # Handle other viewer commands
             try:
-                # Use wait_for with a timeout to detect stale connections
-                data = await asyncio.wait_for(
-                    websocket.receive_text(),
-                    timeout=ping_interval + pong_timeout
-                )
+                command = json.loads(data)
                 
-                # Check for ping/pong messages
-                if data == "ping":
-                    # Respond to client ping with pong
-                    await websocket.send_text("pong")
-                    continue
-                elif data == "pong":
-                    # Client responded to our ping
-                    last_ping_time = asyncio.get_event_loop().time()
-                    continue
+                # A final caption was shown: the trace start and the viewer's clock
+                if command.get("type") == "receipt" and clock is not None:
+                    if isinstance(command.get("t0"), int) and isinstance(command.get("shown"), int):
+                        delivery_tracker.record(room_id, command["t0"], command["shown"], clock)
                 
-                # Handle other viewer commands
-                try:
-                    command = json.loads(data)
-                    
-                    # Example: Change target language
-                    if command.get("type") == "set_language" and "language" in command:
-                        # This would be implemented in a more robust way in production
-                        pass
-                        
-                except json.JSONDecodeError:
-                    # Not JSON, ignore
-                    pass
+                # Change target language
+                elif command.get("type") == "set_language" and "language" in command:
+                    language = LanguageCommand(**command).language
+                    if await language_available(broadcast_service, room_id, language):
+                        channel = await broadcast_service.set_language(room_id, channel, language)
+                        await send_message(websocket, wire_format, {
+                            "type": "language_set",
+                            "language": language
+                        })
+                    else:
+                        await send_message(websocket, wire_format, {
+                            "type": "error",
+                            "message": "Too many languages in this room"
+                        })
                     
-            except asyncio.TimeoutError:
-                # Check if we've exceeded pong timeout
-                current_time = asyncio.get_event_loop().time()
-                if current_time - last_ping_time > pong_timeout:
-                    print(f"Viewer connection timed out for room {room_id}")
-                    break
+            except (json.JSONDecodeError, ValidationError):
+                # Not JSON or not a valid command, ignore
+                pass
                 
     except WebSocketDisconnect:
         # Remove viewer from room
@@ -116,13 +184,12 @@ async def websocket_view(websocket: WebSocket, room_id: str):
             active_rooms[room_id]["viewers"].discard(websocket)
     
     except Exception as e:
-        # Log error
-        print(f"Error in websocket_view: {e}")
+        logger.exception("Error in websocket_view", extra={"room": room_id})
         
         # Try to send error message
         if websocket.client_state != WebSocketState.DISCONNECTED:
             try:
-                await websocket.send_json({
+                await send_message(websocket, wire_format, {
                     "type": "error",
                     "message": str(e)
                 })
@@ -134,13 +201,22 @@ async def websocket_view(websocket: WebSocket, room_id: str):
             active_rooms[room_id]["viewers"].discard(websocket)
     
     finally:
-        # Clean up ping task
-        if ping_task and not ping_task.done():
-            ping_task.cancel()
-            try:
-                await ping_task
-            except asyncio.CancelledError:
-                pass
+        # Stop caption delivery
+        if channel is not None:
+            await broadcast_service.unsubscribe(room_id, channel)
+        # Receipts come from this worker's viewers; forget the room's samples
+        # once none are left, including ones that arrived after the broadcast ended
+        if room_id not in broadcast_service.rooms:
+            delivery_tracker.end_room(room_id)
+        if room_id in active_rooms and "viewers" in active_rooms[room_id]:
+            active_rooms[room_id]["viewers"].discard(websocket)
+            # The last viewer of a room whose broadcast has ended cleans it up
+            if not active_rooms[room_id]["viewers"] and "broadcaster" not in active_rooms[room_id]:
+                del active_rooms[room_id]
+        
+        # Stop pinging
+        if heartbeat is not None:
+            heartbeat_manager.unregister(heartbeat)
         
         # Ensure websocket is closed
         if websocket.client_state != WebSocketState.DISCONNECTED:
@@ -0,0 +1,71 @@
+from fastapi import APIRouter, Request, Depends
+from fastapi.responses import Response
+import asyncio
+
+from app.config import settings
+from app.services.room_backend import RoomBackend
+from app.services.vtt import VttService, etag_for
+from app.utils import get_vtt_service, get_room_backend
+
+router = APIRouter(tags=["vtt"])
+
+# Finished segments never change: their URLs carry the broadcast's epoch
+SEGMENT_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Nothing at this URL yet (or any more); don't let caches hold on to that
+MISSING_CACHE_CONTROL = "no-store"
+
+def cached_response(request: Request, body: bytes, etag: str, media_type: str, cache_control: str) -> Response:
+    """Serve a body with validators, answering 304 when the client already has it."""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
+@router.get("/vtt/{room_id}/{language}/playlist.m3u8")
+async def vtt_playlist(
+    request: Request,
+    room_id: str,
+    language: str,
+    vtt_service: VttService = Depends(get_vtt_service),
+    room_backend: RoomBackend = Depends(get_room_backend),
+):
+    """Rolling HLS playlist of a room's WebVTT caption segments in one language."""
+    # Short enough that players see each new segment (and a new broadcast in
+    # the room), long enough for a CDN to absorb the polling
+    cache_control = f"public, max-age={max(1, int(settings.vtt_segment_duration / 2))}"
+    media_type = "application/vnd.apple.mpegurl"
+
+    stream = vtt_service.stream(room_id, language, asyncio.get_event_loop().time())
+    if stream is None or stream.ended:
+        # The broadcast runs on another worker (or has moved to one)
+        body = await room_backend.vtt_file(room_id, language, "playlist.m3u8")
+        if body is not None:
+            return cached_response(request, body, etag_for(body), media_type, cache_control)
+    if stream is None:
+        return Response(status_code=404, headers={"Cache-Control": MISSING_CACHE_CONTROL})
+
+    body, etag = stream.playlist()
+    return cached_response(request, body, etag, media_type, cache_control)
+
+@router.get("/vtt/{room_id}/{language}/{epoch}/{index}.vtt")
+async def vtt_segment(
+    request: Request,
+    room_id: str,
+    language: str,
+    epoch: str,
+    index: int,
+    vtt_service: VttService = Depends(get_vtt_service),
+    room_backend: RoomBackend = Depends(get_room_backend),
+):
+    """One finished WebVTT caption segment."""
+    media_type = "text/vtt; charset=utf-8"
+    stream = vtt_service.stream(room_id, language, asyncio.get_event_loop().time())
+    segment = stream.segment(index) if stream is not None and stream.epoch == epoch else None
+    if segment is not None:
+        return cached_response(request, segment.body, segment.etag, media_type, SEGMENT_CACHE_CONTROL)
+
+    body = await room_backend.vtt_file(room_id, language, f"{epoch}/{index}.vtt")
+    if body is None:
+        return Response(status_code=404, headers={"Cache-Control": MISSING_CACHE_CONTROL})
+    return cached_response(request, body, etag_for(body), media_type, SEGMENT_CACHE_CONTROL)
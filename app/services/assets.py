@@ -0,0 +1,210 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli as _brotli
+except ImportError:  # Brotli variants are only built when brotli is installed
+    _brotli = None
+
+# Bodies smaller than this aren't worth compressing
+MIN_COMPRESS_SIZE = 256
+
+# Media types that compress well
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+# Content-Encoding preference when the client accepts several
+ENCODING_PREFERENCE = ("br", "gzip")
+
+def accepted_encodings(accept_encoding: str) -> Tuple[str, ...]:
+    """Content codings the client accepts (q > 0), from an Accept-Encoding header."""
+    accepted = []
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if coding and q > 0:
+            accepted.append(coding.strip().lower())
+    return tuple(accepted)
+
+class CompressedBody:
+    """A response body with its ETag and gzip/brotli variants, built once.
+
+    Variants are only kept when they are smaller than the original, so
+    serving one never costs more than a dict lookup.
+    """
+
+    __slots__ = ("body", "media_type", "etag", "variants")
+
+    def __init__(self, body: bytes, media_type: str, best: bool = True):
+        """Compress a body.
+
+        Args:
+            body: Uncompressed body
+            media_type: Content-Type
+            best: Use the slowest, smallest compression (for work done at
+                startup); otherwise levels cheap enough for request time
+        """
+        self.body = body
+        self.media_type = media_type
+        # Weak, because every encoding of the body shares it
+        self.etag = f'W/"{hashlib.sha256(body).hexdigest()[:20]}"'
+        self.variants: Dict[str, bytes] = {}
+        if len(body) >= MIN_COMPRESS_SIZE and media_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9 if best else 6, mtime=0)
+            if len(compressed) < len(body):
+                self.variants["gzip"] = compressed
+            if _brotli is not None:
+                compressed = _brotli.compress(body, quality=11 if best else 5)
+                if len(compressed) < len(body):
+                    self.variants["br"] = compressed
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        """Serve the body, answering 304 when the client already has it.
+
+        Args:
+            request: Incoming request (If-None-Match, Accept-Encoding)
+            cache_control: Cache-Control header value
+
+        Returns:
+            304, or 200 with the smallest variant the client accepts
+        """
+        headers = {"ETag": self.etag, "Cache-Control": cache_control}
+        if self.variants:
+            headers["Vary"] = "Accept-Encoding"
+        if self.etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers=headers)
+
+        body = self.body
+        if self.variants:
+            accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+            for coding in ENCODING_PREFERENCE:
+                if coding in accepted and coding in self.variants:
+                    body = self.variants[coding]
+                    headers["Content-Encoding"] = coding
+                    break
+        return Response(content=body, media_type=self.media_type, headers=headers)
+
+class StaticAssets:
+    """Static files loaded into memory with content-hashed URLs.
+
+    Each file is read and compressed once. It is served both under its
+    plain path and under a fingerprinted path with the content hash before
+    the extension (css/styles.css -> css/styles.1a2b3c4d5e.css); the
+    fingerprinted URL changes whenever the file does, so it can be cached
+    forever.
+    """
+
+    def __init__(self, directory: str, watch: bool = False):
+        """Load every file under directory.
+
+        Args:
+            directory: Static files directory
+            watch: Reload files that changed on disk when their URL is
+                looked up (for development)
+        """
+        self.directory = directory
+        self.watch = watch
+        self.files: Dict[str, CompressedBody] = {}  # Plain path -> body
+        self.fingerprinted: Dict[str, str] = {}  # Plain path -> fingerprinted path
+        self.by_fingerprint: Dict[str, CompressedBody] = {}  # Fingerprinted path -> body
+        self._mtimes: Dict[str, float] = {}
+        for root, _, names in os.walk(directory):
+            for name in names:
+                full_path = os.path.join(root, name)
+                self._load(os.path.relpath(full_path, directory).replace(os.sep, "/"))
+
+    def _load(self, path: str) -> None:
+        full_path = os.path.join(self.directory, path)
+        with open(full_path, "rb") as f:
+            data = f.read()
+        self._mtimes[path] = os.path.getmtime(full_path)
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        asset = CompressedBody(data, media_type)
+
+        stem, ext = os.path.splitext(path)
+        fingerprinted = f"{stem}.{hashlib.sha256(data).hexdigest()[:10]}{ext}"
+        self.files[path] = asset
+        self.fingerprinted[path] = fingerprinted
+        self.by_fingerprint[fingerprinted] = asset
+
+    def url_path(self, path: str) -> str:
+        """Fingerprinted path for a static file, or path itself if it isn't one."""
+        if self.watch and path in self._mtimes:
+            try:
+                if os.path.getmtime(os.path.join(self.directory, path)) != self._mtimes[path]:
+                    self._load(path)
+            except OSError:
+                pass
+        return self.fingerprinted.get(path, path)
+
+    def get(self, path: str) -> Tuple[Optional[CompressedBody], bool]:
+        """Look up a static file by URL path.
+
+        Returns:
+            (body or None, whether path was fingerprinted)
+        """
+        asset = self.by_fingerprint.get(path)
+        if asset is not None:
+            return asset, True
+        return self.files.get(path), False
+
+class PageCache:
+    """LRU cache of rendered template pages.
+
+    Pages are keyed by template, context, and the request's base URL
+    (url_for() bakes the scheme and host into links), and kept compressed.
+    Templates must not depend on anything else in the request.
+    """
+
+    def __init__(self, templates, max_entries: int = 512):
+        """Initialize the cache.
+
+        Args:
+            templates: Jinja2Templates to render with
+            max_entries: Rendered pages kept in memory
+        """
+        self.templates = templates
+        self.max_entries = max_entries
+        self._pages: "OrderedDict[Tuple, CompressedBody]" = OrderedDict()
+
+    def render(self, request: Request, name: str, context: Dict[str, Any]) -> CompressedBody:
+        """Rendered page for a template and context, from cache when possible.
+
+        Args:
+            request: Incoming request (for url_for)
+            name: Template name
+            context: Template context, without "request"
+
+        Returns:
+            The rendered page
+        """
+        key = (name, tuple(sorted(context.items())), str(request.base_url))
+        page = self._pages.get(key)
+        if page is not None:
+            self._pages.move_to_end(key)
+            return page
+
+        html = self.templates.get_template(name).render({"request": request, **context})
+        page = CompressedBody(html.encode("utf-8"), "text/html; charset=utf-8", best=False)
+        self._pages[key] = page
+        if len(self._pages) > self.max_entries:
+            self._pages.popitem(last=False)
+        return page
+
+    def clear(self) -> None:
+        self._pages.clear()
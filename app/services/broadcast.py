@@ -1,74 +1,526 @@
-from typing import Dict, Any, Set
+from typing import Dict, Any, Set, Optional, Deque, List, Tuple, AsyncIterator
+from collections import deque
 import asyncio
+import itertools
+import logging
+import time
 from starlette.websockets import WebSocket, WebSocketState
-from app.utils.state import active_rooms
+
+from app.services import metrics
+from app.services.room_backend import RoomBackend
+from app.services.wire import FORMAT_JSON, FORMAT_COMPACT, encode_json, encode_compact
+from app.utils.log import RateLimitedLog
+
+logger = logging.getLogger(__name__)
+
+# Per-viewer events, logged at most every few seconds per room
+_viewer_log = RateLimitedLog(logger)
+
+# Numbers channels so a fixed share of them record delivery times
+_channel_numbers = itertools.count()
+
+# Slow-consumer policies for viewers that fall a full queue behind
+SLOW_POLICY_COALESCE = "coalesce"      # skip ahead to the latest frame
+SLOW_POLICY_DISCONNECT = "disconnect"  # close the viewer's socket
+
+class Frame:
+    """A message serialized once per wire format and shared by every subscriber."""
+
+    __slots__ = ("message", "text", "published_at", "_compact", "_event")
+
+    def __init__(self, message: Dict[str, Any], text: Optional[str] = None):
+        self.message = message
+        self.text = text if text is not None else encode_json(message)
+        self.published_at: Optional[float] = None  # perf_counter() when published to local viewers
+        self._compact: Optional[bytes] = None
+        self._event: Optional[bytes] = None
+
+    @property
+    def compact(self) -> bytes:
+        """The message in the compact binary format, encoded on first use."""
+        if self._compact is None:
+            self._compact = encode_compact(self.message)
+        return self._compact
+
+    @property
+    def event(self) -> bytes:
+        """The message as a Server-Sent Events record, encoded on first use.
+
+        Captions carry their seq as the event ID (a history batch carries
+        its last caption's), so browsers resume with Last-Event-ID.
+        """
+        if self._event is None:
+            message = self.message
+            seq = message.get("seq")
+            if message.get("type") == "caption_history" and message.get("captions"):
+                seq = message["captions"][-1].get("seq")
+            if message.get("type") not in ("caption", "caption_history"):
+                seq = None
+            event_id = f"id: {seq}\n" if seq is not None else ""
+            self._event = f"event: {message.get('type', 'message')}\n{event_id}data: {self.text}\n\n".encode()
+        return self._event
+
+    async def send(self, websocket: WebSocket, wire_format: str) -> None:
+        """Send the frame to a socket in its negotiated format."""
+        if wire_format == FORMAT_COMPACT:
+            await websocket.send_bytes(self.compact)
+        else:
+            await websocket.send_text(self.text)
+
+class RoomFanout:
+    """Bounded log of recent frames for one room.
+
+    Publishing appends to the log and schedules at most one wakeup pass
+    per event loop iteration, so a publish costs the same no matter how
+    many viewers are subscribed, and captions published together (every
+    language of a segment) share a pass. The pass resolves each waiting
+    writer's future once; that part is proportional to the number of
+    waiting writers, with no per-writer wrapper futures or callbacks on
+    top. Each viewer's writer keeps its own cursor into the log; the log
+    length bounds how far behind any viewer can fall.
+    """
+
+    def __init__(self, max_queue: int, room_id: str = "", language: Optional[str] = None):
+        self.room_id = room_id
+        self.language = language
+        self.max_queue = max_queue
+        self.frames: Deque[Frame] = deque(maxlen=max_queue)
+        self.head = 0  # Sequence number of the next frame to be published
+        self.channels: Set["ViewerChannel"] = set()
+        # Futures of writers waiting for the next frame; a dict so a cancelled
+        # writer removes its own in O(1) and wakeups go in arrival order
+        self._waiters: Dict[asyncio.Future, None] = {}
+        self._wake_scheduled = False
+
+    def publish(self, frame: Frame) -> None:
+        """Append a frame and schedule a wakeup of the waiting writers."""
+        self.frames.append(frame)
+        self.head += 1
+        if self._waiters and not self._wake_scheduled:
+            self._wake_scheduled = True
+            asyncio.get_running_loop().call_soon(self._wake)
+
+    def _wake(self) -> None:
+        self._wake_scheduled = False
+        waiters, self._waiters = self._waiters, {}
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def frame_at(self, cursor: int) -> Optional[Frame]:
+        """Return the frame with the given sequence number, if still buffered."""
+        index = cursor - (self.head - len(self.frames))
+        if index < 0 or index >= len(self.frames):
+            return None
+        return self.frames[index]
+
+    async def wait_for(self, cursor: int) -> None:
+        """Wait until a frame at or after cursor has been published."""
+        while cursor >= self.head:
+            # A future of its own, so cancelling one writer leaves the others waiting
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters[waiter] = None
+            try:
+                await waiter
+            finally:
+                self._waiters.pop(waiter, None)
+
+class CaptionHistory:
+    """Fixed-size ring buffer of a room's recent captions, by sequence number.
+
+    Reconnecting viewers ask for everything after the last sequence number
+    they saw and get it back as one batched frame. Batches are memoized
+    until the next caption arrives, so a burst of reconnects asking for the
+    same point in history shares a single scan and a single encoding.
+    """
+
+    def __init__(self, capacity: int):
+        self.entries: Deque[Tuple[int, Optional[str], Dict[str, Any]]] = deque(maxlen=capacity)
+        self._batches: Dict[Tuple[str, int], Optional[Frame]] = {}
+
+    @property
+    def next_seq(self) -> int:
+        """Sequence number following the newest buffered caption."""
+        return self.entries[-1][0] + 1 if self.entries else 0
+
+    def append(self, seq: int, language: Optional[str], message: Dict[str, Any]) -> None:
+        """Record a caption; the oldest one falls out once the buffer is full."""
+        self.entries.append((seq, language, message))
+        self._batches.clear()
+
+    def since(self, language: str, seq: int) -> Optional[Frame]:
+        """Captions in a language with a sequence number after seq, as one frame.
+
+        Args:
+            language: Target language of the viewer
+            seq: Last sequence number the viewer received
+
+        Returns:
+            A caption_history frame, or None if nothing was missed
+        """
+        key = (language, seq)
+        if key in self._batches:
+            return self._batches[key]
+
+        # Missed captions are at the newest end, so scan backwards
+        captions: List[Dict[str, Any]] = []
+        for entry_seq, entry_language, message in reversed(self.entries):
+            if entry_seq <= seq:
+                break
+            if entry_language is None or entry_language == language:
+                captions.append(message)
+        captions.reverse()
+
+        frame = None
+        if captions:
+            frame = Frame({
+                "type": "caption_history",
+                "since": seq,
+                "captions": captions,
+                # The buffer no longer reaches back to seq; some captions are gone
+                "truncated": self.entries[0][0] > seq + 1,
+            })
+        self._batches[key] = frame
+        return frame
+
+class ViewerChannel:
+    """Outbound queue for one subscriber.
+
+    WebSocket subscribers are drained by their own writer task. Streaming
+    HTTP subscribers (no socket) pull frames with frames() from the
+    response body instead, so they need no task of their own.
+    """
+
+    def __init__(
+        self,
+        websocket: Optional[WebSocket],
+        fanout: RoomFanout,
+        slow_policy: str = SLOW_POLICY_COALESCE,
+        wire_format: str = FORMAT_JSON,
+    ):
+        """Initialize the channel.
+
+        Args:
+            websocket: Socket to write frames to, or None for a pull-based subscriber
+            fanout: Room log to read frames from
+            slow_policy: What to do when the viewer falls a full queue behind
+            wire_format: Format negotiated by the socket
+        """
+        self.websocket = websocket
+        self.fanout = fanout
+        self.slow_policy = slow_policy
+        self.wire_format = wire_format
+        self.cursor = fanout.head
+        self.backlog: Optional[Frame] = None  # Sent before any live frame
+        self.language: Optional[str] = None
+        self.coalesced = 0
+        self.too_slow = False
+        self.closed = False
+        self.sampled = next(_channel_numbers) % metrics.DELIVERY_SAMPLE_EVERY == 0
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the writer task."""
+        if self.task is None:
+            self.task = asyncio.create_task(self._writer())
+
+    async def frames(self, idle_timeout: Optional[float] = None) -> AsyncIterator[Optional[Frame]]:
+        """Yield frames in order, applying the slow policy.
+
+        Args:
+            idle_timeout: Yield None after this many seconds without a frame
+                (e.g. to send a keepalive); None waits indefinitely
+
+        Stops when the channel is closed, or sets too_slow and stops when a
+        viewer under the disconnect policy falls a full queue behind.
+        """
+        fanout = self.fanout
+        if self.backlog is not None:
+            backlog, self.backlog = self.backlog, None
+            yield backlog
+
+        while not self.closed:
+            if self.cursor >= fanout.head and idle_timeout is not None:
+                try:
+                    await asyncio.wait_for(fanout.wait_for(self.cursor), idle_timeout)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+            else:
+                await fanout.wait_for(self.cursor)
+
+            backlog = fanout.head - self.cursor
+            if backlog > fanout.max_queue:
+                if self.slow_policy == SLOW_POLICY_DISCONNECT:
+                    metrics.DROPPED_SLOW.inc()
+                    _viewer_log.warning(
+                        ("slow", fanout.room_id), "Disconnecting slow viewer (%d frames behind)", backlog,
+                        extra={"room": fanout.room_id, "language": fanout.language},
+                    )
+                    self.too_slow = True
+                    return
+                # Coalesce: drop the backlog and resume from the latest frame
+                self.coalesced += backlog - 1
+                self.cursor = fanout.head - 1
+
+            frame = fanout.frame_at(self.cursor)
+            self.cursor += 1
+            if frame is not None:
+                yield frame
+
+    async def _writer(self) -> None:
+        """Send frames to the socket in order until it fails or is closed."""
+        try:
+            async for frame in self.frames():
+                if self.websocket.client_state == WebSocketState.DISCONNECTED:
+                    return
+                await frame.send(self.websocket, self.wire_format)
+                if self.sampled and frame.published_at is not None:
+                    metrics.FANOUT_DELIVER.observe(time.perf_counter() - frame.published_at)
+            if self.too_slow:
+                await self.websocket.close(code=1008)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.DROPPED_SEND_ERROR.inc()
+            _viewer_log.warning(
+                ("send", self.fanout.room_id), "Error sending message to viewer: %s", e,
+                extra={"room": self.fanout.room_id, "language": self.fanout.language},
+            )
+        finally:
+            self.closed = True
+            self.fanout.channels.discard(self)
+
+    async def close(self) -> None:
+        """Stop delivering frames."""
+        self.closed = True
+        self.fanout.channels.discard(self)
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
 
 class BroadcastService:
-    """Service for broadcasting messages to viewers."""
-    
-    async def broadcast_to_room(self, room_id: str, message: Dict[str, Any]) -> None:
+    """Service for broadcasting messages to viewers.
+
+    Captions are published once through the room backend; every worker with
+    local subscribers in the room receives them and fans them out to its
+    own sockets.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = 64,
+        slow_policy: str = SLOW_POLICY_COALESCE,
+        backend: Optional[RoomBackend] = None,
+        history_size: int = 200,
+    ):
+        """Initialize the broadcast service.
+
+        Args:
+            max_queue: Frames a viewer may fall behind before the slow policy applies
+            slow_policy: "coalesce" to skip to the latest frame, "disconnect" to drop the viewer
+            backend: Room registry and pub/sub backend (in-process by default)
+            history_size: Captions kept per room for reconnecting viewers
+        """
+        self.max_queue = max_queue
+        self.slow_policy = slow_policy
+        self.backend = backend or RoomBackend()
+        self._started = False
+        # room_id -> target language -> frame log for this worker's subscribers
+        self.rooms: Dict[str, Dict[str, RoomFanout]] = {}
+        self.history_size = history_size
+        # room_id -> recent captions, kept while the room has local subscribers
+        self.histories: Dict[str, CaptionHistory] = {}
+        metrics.VIEWERS.set_function(self.channel_count)
+        metrics.FANOUT_MAX_BACKLOG.set_function(self.max_backlog)
+
+    async def start(self) -> None:
+        """Start receiving captions from the backend."""
+        if not self._started:
+            self._started = True
+            await self.backend.start(self._deliver_local)
+
+    async def close(self) -> None:
+        """Disconnect from the backend."""
+        if self._started:
+            self._started = False
+            await self.backend.close()
+
+    def channel_count(self) -> int:
+        """Subscribed channels on this worker (each broadcaster has one too)."""
+        return sum(len(fanout.channels) for languages in self.rooms.values() for fanout in languages.values())
+
+    def max_backlog(self) -> int:
+        """Frames the furthest-behind channel on this worker has yet to receive."""
+        return max(
+            (fanout.head - channel.cursor
+             for languages in self.rooms.values()
+             for fanout in languages.values()
+             for channel in fanout.channels),
+            default=0,
+        )
+
+    def _language_counts(self, room_id: str) -> Dict[str, int]:
+        return {
+            language: len(fanout.channels)
+            for language, fanout in self.rooms.get(room_id, {}).items()
+        }
+
+    async def subscribe(
+        self,
+        room_id: str,
+        websocket: Optional[WebSocket],
+        language: str,
+        since: Optional[int] = None,
+        wire_format: str = FORMAT_JSON,
+    ) -> ViewerChannel:
+        """Start delivering a room's messages in one target language to a socket.
+
+        Args:
+            room_id: Room ID
+            websocket: Viewer (or broadcaster) socket; None for a subscriber
+                that pulls frames itself with channel.frames()
+            language: Target language code the socket wants captions in
+            since: Last caption sequence number the socket saw; captions after
+                it are sent as one batch before live delivery starts
+            wire_format: Format negotiated by the socket
+
+        Returns:
+            The channel; pass it to unsubscribe when the socket goes away
+        """
+        await self.start()
+
+        new_room = room_id not in self.rooms
+        languages = self.rooms.setdefault(room_id, {})
+        fanout = languages.get(language)
+        if fanout is None:
+            fanout = languages[language] = RoomFanout(self.max_queue, room_id, language)
+
+        channel = ViewerChannel(websocket, fanout, self.slow_policy, wire_format)
+        channel.language = language
+        fanout.channels.add(channel)
+        # Taken together with the channel's cursor, so nothing is missed or sent twice
+        history = self.histories.setdefault(room_id, CaptionHistory(self.history_size))
+        if since is not None:
+            channel.backlog = history.since(language, since)
+        if websocket is not None:
+            channel.start()
+
+        if new_room:
+            await self.backend.subscribe(room_id)
+        await self.backend.set_languages(room_id, self._language_counts(room_id))
+        return channel
+
+    async def unsubscribe(self, room_id: str, channel: ViewerChannel) -> None:
+        """Stop delivering a room's messages to a channel.
+
+        Args:
+            room_id: Room ID
+            channel: Channel returned from subscribe
+        """
+        await channel.close()
+
+        # Drop the language once nobody is reading it, and the room once it is empty
+        languages = self.rooms.get(room_id)
+        if languages is None:
+            return
+        fanout = languages.get(channel.language)
+        if fanout is channel.fanout and not fanout.channels:
+            del languages[channel.language]
+        await self.backend.set_languages(room_id, self._language_counts(room_id))
+        if not languages:
+            del self.rooms[room_id]
+            self.histories.pop(room_id, None)
+            await self.backend.unsubscribe(room_id)
+
+    async def set_language(self, room_id: str, channel: ViewerChannel, language: str) -> ViewerChannel:
+        """Move a socket to another target language.
+
+        Args:
+            room_id: Room ID
+            channel: Channel returned from subscribe
+            language: New target language code
+
+        Returns:
+            The channel now delivering to the socket
+        """
+        if channel.language == language:
+            return channel
+        await self.unsubscribe(room_id, channel)
+        return await self.subscribe(room_id, channel.websocket, language, wire_format=channel.wire_format)
+
+    async def active_languages(self, room_id: str) -> List[str]:
+        """Target languages with at least one subscriber in a room, on any worker.
+
+        Args:
+            room_id: Room ID
+
+        Returns:
+            Language codes
+        """
+        counts = await self.backend.language_counts(room_id)
+        return [language for language, count in counts.items() if count > 0]
+
+    async def next_caption_seq(self, room_id: str) -> int:
+        """Sequence number to continue a room's captions from.
+
+        The room backend keeps the high-water mark, so numbering continues
+        even when this worker has no history for the room (no local
+        viewers, or the previous broadcaster was on another worker).
+
+        Args:
+            room_id: Room ID
+
+        Returns:
+            One past the newest caption published to the room, or 0 for a fresh room
+        """
+        history = self.histories.get(room_id)
+        local = history.next_seq if history is not None else 0
+        return max(local, await self.backend.next_caption_seq(room_id))
+
+    async def broadcast_to_room(self, room_id: str, message: Dict[str, Any], language: Optional[str] = None) -> None:
         """Broadcast a message to all viewers in a room.
-        
+
+        The message is serialized once and published once; each worker hands
+        it to its viewers' writers without waiting on any socket.
+
         Args:
             room_id: Room ID
             message: Message to broadcast
+            language: Only deliver to subscribers of this target language;
+                None delivers to every subscriber
         """
-        print(f"Broadcasting to room {room_id}: {message}")
-        
-        if room_id not in active_rooms:
-            print(f"Room {room_id} not found in active_rooms")
-            return
-        
-        if "viewers" not in active_rooms[room_id]:
-            print(f"No viewers key in room {room_id}")
+        await self.start()
+        started = time.perf_counter()
+        frame = Frame(message)
+        await self.backend.publish(room_id, language, message, frame.text)
+        metrics.FANOUT_PUBLISH.observe(time.perf_counter() - started)
+
+    def _deliver_local(self, room_id: str, language: Optional[str], message: Dict[str, Any], text: str) -> None:
+        """Hand a published message to this worker's subscribers."""
+        languages = self.rooms.get(room_id)
+        if not languages:
             return
-        
-        # Get viewers
-        viewers = active_rooms[room_id]["viewers"]
-        print(f"Found {len(viewers)} viewers in room {room_id}")
-        
-        # Send message to all viewers
-        disconnected_viewers = set()
-        sent_count = 0
-        for viewer in viewers:
-            try:
-                if viewer.client_state != WebSocketState.DISCONNECTED:
-                    await viewer.send_json(message)
-                    sent_count += 1
-                else:
-                    print(f"Viewer already disconnected, marking for removal")
-                    disconnected_viewers.add(viewer)
-            except Exception as e:
-                print(f"Error sending message to viewer: {e}")
-                # Mark viewer for removal
-                disconnected_viewers.add(viewer)
-        
-        print(f"Successfully sent message to {sent_count} viewers")
-        
-        # Remove disconnected viewers
-        for viewer in disconnected_viewers:
-            active_rooms[room_id]["viewers"].discard(viewer)
-            print(f"Removed disconnected viewer from room {room_id}")
-        
-        print(f"Room {room_id} now has {len(active_rooms[room_id]['viewers'])} viewers")
-
-        # Also send the message to the broadcaster if they exist
-        broadcaster = active_rooms[room_id].get("broadcaster")
-        if broadcaster:
-            try:
-                if broadcaster.client_state != WebSocketState.DISCONNECTED:
-                    await broadcaster.send_json(message)
-                    print(f"Sent message back to broadcaster in room {room_id}")
-                else:
-                    print(f"Broadcaster in room {room_id} is disconnected.")
-            except Exception as e:
-                print(f"Error sending message to broadcaster in room {room_id}: {e}")
-    
+
+        if message.get("type") == "caption" and message.get("seq") is not None:
+            self.histories[room_id].append(message["seq"], language, message)
+
+        frame = Frame(message, text)
+        frame.published_at = time.perf_counter()
+        if language is None:
+            for fanout in languages.values():
+                fanout.publish(frame)
+        elif language in languages:
+            languages[language].publish(frame)
+
     async def broadcast_to_all_rooms(self, message: Dict[str, Any]) -> None:
         """Broadcast a message to all viewers in all rooms.
-        
+
         Args:
             message: Message to broadcast
         """
-        for room_id in active_rooms:
+        for room_id in await self.backend.list_rooms():
             await self.broadcast_to_room(room_id, message)
@@ -0,0 +1,166 @@
+from typing import List, Optional, Set
+import asyncio
+import logging
+import math
+
+from starlette.websockets import WebSocket, WebSocketState
+
+from app.services import metrics
+from app.services.trace import now_ms
+from app.utils.log import RateLimitedLog
+
+logger = logging.getLogger(__name__)
+
+# A network blip can time out many viewers at once
+_evict_log = RateLimitedLog(logger)
+
+# Close code for viewers that stopped answering pings
+CLOSE_CODE_PING_TIMEOUT = 1011
+
+class Heartbeat:
+    """Liveness state for one connection, filed in one timer wheel slot."""
+
+    __slots__ = ("websocket", "last_seen", "ping_sent", "slot", "timed")
+
+    def __init__(self, websocket: WebSocket, now: float, timed: bool = False):
+        self.websocket = websocket
+        self.last_seen = now  # Last time the client sent anything
+        self.ping_sent: Optional[float] = None  # Set while waiting for a reply
+        self.slot = -1
+        self.timed = timed  # Pings carry the server's clock for offset estimation
+
+class HeartbeatManager:
+    """One timer wheel that pings every registered connection.
+
+    Instead of a ping task and receive timeout per viewer, connections sit
+    in the slot of a wheel for when they are next due, and a single task
+    advances the wheel every tick. Due connections are pinged in batches;
+    a connection that sends nothing (pong or otherwise) within timeout of
+    a ping is closed. An idle viewer costs one small record and one ping
+    per interval.
+    """
+
+    def __init__(self, interval: float = 30.0, timeout: float = 15.0, tick: float = 1.0, batch_size: int = 500):
+        """Initialize the manager.
+
+        Args:
+            interval: Seconds between pings to a connection
+            timeout: Seconds to wait for a reply before closing the connection
+            tick: Wheel resolution in seconds
+            batch_size: Pings sent concurrently
+        """
+        self.interval = interval
+        self.timeout = min(timeout, interval)
+        self.tick = tick
+        self.batch_size = batch_size
+        self._slots: List[Set[Heartbeat]] = [set() for _ in range(max(2, math.ceil(interval / tick)))]
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+        self._closing: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self._slots)
+
+    def _schedule(self, heartbeat: Heartbeat, delay: float) -> None:
+        ticks = min(len(self._slots), max(1, round(delay / self.tick)))
+        heartbeat.slot = (self._cursor + ticks) % len(self._slots)
+        self._slots[heartbeat.slot].add(heartbeat)
+
+    def register(self, websocket: WebSocket, timed: bool = False) -> Heartbeat:
+        """Start pinging a connection; the first ping is one interval from now.
+
+        Args:
+            websocket: Connection to ping
+            timed: Send "ping <server ms>" instead of "ping", for clients
+                that echo it back with their own clock
+        """
+        heartbeat = Heartbeat(websocket, asyncio.get_running_loop().time(), timed)
+        self._schedule(heartbeat, self.interval)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        return heartbeat
+
+    def touch(self, heartbeat: Heartbeat) -> None:
+        """Record that the client sent something."""
+        heartbeat.last_seen = asyncio.get_running_loop().time()
+
+    def unregister(self, heartbeat: Heartbeat) -> None:
+        """Stop pinging a connection."""
+        if heartbeat.slot >= 0:
+            self._slots[heartbeat.slot].discard(heartbeat)
+            heartbeat.slot = -1
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            # Fixed-rate ticks, so a slow sweep doesn't push the wheel back
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self._cursor = (self._cursor + 1) % len(self._slots)
+            due = self._slots[self._cursor]
+            if not due:
+                continue
+            self._slots[self._cursor] = set()
+            try:
+                await self._sweep(due, loop.time())
+            except Exception:
+                logger.exception("Error in heartbeat sweep")
+
+    async def _sweep(self, due: Set[Heartbeat], now: float) -> None:
+        to_ping: List[Heartbeat] = []
+        for heartbeat in due:
+            heartbeat.slot = -1
+            if heartbeat.websocket.client_state != WebSocketState.CONNECTED:
+                continue  # Closing already; its handler will unregister it
+            if heartbeat.ping_sent is not None:
+                if heartbeat.last_seen < heartbeat.ping_sent:
+                    self._evict(heartbeat)
+                    continue
+                # Answered; the next ping is due one interval after the last
+                heartbeat.ping_sent = None
+                self._schedule(heartbeat, self.interval - self.timeout)
+            else:
+                to_ping.append(heartbeat)
+
+        for start in range(0, len(to_ping), self.batch_size):
+            batch = to_ping[start:start + self.batch_size]
+            for heartbeat in batch:
+                heartbeat.ping_sent = now
+                self._schedule(heartbeat, self.timeout)
+            timed_ping = f"ping {now_ms()}"
+            pings = [
+                asyncio.ensure_future(heartbeat.websocket.send_text(timed_ping if heartbeat.timed else "ping"))
+                for heartbeat in batch
+            ]
+            _, pending = await asyncio.wait(pings, timeout=self.timeout)
+            for ping in pending:
+                ping.cancel()  # Stuck writing; the reply check will close it
+            for ping in pings:
+                if ping.done() and not ping.cancelled():
+                    ping.exception()  # Failed sends show up as disconnects in the handler
+
+    def _evict(self, heartbeat: Heartbeat) -> None:
+        metrics.DROPPED_HEARTBEAT.inc()
+        _evict_log.info("evict", "Closing viewer that stopped answering pings")
+        # Closing waits for the client's close frame, which may never come
+        task = asyncio.create_task(self._close(heartbeat.websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, websocket: WebSocket) -> None:
+        try:
+            await websocket.close(code=CLOSE_CODE_PING_TIMEOUT)
+        except Exception:
+            pass
+
+    async def close(self) -> None:
+        """Stop the wheel."""
+        tasks = list(self._closing)
+        if self._task is not None:
+            tasks.append(self._task)
+            self._task.cancel()
+            self._task = None
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,288 @@
+from typing import Dict, Any, List, Optional, AsyncIterator, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+from app.services.vtt import format_timestamp, escape_cue_text
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from a journal file per worker-thread call when exporting
+READ_CHUNK_SIZE = 64 * 1024
+
+def safe_name(value: str) -> str:
+    """Readable file name part for a value, with unsafe characters replaced."""
+    return re.sub(r"[^A-Za-z0-9_-]", "_", value)[:128] or "_"
+
+def safe_room_dir(room_id: str) -> str:
+    """Directory name for a room that can't escape the journal directory.
+
+    The readable part is lossy ("a.b" and "a_b" look the same), so a hash
+    of the raw room ID keeps every room's directory distinct.
+    """
+    digest = hashlib.sha256(room_id.encode("utf-8")).hexdigest()[:12]
+    return f"{safe_name(room_id)[:112]}-{digest}"
+
+class RoomJournal:
+    """Append-only JSONL journal for one room, split into segment files.
+
+    Records are buffered in memory and written by TranscriptJournal's
+    flusher. A new segment file is started when the current one reaches
+    max_bytes or has been open for max_age seconds.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, max_age: float):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.pending: List[str] = []
+        self._file = None
+        self._file_bytes = 0
+        self._file_opened = 0.0
+        self._index = 0
+
+    def _segment_path(self, index: int) -> str:
+        return os.path.join(self.directory, f"{index:06d}.jsonl")
+
+    def _open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        if self._file is None and not self._index:
+            # Continue after any segments left by an earlier broadcast
+            existing = [name for name in os.listdir(self.directory) if name.endswith(".jsonl")]
+            self._index = len(existing)
+        self._file = open(self._segment_path(self._index), "a", encoding="utf-8")
+        self._file_bytes = self._file.tell()
+        self._file_opened = time.time()
+        self._index += 1
+
+    def write(self, lines: List[str]) -> None:
+        """Append lines to the current segment, rotating first if it is due (worker thread)."""
+        now = time.time()
+        if self._file is not None and (
+            self._file_bytes >= self.max_bytes or now - self._file_opened >= self.max_age
+        ):
+            self._file.close()
+            self._file = None
+        if self._file is None:
+            self._open()
+        data = "".join(lines)
+        self._file.write(data)
+        self._file.flush()
+        self._file_bytes += len(data.encode("utf-8"))
+
+    def close(self) -> None:
+        """Close the current segment file (worker thread)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+class TranscriptJournal:
+    """Per-room append-only transcript journals on disk.
+
+    append() only buffers, so the caption pipeline never waits on disk; a
+    single background task writes every room's buffered records from a
+    worker thread each flush_interval seconds.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_segment_bytes: int = 16 * 1024 * 1024,
+        max_segment_age: float = 3600.0,
+        flush_interval: float = 1.0,
+    ):
+        """Initialize the journal.
+
+        Args:
+            directory: Directory holding one subdirectory of segment files per room
+            max_segment_bytes: Start a new segment file after this many bytes
+            max_segment_age: Start a new segment file after this many seconds
+            flush_interval: Seconds between writes of buffered records
+        """
+        self.directory = directory
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_age = max_segment_age
+        self.flush_interval = flush_interval
+        self.rooms: Dict[str, RoomJournal] = {}
+        self._write_lock = threading.Lock()
+        self._flush_lock = asyncio.Lock()  # Keeps batches for a room in order
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def _room(self, room_id: str) -> RoomJournal:
+        journal = self.rooms.get(room_id)
+        if journal is None:
+            journal = self.rooms[room_id] = RoomJournal(
+                os.path.join(self.directory, safe_room_dir(room_id)),
+                self.max_segment_bytes,
+                self.max_segment_age,
+            )
+        return journal
+
+    def append(self, room_id: str, record: Dict[str, Any]) -> None:
+        """Buffer a record for a room's journal.
+
+        Args:
+            room_id: Room ID
+            record: JSON-serializable record
+        """
+        self._room(room_id).pending.append(json.dumps(record, ensure_ascii=False) + "\n")
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def flush(self, room_id: Optional[str] = None) -> None:
+        """Write buffered records now.
+
+        Args:
+            room_id: Only flush this room; None flushes every room
+        """
+        async with self._flush_lock:
+            if room_id is None:
+                rooms = list(self.rooms.values())
+            else:
+                rooms = [self.rooms[room_id]] if room_id in self.rooms else []
+            batches: List[Tuple[RoomJournal, List[str]]] = []
+            for journal in rooms:
+                if journal.pending:
+                    batches.append((journal, journal.pending))
+                    journal.pending = []
+            if batches:
+                await asyncio.to_thread(self._write, batches)
+
+    def _write(self, batches: List[Tuple[RoomJournal, List[str]]]) -> None:
+        with self._write_lock:
+            for journal, lines in batches:
+                try:
+                    journal.write(lines)
+                except OSError as e:
+                    logger.error("Error writing journal to %s: %s", journal.directory, e)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception:
+                logger.exception("Error flushing journal")
+
+    async def close_room(self, room_id: str) -> None:
+        """Flush a room's records and close its segment file."""
+        await self.flush(room_id)
+        journal = self.rooms.pop(room_id, None)
+        if journal is not None:
+            await asyncio.to_thread(self._close, journal)
+
+    def _close(self, journal: RoomJournal) -> None:
+        with self._write_lock:
+            journal.close()
+
+    async def close(self) -> None:
+        """Flush everything and stop the background task."""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        for room_id in list(self.rooms):
+            await self.close_room(room_id)
+
+    def segment_files(self, room_id: str) -> List[str]:
+        """A room's segment files, oldest first."""
+        directory = os.path.join(self.directory, safe_room_dir(room_id))
+        if not os.path.isdir(directory):
+            return []
+        return [
+            os.path.join(directory, name)
+            for name in sorted(os.listdir(directory))
+            if name.endswith(".jsonl")
+        ]
+
+    async def records(self, room_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream a room's records from disk, oldest first.
+
+        Files are read in fixed-size chunks from a worker thread, so memory
+        stays flat however long the transcript is.
+        """
+        await self.flush(room_id)
+        for path in await asyncio.to_thread(self.segment_files, room_id):
+            handle = await asyncio.to_thread(open, path, "rb")
+            skipped = 0
+            try:
+                remainder = b""
+                while True:
+                    chunk = await asyncio.to_thread(handle.read, READ_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    lines = (remainder + chunk).split(b"\n")
+                    remainder = lines.pop()
+                    for line in lines:
+                        if not line.strip():
+                            continue
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            skipped += 1  # Damaged, e.g. by a crash mid-write
+                            continue
+                        yield record
+                if remainder.strip():
+                    try:
+                        yield json.loads(remainder)
+                    except ValueError:
+                        pass  # A record still being written
+
+            finally:
+                handle.close()
+                if skipped:
+                    logger.warning("Skipped %d undecodable records in %s", skipped, path)
+
+# Longest a caption stays on screen in exported subtitles
+EXPORT_MAX_CUE_DURATION = 5.0
+
+async def _cues(records: AsyncIterator[Dict[str, Any]], language: Optional[str]) -> AsyncIterator[Tuple[float, float, str]]:
+    """(start, end, text) per record, timed from the first record.
+
+    A cue ends when the next one starts, or after EXPORT_MAX_CUE_DURATION.
+    language None exports the source text.
+    """
+    origin: Optional[float] = None
+    pending: Optional[Tuple[float, str]] = None
+    async for record in records:
+        text = record.get("original", "") if language is None else record.get("translations", {}).get(language)
+        if not text:
+            continue
+        at = record.get("timestamps", {}).get("final", 0.0)
+        if origin is None:
+            origin = at
+        start = max(0.0, at - origin)
+        if pending is not None:
+            yield pending[0], min(start, pending[0] + EXPORT_MAX_CUE_DURATION), pending[1]
+        pending = (start, text)
+    if pending is not None:
+        yield pending[0], pending[0] + EXPORT_MAX_CUE_DURATION, pending[1]
+
+async def export_srt(records: AsyncIterator[Dict[str, Any]], language: Optional[str]) -> AsyncIterator[str]:
+    """Render records as SubRip, one cue at a time."""
+    index = 0
+    async for start, end, text in _cues(records, language):
+        index += 1
+        timing = f"{format_timestamp(start)} --> {format_timestamp(end)}".replace(".", ",")
+        yield f"{index}\n{timing}\n{text}\n\n"
+
+async def export_vtt(records: AsyncIterator[Dict[str, Any]], language: Optional[str]) -> AsyncIterator[str]:
+    """Render records as WebVTT, one cue at a time."""
+    yield "WEBVTT\n\n"
+    async for start, end, text in _cues(records, language):
+        yield f"{format_timestamp(start)} --> {format_timestamp(end)}\n{escape_cue_text(text)}\n\n"
+
+async def export_jsonl(records: AsyncIterator[Dict[str, Any]], language: Optional[str]) -> AsyncIterator[str]:
+    """Render records as JSON lines, keeping only one language's translation if given."""
+    async for record in records:
+        if language is not None:
+            translations = record.get("translations", {})
+            if language not in translations:
+                continue
+            record = dict(record, translations={language: translations[language]})
+        yield json.dumps(record, ensure_ascii=False) + "\n"
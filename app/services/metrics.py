@@ -0,0 +1,101 @@
+from prometheus_client import Counter, Gauge, Histogram
+import asyncio
+
+from app.utils.state import active_rooms
+
+# Metrics live in the default registry and are served by /metrics. Values
+# that can be read off existing state (rooms, viewers, queue depths) are
+# gauges computed at scrape time, so they cost nothing on the hot path;
+# histogram and counter updates are a lock and a few additions.
+
+# Pipeline stage latencies run from tens of milliseconds to several seconds
+LATENCY_BUCKETS = (0.025, 0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 20.0)
+
+# Handing a caption to viewers should take well under a millisecond per step
+FANOUT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+STT_LATENCY = Histogram(
+    "unbabel_stt_latency_seconds",
+    "End of the spoken audio to the STT provider's final transcript (audio timing estimated from stream offsets)",
+    buckets=LATENCY_BUCKETS,
+)
+TRANSLATION_LATENCY = Histogram(
+    "unbabel_translation_seconds",
+    "Translation duration: OpenAI requests (complete, stream) and local model batches (local); cache hits excluded",
+    ["mode"],
+    buckets=LATENCY_BUCKETS,
+)
+FANOUT_LATENCY = Histogram(
+    "unbabel_fanout_seconds",
+    "Caption fan-out: serialize and publish (publish), publish to a sampled viewer's socket write (deliver)",
+    ["stage"],
+    buckets=FANOUT_BUCKETS,
+)
+CAPTION_LATENCY = Histogram(
+    "unbabel_caption_latency_seconds",
+    "End of the spoken audio to the caption being released to fan-out",
+    buckets=LATENCY_BUCKETS,
+)
+GLASS_TO_GLASS = Histogram(
+    "unbabel_glass_to_glass_seconds",
+    "End of the spoken audio to the caption shown on a sampled viewer's screen (from viewer receipts)",
+    buckets=LATENCY_BUCKETS,
+)
+TRANSLATION_BATCH_SIZE = Histogram(
+    "unbabel_translation_batch_size",
+    "Segments translated together in one local model batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+EVENT_LOOP_LAG = Histogram(
+    "unbabel_event_loop_lag_seconds",
+    "How late the event loop woke a timer set every LOOP_LAG_INTERVAL seconds",
+    buckets=FANOUT_BUCKETS,
+)
+
+AUDIO_BYTES = Counter("unbabel_audio_bytes", "Audio bytes received from broadcasters")
+AUDIO_CHUNKS_DROPPED = Counter("unbabel_audio_chunks_dropped", "Audio chunks dropped because the STT buffer was full")
+SEGMENTS = Counter("unbabel_segments", "Merged segments submitted for translation")
+TRANSLATION_ERRORS = Counter("unbabel_translation_errors", "Failed translation requests")
+TRANSLATION_FALLBACKS = Counter("unbabel_translation_fallbacks", "Translations handed to the fallback engine after the primary failed or was slow")
+VIEWERS_DROPPED = Counter("unbabel_viewers_dropped", "Viewers disconnected by the server", ["reason"])
+
+ROOMS = Gauge("unbabel_rooms", "Rooms broadcasting on this worker")
+VIEWERS = Gauge("unbabel_viewers", "Subscribed caption channels on this worker (WebSocket and SSE viewers, plus one per broadcaster)")
+STT_BUFFERED_CHUNKS = Gauge("unbabel_stt_buffered_chunks", "Audio chunks waiting to be sent to the STT provider")
+TRANSLATION_PENDING = Gauge("unbabel_translation_pending_segments", "Segments submitted but not yet released, across rooms")
+FANOUT_MAX_BACKLOG = Gauge("unbabel_fanout_max_backlog_frames", "Frames the furthest-behind viewer has yet to receive")
+
+# Labelled series, bound once: looking up labels costs as much as recording
+TRANSLATION_COMPLETE = TRANSLATION_LATENCY.labels("complete")
+TRANSLATION_STREAM = TRANSLATION_LATENCY.labels("stream")
+TRANSLATION_LOCAL = TRANSLATION_LATENCY.labels("local")
+FANOUT_PUBLISH = FANOUT_LATENCY.labels("publish")
+FANOUT_DELIVER = FANOUT_LATENCY.labels("deliver")
+DROPPED_SLOW = VIEWERS_DROPPED.labels("slow")
+DROPPED_SEND_ERROR = VIEWERS_DROPPED.labels("send_error")
+DROPPED_HEARTBEAT = VIEWERS_DROPPED.labels("heartbeat")
+
+# Record delivery time for one viewer in this many
+DELIVERY_SAMPLE_EVERY = 16
+
+# Seconds between event loop lag samples
+LOOP_LAG_INTERVAL = 0.25
+
+def _pending_segments() -> int:
+    pending = 0
+    for room in list(active_rooms.values()):
+        scheduler = room.get("scheduler")
+        if scheduler is not None:
+            pending += scheduler.next_seq - scheduler.release_seq
+    return pending
+
+async def watch_loop_lag() -> None:
+    """Sample event loop lag until cancelled."""
+    loop = asyncio.get_running_loop()
+    while True:
+        due = loop.time() + LOOP_LAG_INTERVAL
+        await asyncio.sleep(LOOP_LAG_INTERVAL)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - due))
+
+ROOMS.set_function(lambda: sum(1 for room in list(active_rooms.values()) if "scheduler" in room))
+TRANSLATION_PENDING.set_function(_pending_segments)
@@ -0,0 +1,354 @@
+from typing import Dict, Any, List, Optional, Callable, Set, Tuple
+import asyncio
+import json
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Called with (room_id, language, message, encoded message) for captions to deliver locally
+DeliverCallback = Callable[[str, Optional[str], Dict[str, Any], str], None]
+
+class RoomBackend:
+    """In-process room registry and caption pub/sub.
+
+    Suitable for a single worker: rooms, language subscriptions and
+    captions never leave the process. RedisRoomBackend implements the same
+    interface across workers and instances.
+    """
+
+    def __init__(self):
+        self.rooms: Dict[str, Dict[str, Any]] = {}
+        self.languages: Dict[str, Dict[str, int]] = {}
+        self.caption_seqs: Dict[str, int] = {}  # room_id -> sequence number after its newest caption
+        self._deliver: Optional[DeliverCallback] = None
+
+    async def start(self, deliver: DeliverCallback) -> None:
+        """Start receiving captions.
+
+        Args:
+            deliver: Called for every caption published to a room this worker subscribes to
+        """
+        self._deliver = deliver
+
+    async def close(self) -> None:
+        """Release backend resources."""
+        self._deliver = None
+
+    async def register_room(self, room_id: str, info: Dict[str, Any]) -> None:
+        """Record that a room exists.
+
+        Args:
+            room_id: Room ID
+            info: Room metadata (e.g. source language)
+        """
+        self.rooms[room_id] = dict(info, updated=time.time())
+
+    async def unregister_room(self, room_id: str, owner: Optional[str] = None) -> None:
+        """Forget a room once its broadcast has ended.
+
+        Args:
+            room_id: Room ID
+            owner: Only forget it if the registration's "owner" still matches,
+                so a broadcaster that has already reconnected keeps its room
+        """
+        info = self.rooms.get(room_id)
+        if info is not None and (owner is None or info.get("owner") == owner):
+            del self.rooms[room_id]
+
+    async def room_exists(self, room_id: str) -> bool:
+        """Whether a room has been registered by any worker."""
+        return room_id in self.rooms
+
+    async def list_rooms(self) -> Dict[str, Dict[str, Any]]:
+        """All registered rooms and their metadata."""
+        return dict(self.rooms)
+
+    async def publish(self, room_id: str, language: Optional[str], message: Dict[str, Any], text: str) -> None:
+        """Publish a caption to every worker subscribed to a room.
+
+        Args:
+            room_id: Room ID
+            language: Target language, or None for every subscriber
+            message: Message dict
+            text: The message already encoded as JSON
+        """
+        if message.get("type") == "caption" and message.get("seq") is not None:
+            self.caption_seqs[room_id] = max(self.caption_seqs.get(room_id, 0), message["seq"] + 1)
+        if self._deliver is not None:
+            self._deliver(room_id, language, message, text)
+
+    async def next_caption_seq(self, room_id: str) -> int:
+        """Sequence number following the newest caption published to a room, or 0."""
+        return self.caption_seqs.get(room_id, 0)
+
+    async def store_vtt(self, room_id: str, language: str, files: List[Tuple[str, bytes]], ttl: float) -> None:
+        """Share a room's WebVTT files so any worker can serve them.
+
+        A single worker serves its own rooms' WebVTT, so nothing is stored.
+
+        Args:
+            room_id: Room ID
+            language: Caption language
+            files: (name, body) pairs, written in order
+            ttl: Seconds to keep each file after it was last written
+        """
+
+    async def vtt_file(self, room_id: str, language: str, name: str) -> Optional[bytes]:
+        """A WebVTT file shared by the worker running a room's broadcaster, or None."""
+        return None
+
+    async def subscribe(self, room_id: str) -> None:
+        """Start receiving a room's captions on this worker."""
+
+    async def unsubscribe(self, room_id: str) -> None:
+        """Stop receiving a room's captions on this worker."""
+
+    async def set_languages(self, room_id: str, counts: Dict[str, int]) -> None:
+        """Record this worker's subscriber count per target language for a room."""
+        if counts:
+            self.languages[room_id] = dict(counts)
+        else:
+            self.languages.pop(room_id, None)
+
+    async def language_counts(self, room_id: str) -> Dict[str, int]:
+        """Subscriber count per target language for a room, across all workers."""
+        return dict(self.languages.get(room_id, {}))
+
+class RedisRoomBackend(RoomBackend):
+    """Room registry and caption pub/sub shared through Redis.
+
+    Each caption is published once to the room's channel; every worker with
+    local subscribers in the room receives it and fans it out locally.
+    Per-worker language subscriptions and the rooms a worker broadcasts
+    are stored with a timestamp and refreshed periodically, so a crashed
+    worker's viewers stop counting and its rooms disappear once their
+    entries go stale. Each room's newest caption sequence number is kept
+    for CAPTION_SEQ_TTL seconds after its last caption, so a broadcaster
+    reconnecting to any worker continues the numbering. Finished WebVTT
+    segments and playlists are stored with an expiry, so VTT requests can
+    land on any worker.
+    """
+
+    ROOMS_KEY = "unbabel:rooms"
+    CONTROL_CHANNEL = "unbabel:control"
+    CAPTION_SEQ_TTL = 24 * 3600
+
+    def __init__(self, url: str = "redis://localhost:6379", client: Any = None, refresh_interval: float = 15.0):
+        """Initialize the Redis backend.
+
+        Args:
+            url: Redis URL, used when no client is given
+            client: Existing redis.asyncio client (e.g. a fake for tests)
+            refresh_interval: Seconds between refreshes of this worker's room and language entries
+        """
+        super().__init__()
+        if client is None:
+            import redis.asyncio as redis
+            client = redis.from_url(url)
+        self.client = client
+        self.worker_id = uuid.uuid4().hex
+        self.refresh_interval = refresh_interval
+        self.stale_after = refresh_interval * 3
+        self._pubsub = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._local_languages: Dict[str, Dict[str, int]] = {}
+        self._local_rooms: Dict[str, Dict[str, Any]] = {}
+        self._subscribed: Set[str] = set()
+
+    @staticmethod
+    def _channel(room_id: str) -> str:
+        return f"unbabel:captions:{room_id}"
+
+    @staticmethod
+    def _languages_key(room_id: str) -> str:
+        return f"unbabel:room:{room_id}:languages"
+
+    @staticmethod
+    def _seq_key(room_id: str) -> str:
+        return f"unbabel:room:{room_id}:seq"
+
+    @staticmethod
+    def _vtt_key(room_id: str, language: str, name: str) -> str:
+        return f"unbabel:room:{room_id}:vtt:{language}:{name}"
+
+    async def start(self, deliver: DeliverCallback) -> None:
+        """Connect the pub/sub reader and start refreshing language entries."""
+        await super().start(deliver)
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        # Keep one channel subscribed so the reader always has a connection
+        await self._pubsub.subscribe(self.CONTROL_CHANNEL)
+        self._reader_task = asyncio.create_task(self._read_loop())
+        self._refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        """Stop background tasks and remove this worker's entries."""
+        for task in (self._reader_task, self._refresh_task):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(
+            *(t for t in (self._reader_task, self._refresh_task) if t is not None),
+            return_exceptions=True,
+        )
+        for room_id in list(self._local_languages):
+            await self.client.hdel(self._languages_key(room_id), self.worker_id)
+        for room_id, info in list(self._local_rooms.items()):
+            await self.unregister_room(room_id, info.get("owner"))
+        if self._pubsub is not None:
+            await self._pubsub.aclose()
+        await super().close()
+
+    async def register_room(self, room_id: str, info: Dict[str, Any]) -> None:
+        self._local_rooms[room_id] = dict(info)
+        await self._write_room(room_id)
+
+    async def unregister_room(self, room_id: str, owner: Optional[str] = None) -> None:
+        from redis.exceptions import WatchError
+        if owner is None or self._local_rooms.get(room_id, {}).get("owner") == owner:
+            self._local_rooms.pop(room_id, None)
+        # Check and delete in one transaction; another worker may have just
+        # re-registered the room for a reconnected broadcaster
+        for _ in range(3):
+            async with self.client.pipeline(transaction=True) as pipe:
+                try:
+                    await pipe.watch(self.ROOMS_KEY)
+                    value = await pipe.hget(self.ROOMS_KEY, room_id)
+                    if value is None or (owner is not None and json.loads(value).get("owner") != owner):
+                        return
+                    pipe.multi()
+                    pipe.hdel(self.ROOMS_KEY, room_id)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+        # Still contended; the entry goes stale once nobody refreshes it
+
+    async def room_exists(self, room_id: str) -> bool:
+        value = await self.client.hget(self.ROOMS_KEY, room_id)
+        return value is not None and json.loads(value)["updated"] >= time.time() - self.stale_after
+
+    async def list_rooms(self) -> Dict[str, Dict[str, Any]]:
+        rooms = await self.client.hgetall(self.ROOMS_KEY)
+        cutoff = time.time() - self.stale_after
+        live: Dict[str, Dict[str, Any]] = {}
+        stale: List[str] = []
+        for key, value in rooms.items():
+            room_id = key.decode() if isinstance(key, bytes) else key
+            info = json.loads(value)
+            if info["updated"] < cutoff:
+                stale.append(room_id)
+            else:
+                live[room_id] = info
+        if stale:
+            # Left behind by a worker that died mid-broadcast
+            await self.client.hdel(self.ROOMS_KEY, *stale)
+        return live
+
+    async def publish(self, room_id: str, language: Optional[str], message: Dict[str, Any], text: str) -> None:
+        # Envelope: target language (empty for all) and the already-encoded message
+        envelope = f"{language or ''}\n{text}"
+        if message.get("type") != "caption" or message.get("seq") is None:
+            await self.client.publish(self._channel(room_id), envelope)
+            return
+        # Raise the room's high-water mark in the same round trip; GT keeps
+        # it from going backwards if two broadcasters overlap
+        async with self.client.pipeline(transaction=False) as pipe:
+            pipe.zadd(self._seq_key(room_id), {"seq": message["seq"]}, gt=True)
+            pipe.expire(self._seq_key(room_id), self.CAPTION_SEQ_TTL)
+            pipe.publish(self._channel(room_id), envelope)
+            await pipe.execute()
+
+    async def next_caption_seq(self, room_id: str) -> int:
+        seq = await self.client.zscore(self._seq_key(room_id), "seq")
+        return int(seq) + 1 if seq is not None else 0
+
+    async def store_vtt(self, room_id: str, language: str, files: List[Tuple[str, bytes]], ttl: float) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for name, body in files:
+                pipe.set(self._vtt_key(room_id, language, name), body, px=int(ttl * 1000))
+            await pipe.execute()
+
+    async def vtt_file(self, room_id: str, language: str, name: str) -> Optional[bytes]:
+        return await self.client.get(self._vtt_key(room_id, language, name))
+
+    async def subscribe(self, room_id: str) -> None:
+        if room_id not in self._subscribed:
+            self._subscribed.add(room_id)
+            await self._pubsub.subscribe(self._channel(room_id))
+
+    async def unsubscribe(self, room_id: str) -> None:
+        if room_id in self._subscribed:
+            self._subscribed.discard(room_id)
+            await self._pubsub.unsubscribe(self._channel(room_id))
+
+    async def set_languages(self, room_id: str, counts: Dict[str, int]) -> None:
+        if counts:
+            self._local_languages[room_id] = dict(counts)
+            await self._write_languages(room_id)
+        else:
+            self._local_languages.pop(room_id, None)
+            await self.client.hdel(self._languages_key(room_id), self.worker_id)
+
+    async def language_counts(self, room_id: str) -> Dict[str, int]:
+        entries = await self.client.hgetall(self._languages_key(room_id))
+        cutoff = time.time() - self.stale_after
+        totals: Dict[str, int] = {}
+        for value in entries.values():
+            entry = json.loads(value)
+            if entry["updated"] < cutoff:
+                continue
+            for language, count in entry["counts"].items():
+                totals[language] = totals.get(language, 0) + count
+        return totals
+
+    async def _write_room(self, room_id: str) -> None:
+        await self.client.hset(
+            self.ROOMS_KEY, room_id, json.dumps(dict(self._local_rooms[room_id], updated=time.time()))
+        )
+
+    async def _write_languages(self, room_id: str) -> None:
+        await self.client.hset(
+            self._languages_key(room_id),
+            self.worker_id,
+            json.dumps({"counts": self._local_languages[room_id], "updated": time.time()}),
+        )
+
+    async def _read_loop(self) -> None:
+        """Deliver captions from subscribed room channels to local viewers."""
+        prefix = self._channel("")
+        while True:
+            try:
+                async for item in self._pubsub.listen():
+                    if item.get("type") != "message":
+                        continue
+                    channel = item["channel"]
+                    channel = channel.decode() if isinstance(channel, bytes) else channel
+                    if not channel.startswith(prefix):
+                        continue
+                    data = item["data"]
+                    data = data.decode() if isinstance(data, bytes) else data
+                    language, _, text = data.partition("\n")
+                    if self._deliver is not None:
+                        self._deliver(channel[len(prefix):], language or None, json.loads(text), text)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error reading room pub/sub: %s", e)
+                await asyncio.sleep(1.0)
+
+    async def _refresh_loop(self) -> None:
+        """Keep this worker's room and language entries fresh."""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            for room_id in list(self._local_rooms):
+                try:
+                    await self._write_room(room_id)
+                except Exception as e:
+                    logger.warning("Error refreshing room: %s", e, extra={"room": room_id})
+            for room_id in list(self._local_languages):
+                try:
+                    await self._write_languages(room_id)
+                except Exception as e:
+                    logger.warning("Error refreshing languages: %s", e, extra={"room": room_id})
@@ -0,0 +1,120 @@
+from typing import Dict, Any, List, Callable, Awaitable, Optional, Tuple
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TranslationScheduler:
+    """Runs several segment translations at once for a room, releasing results in order.
+
+    Every submitted segment gets a monotonic sequence number. Up to
+    max_in_flight segments are translated concurrently; finished results
+    wait in a reorder buffer until every earlier segment has been released.
+    """
+
+    def __init__(
+        self,
+        translate: Callable[[Dict[str, Any]], Awaitable[List[Any]]],
+        deliver: Callable[[Dict[str, Any], List[Any]], None],
+        max_in_flight: int = 3,
+        start_seq: int = 0,
+    ):
+        """Initialize the scheduler.
+
+        Args:
+            translate: Coroutine function turning a segment into a list of captions
+            deliver: Called with each segment and its captions, in sequence order
+            max_in_flight: Maximum concurrent translations
+            start_seq: Sequence number for the first segment
+        """
+        self.translate = translate
+        self.deliver = deliver
+        self.max_in_flight = max_in_flight
+        self.next_seq = start_seq     # Sequence number for the next submitted segment
+        self.release_seq = start_seq  # Sequence number of the next segment to deliver
+        self.in_flight = 0
+        self.last_lag = 0.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._submitted_at: Dict[int, float] = {}
+        self._reorder: Dict[int, Tuple[Dict[str, Any], List[Any]]] = {}
+        self._workers: List[asyncio.Task] = []
+        self._idle = asyncio.Event()  # Set while every submitted segment has been delivered
+        self._idle.set()
+
+    def start(self) -> None:
+        """Start the worker tasks."""
+        if not self._workers:
+            self._workers = [
+                asyncio.create_task(self._worker()) for _ in range(self.max_in_flight)
+            ]
+
+    def submit(self, segment: Dict[str, Any]) -> int:
+        """Queue a segment for translation.
+
+        Args:
+            segment: Merged segment; its "seq" key is set here
+
+        Returns:
+            The segment's sequence number
+        """
+        seq = self.next_seq
+        self.next_seq += 1
+        segment["seq"] = seq
+        self._submitted_at[seq] = asyncio.get_running_loop().time()
+        self._idle.clear()
+        self._queue.put_nowait(segment)
+        return seq
+
+    def is_next(self, seq: int) -> bool:
+        """Whether a segment is the next one due for release."""
+        return seq == self.release_seq
+
+    async def _worker(self) -> None:
+        while True:
+            segment = await self._queue.get()
+            self.in_flight += 1
+            try:
+                captions = await self.translate(segment)
+            except Exception:
+                logger.exception("Error translating segment", extra={"seq": segment["seq"]})
+                captions = []
+            finally:
+                self.in_flight -= 1
+            self._reorder[segment["seq"]] = (segment, captions)
+            self._release()
+
+    def _release(self) -> None:
+        """Deliver every buffered result that is next in sequence."""
+        now = asyncio.get_running_loop().time()
+        while self.release_seq in self._reorder:
+            segment, captions = self._reorder.pop(self.release_seq)
+            self.last_lag = now - self._submitted_at.pop(self.release_seq)
+            self.release_seq += 1
+            self.deliver(segment, captions)
+        if self.release_seq == self.next_seq:
+            self._idle.set()
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth and lag for the room."""
+        oldest: Optional[float] = self._submitted_at.get(self.release_seq)
+        now = asyncio.get_running_loop().time()
+        return {
+            "queued": self._queue.qsize(),
+            "in_flight": self.in_flight,
+            "reorder_buffered": len(self._reorder),
+            "submitted": self.next_seq,
+            "released": self.release_seq,
+            "oldest_pending_age": now - oldest if oldest is not None else 0.0,
+            "last_lag": self.last_lag,
+        }
+
+    async def drain(self) -> None:
+        """Wait until every submitted segment has been translated and delivered."""
+        await self._idle.wait()
+
+    async def close(self) -> None:
+        """Stop the worker tasks; untranslated segments are dropped."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
@@ -0,0 +1,77 @@
+from typing import Dict, Any, Optional, List
+import re
+
+# Sentence-ending punctuation (Latin and CJK) with optional closing quotes/brackets
+SENTENCE_END = re.compile(r"[.!?…。！？][\"'”’)\]」』]*$")
+
+class Segmenter:
+    """Merges finalized STT fragments into translation units for one room.
+
+    Fragments are held until one ends a sentence, the merged text reaches
+    max_chars, or max_delay seconds have passed since the first held
+    fragment, whichever comes first.
+    """
+
+    def __init__(self, max_delay: float = 0.8, max_chars: int = 200):
+        """Initialize the segmenter.
+
+        Args:
+            max_delay: Latency budget in seconds for holding fragments
+            max_chars: Flush once merged text reaches this length
+        """
+        self.max_delay = max_delay
+        self.max_chars = max_chars
+        self._texts: List[str] = []
+        self._segment_ids: List[int] = []
+        self._deadline: Optional[float] = None
+        self._audio_end: Optional[float] = None
+        self._stt_at: Optional[float] = None
+
+    def add(self, transcript: Dict[str, Any], now: float) -> Optional[Dict[str, Any]]:
+        """Add a finalized fragment.
+
+        Args:
+            transcript: Final transcript dict from the STT service
+            now: Current event loop time
+
+        Returns:
+            A merged segment if a boundary was reached, otherwise None
+        """
+        text = transcript.get("text", "").strip()
+        if not self._texts:
+            self._deadline = now + self.max_delay
+            self._audio_end = transcript.get("audio_end")
+            self._stt_at = transcript.get("stt_at")
+        self._texts.append(text)
+        if transcript.get("segment_id") is not None:
+            self._segment_ids.append(transcript["segment_id"])
+
+        merged_length = sum(len(t) for t in self._texts) + len(self._texts) - 1
+        if SENTENCE_END.search(text) or merged_length >= self.max_chars or now >= self._deadline:
+            return self.flush()
+        return None
+
+    def time_until_flush(self, now: float) -> Optional[float]:
+        """Seconds until held fragments must be flushed, or None if nothing is held."""
+        if self._deadline is None:
+            return None
+        return max(0.0, self._deadline - now)
+
+    def flush(self) -> Optional[Dict[str, Any]]:
+        """Return held fragments as one segment, or None if nothing is held."""
+        if not self._texts:
+            return None
+        segment = {
+            "text": " ".join(self._texts),
+            "is_final": True,
+            "segment_id": self._segment_ids[-1] if self._segment_ids else None,
+            "segment_ids": self._segment_ids,
+            "audio_end": self._audio_end,  # End of the first fragment's audio (wall time)
+            "stt_at": self._stt_at,  # When the first fragment's final transcript arrived
+        }
+        self._texts = []
+        self._segment_ids = []
+        self._deadline = None
+        self._audio_end = None
+        self._stt_at = None
+        return segment
@@ -1,7 +1,8 @@
 import logging
 import asyncio
+import time
 import uuid
-from typing import Dict, Any, Callable, Optional, List
+from typing import Dict, Any, Optional, AsyncIterator
 
 from deepgram import (
     DeepgramClient,
@@ -10,167 +11,387 @@ from deepgram import (
     DeepgramClientOptions
 )
 
-class DeepgramSTTService:
+from app.services import metrics
+from app.utils.log import RateLimitedLog
+
+logger = logging.getLogger(__name__)
+
+# Per-chunk problems are logged at most every few seconds per session
+_chunk_log = RateLimitedLog(logger)
+
+# Marker pushed into a session's transcript queue when it is closed
+_SESSION_CLOSED = object()
+
+class STTSession:
+    """A single streaming transcription session.
+
+    Audio is buffered in a bounded queue and drained by one sender coroutine,
+    so callers never block on the provider. Transcripts are exposed as an
+    async iterator. Providers subclass this and implement _send and _finish.
+    """
+
+    def __init__(self, session_id: str, max_buffered_chunks: int = 50, interim_results: bool = True):
+        """Initialize the session.
+
+        Args:
+            session_id: Session ID
+            max_buffered_chunks: Maximum audio chunks waiting to be sent
+            interim_results: Whether to emit interim (non-final) hypotheses
+        """
+        self.session_id = session_id
+        self.interim_results = interim_results
+        self.max_buffered_chunks = max_buffered_chunks
+        self.dropped_chunks = 0
+        self.closed = False  # No more audio is accepted
+        self._ended = False  # No more transcripts are delivered
+        self.stream_started: Optional[float] = None  # Wall time the first audio was queued
+        # Bounded by send_audio rather than maxsize, so close() can always queue its stop marker
+        self._audio_queue: asyncio.Queue = asyncio.Queue()
+        self._transcripts: asyncio.Queue = asyncio.Queue()
+        self._sender_task: Optional[asyncio.Task] = None
+
+        # Interim hypotheses share a segment ID until the provider finalizes them
+        self._segment_id = 1
+        self._has_interim = False
+
+    def start(self) -> None:
+        """Start the coroutine that drains buffered audio to the provider."""
+        if self._sender_task is None:
+            self._sender_task = asyncio.create_task(self._send_loop())
+
+    def send_audio(self, audio_data: bytes) -> bool:
+        """Queue audio for the provider without blocking.
+
+        When the buffer is full the new chunk is dropped, so a stalled
+        upstream costs bounded memory. Buffered audio is never discarded:
+        broadcasters send WebM/Opus, whose first chunk carries the header
+        every later chunk needs, and a gap at the newest end keeps the
+        audio already queued contiguous.
+
+        Args:
+            audio_data: Audio bytes
+
+        Returns:
+            True if the chunk was queued, False if it was dropped
+        """
+        if self.closed:
+            return False
+        if self.stream_started is None:
+            self.stream_started = time.time()
+
+        if self._audio_queue.qsize() >= self.max_buffered_chunks:
+            self.dropped_chunks += 1
+            metrics.AUDIO_CHUNKS_DROPPED.inc()
+            _chunk_log.warning(
+                ("dropped", self.session_id), "Audio buffer full, dropped %d chunks so far", self.dropped_chunks,
+                extra={"session": self.session_id},
+            )
+            return False
+        self._audio_queue.put_nowait(audio_data)
+        return True
+
+    @property
+    def buffered_chunks(self) -> int:
+        """Audio chunks waiting to be sent."""
+        return self._audio_queue.qsize()
+
+    async def _send_loop(self) -> None:
+        """Send buffered audio to the provider until the session is closed."""
+        while True:
+            audio_data = await self._audio_queue.get()
+            if audio_data is None:
+                return
+            try:
+                await self._send(audio_data)
+            except Exception as e:
+                _chunk_log.warning(("send", self.session_id), "Error sending audio data: %s", e, extra={"session": self.session_id})
+
+    async def _send(self, audio_data: bytes) -> None:
+        """Hand one audio chunk to the provider."""
+        raise NotImplementedError
+
+    async def _finish(self) -> None:
+        """Tell the provider the stream has ended; called after buffered audio is sent."""
+
+    def emit(self, text: str, is_final: bool, start: Optional[float] = None,
+             duration: Optional[float] = None, confidence: float = 0.0) -> None:
+        """Deliver a provider result as a transcript.
+
+        Args:
+            text: Transcript text (may be empty)
+            is_final: Whether the provider will not revise it again
+            start: Seconds from the start of the stream to the start of the audio
+            duration: Seconds of audio the result covers
+            confidence: Provider confidence, 0 to 1
+        """
+        if not is_final and not self.interim_results:
+            return
+        received_at = time.time()
+
+        # Where the finalized audio ended, assuming the broadcaster streams in
+        # real time: provider offsets count from the start of the stream
+        audio_end = None
+        if is_final and self.stream_started is not None:
+            audio_end = self.stream_started + (start or 0.0) + (duration or 0.0)
+            metrics.STT_LATENCY.observe(max(0.0, received_at - audio_end))
+
+        # An empty final still matters if viewers are showing interims for it
+        if len(text) > 0 or (is_final and self._has_interim):
+            self.put_transcript({
+                "text": text,
+                "is_final": is_final,
+                "confidence": confidence,
+                "segment_id": self._segment_id,
+                "audio_end": audio_end,
+                "stt_at": received_at
+            })
+
+        if is_final:
+            self._segment_id += 1
+            self._has_interim = False
+        elif len(text) > 0:
+            self._has_interim = True
+
+    def put_transcript(self, transcript_data: Dict[str, Any]) -> None:
+        """Deliver a transcript to the session's iterator.
+
+        Results keep arriving while a closing session finishes the provider
+        stream; they are delivered until iteration ends.
+        """
+        if not self._ended:
+            self._transcripts.put_nowait(transcript_data)
+
+    def __aiter__(self) -> AsyncIterator[Dict[str, Any]]:
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        transcript = await self._transcripts.get()
+        if transcript is _SESSION_CLOSED:
+            raise StopAsyncIteration
+        return transcript
+
+    async def close(self, flush_timeout: float = 2.0) -> None:
+        """Flush buffered audio, finish the provider stream (delivering its last results) and end iteration.
+
+        Args:
+            flush_timeout: Seconds to wait for buffered audio to be sent
+        """
+        if self.closed:
+            return
+        self.closed = True
+
+        if self._sender_task is not None:
+            self._audio_queue.put_nowait(None)
+            try:
+                await asyncio.wait_for(self._sender_task, timeout=flush_timeout)
+            except asyncio.TimeoutError:
+                logger.warning("Timed out flushing audio", extra={"session": self.session_id})
+
+        try:
+            await self._finish()
+        finally:
+            self._ended = True
+            self._transcripts.put_nowait(_SESSION_CLOSED)
+
+class DeepgramSession(STTSession):
+    """A live transcription session on Deepgram's async websocket client."""
+
+    def __init__(self, session_id: str, connection: Any, max_buffered_chunks: int = 50, interim_results: bool = True):
+        """Initialize the session.
+
+        Args:
+            session_id: Session ID
+            connection: Deepgram async websocket connection
+            max_buffered_chunks: Maximum audio chunks waiting to be sent
+            interim_results: Whether to emit interim (non-final) hypotheses
+        """
+        super().__init__(session_id, max_buffered_chunks, interim_results)
+        self.connection = connection
+
+    async def _send(self, audio_data: bytes) -> None:
+        await self.connection.send(audio_data)
+
+    async def _finish(self) -> None:
+        await self.connection.finish()
+
+class STTService:
+    """Base class for speech-to-text providers.
+
+    Sessions are keyed by ID: the broadcast route creates one per
+    broadcaster, streams audio into it and iterates its transcripts.
+    Providers implement _open_session; the bookkeeping is shared.
+    """
+
+    name = "stt"
+
+    def __init__(self, max_buffered_chunks: int = 50, interim_results: bool = True):
+        """Initialize the service.
+
+        Args:
+            max_buffered_chunks: Per-session bound on audio waiting to be sent
+            interim_results: Whether to emit interim (non-final) hypotheses
+        """
+        self.max_buffered_chunks = max_buffered_chunks
+        self.interim_results = interim_results
+
+        # Store active sessions; only touched from the event loop
+        self.active_sessions: Dict[str, STTSession] = {}
+        metrics.STT_BUFFERED_CHUNKS.set_function(
+            lambda: sum(session.buffered_chunks for session in list(self.active_sessions.values()))
+        )
+
+    async def _open_session(self, session_id: str) -> STTSession:
+        """Open a provider stream for a new session.
+
+        Raises:
+            Exception: If the provider could not start the stream
+        """
+        raise NotImplementedError
+
+    async def create_connection(self) -> str:
+        """Create a new connection to the STT service.
+
+        Returns:
+            Session ID for the connection
+        """
+        # Generate a unique session ID
+        session_id = str(uuid.uuid4())
+        session = await self._open_session(session_id)
+        session.start()
+        self.active_sessions[session_id] = session
+
+        logger.info("Created STT session", extra={"session": session_id})
+        return session_id
+
+    async def send_audio(self, session_id: str, audio_data: bytes) -> None:
+        """Queue audio data for the provider without waiting on it.
+
+        Args:
+            session_id: Session ID returned from create_connection
+            audio_data: Raw audio bytes
+        """
+        session = self.active_sessions.get(session_id)
+        if session is None:
+            _chunk_log.warning(("missing", session_id), "Audio for unknown STT session", extra={"session": session_id})
+            return
+
+        # Skip very small chunks (likely metadata or empty frames)
+        if len(audio_data) < 100:
+            return
+
+        session.send_audio(audio_data)
+
+    def transcripts(self, session_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Iterate over transcripts for a session until it is closed.
+
+        Args:
+            session_id: Session ID returned from create_connection
+
+        Returns:
+            Async iterator of transcript dicts
+        """
+        return self.active_sessions[session_id]
+
+    async def close_connection(self, session_id: str) -> None:
+        """Close a connection to the STT service.
+
+        Args:
+            session_id: Session ID returned from create_connection
+        """
+        logger.debug("Closing STT session", extra={"session": session_id})
+
+        session = self.active_sessions.pop(session_id, None)
+        if session is not None:
+            try:
+                await session.close()
+                logger.info("Closed %s session", self.name, extra={"session": session_id})
+            except Exception:
+                logger.exception("Error closing %s session", self.name, extra={"session": session_id})
+
+    async def close(self) -> None:
+        """Release provider resources at shutdown."""
+
+class DeepgramSTTService(STTService):
     """Service for handling speech-to-text using Deepgram SDK."""
 
-    def __init__(self, api_key: str):
+    name = "Deepgram"
+
+    def __init__(self, api_key: str, url: str = "", max_buffered_chunks: int = 50, interim_results: bool = True):
         """Initialize the STT service.
-        
+
         Args:
             api_key: Deepgram API key
+            url: Deepgram API base URL (empty for Deepgram's own)
+            max_buffered_chunks: Per-session bound on audio waiting to be sent
+            interim_results: Whether to emit interim (non-final) hypotheses
         """
         if not api_key:
             raise ValueError("Deepgram API key is required")
-            
+
         # Log partial API key for debugging
         masked_key = api_key[:4] + "*" * (len(api_key) - 4) if len(api_key) > 4 else "****"
-        logging.info(f"Initializing Deepgram with API key: {masked_key}")
-        
+        logger.info("Initializing Deepgram with API key: %s", masked_key)
+
+        super().__init__(max_buffered_chunks, interim_results)
+
         # Create client with keepalive option
-        config = DeepgramClientOptions(options={"keepalive": "true"})
+        config = DeepgramClientOptions(url=url, options={"keepalive": "true"})
         self.deepgram = DeepgramClient(api_key, config)
-        
-        # Store active connections and callbacks
-        self.active_sessions: Dict[str, Dict] = {}
-        
-    async def create_connection(self, on_transcript: Callable[[Dict[str, Any]], None]) -> str:
-        """Create a new connection to the STT service.
-        
-        Args:
-            on_transcript: Callback function to handle transcripts
-            
-        Returns:
-            Session ID for the connection
-        """
-        # Generate a unique session ID
-        session_id = str(uuid.uuid4())
-        
-        # Initialize Deepgram connection
-        dg_connection = self.deepgram.listen.live.v("1")
-        
-        # Define event handlers
-        def on_open(client, open_event, **kwargs):
-            print(f"Deepgram connection opened: {open_event}")
-        
-        def on_message(client, result, **kwargs):
+
+    async def _open_session(self, session_id: str) -> STTSession:
+        # Initialize Deepgram connection on the async client (no SDK threads)
+        dg_connection = self.deepgram.listen.asyncwebsocket.v("1")
+        session = DeepgramSession(session_id, dg_connection, self.max_buffered_chunks, self.interim_results)
+
+        # Define event handlers; the async client runs them on the event loop
+        async def on_open(client, open, **kwargs):
+            logger.debug("Deepgram connection opened", extra={"session": session_id})
+
+        async def on_message(client, result, **kwargs):
             try:
-                transcript = result.channel.alternatives[0].transcript
-                if len(transcript) > 0:
-                    print(f"Transcript received: {transcript}")
-                    transcript_data = {
-                        "text": transcript,
-                        "is_final": True,
-                        "confidence": result.channel.alternatives[0].confidence
-                    }
-                    # Store the callback and transcript data in the session
-                    # The main application loop will check for new transcripts
-                    if session_id in self.active_sessions:
-                        if "pending_transcripts" not in self.active_sessions[session_id]:
-                            self.active_sessions[session_id]["pending_transcripts"] = []
-                        
-                        # Add to pending transcripts
-                        self.active_sessions[session_id]["pending_transcripts"].append(transcript_data)
-                        print(f"Added transcript to pending queue for session {session_id}")
-                    else:
-                        print(f"Session {session_id} not found, transcript will be lost")
-                else:
-                    print("Empty transcript received, ignoring")
+                alternative = result.channel.alternatives[0]
+                session.emit(
+                    alternative.transcript,
+                    bool(result.is_final) or not self.interim_results,
+                    start=result.start,
+                    duration=result.duration,
+                    confidence=alternative.confidence,
+                )
             except Exception as e:
-                print(f"Error processing transcript: {e}")
-                import traceback
-                traceback.print_exc()
-        
-        def on_close(client, close_event, **kwargs):
-            print(f"Deepgram connection closed: {close_event}")
-        
-        def on_error(client, error_event, **kwargs):
-            print(f"Deepgram error: {error_event}")
-        
+                logger.exception("Error processing transcript", extra={"session": session_id})
+
+        async def on_close(client, close, **kwargs):
+            logger.info("Deepgram connection closed", extra={"session": session_id})
+
+        async def on_error(client, error, **kwargs):
+            logger.error("Deepgram error: %s", error, extra={"session": session_id})
+
         # Register event handlers
         dg_connection.on(LiveTranscriptionEvents.Open, on_open)
         dg_connection.on(LiveTranscriptionEvents.Transcript, on_message)
         dg_connection.on(LiveTranscriptionEvents.Close, on_close)
         dg_connection.on(LiveTranscriptionEvents.Error, on_error)
-        
+
         # Define transcription options
         options = LiveOptions(
             model="nova-2",
             language="ko-KR",
             punctuate=True,
+            interim_results=self.interim_results,
             # No need to specify encoding for WebM - Deepgram auto-detects it
             channels=1,
             sample_rate=16000
         )
-        
+
         # Start the connection
         try:
-            connection_started = dg_connection.start(options)
+            connection_started = await dg_connection.start(options)
             if connection_started is False:
-                logging.error("Failed to start Deepgram connection - returned False")
+                logger.error("Failed to start Deepgram connection - returned False", extra={"session": session_id})
                 raise Exception("Failed to start Deepgram connection")
-            logging.info(f"Successfully started Deepgram connection for session {session_id}")
+            logger.info("Started Deepgram connection", extra={"session": session_id})
         except Exception as e:
-            logging.error(f"Error starting Deepgram connection: {str(e)}")
+            logger.error("Error starting Deepgram connection: %s", e, extra={"session": session_id})
             raise Exception(f"Failed to start Deepgram connection: {str(e)}")
-        
-        # Store connection and callback
-        self.active_sessions[session_id] = {
-            "connection": dg_connection,
-            "callback": on_transcript
-        }
-        
-        print(f"Created new STT session: {session_id}")
-        return session_id
-    
-    async def send_audio(self, session_id: str, audio_data: bytes) -> None:
-        """Send audio data to Deepgram.
-        
-        Args:
-            session_id: Session ID returned from create_connection
-            audio_data: Raw audio bytes
-        """
-        print(f"Received audio chunk: {len(audio_data)} bytes for session {session_id}")
-        
-        if session_id not in self.active_sessions:
-            print(f"Session {session_id} not found")
-            return
-        
-        # Skip very small chunks (likely metadata or empty frames)
-        if len(audio_data) < 100:
-            print(f"Skipping small audio chunk: {len(audio_data)} bytes")
-            return
-        
-        try:
-            # Get the Deepgram connection
-            dg_connection = self.active_sessions[session_id]["connection"]
-            
-            # Send audio data to Deepgram
-            dg_connection.send(audio_data)
-            print(f"Sent {len(audio_data)} bytes to Deepgram")
-        except Exception as e:
-            logging.error(f"Error sending audio data: {str(e)}")
-            raise
-    
-    async def close_connection(self, session_id: str) -> None:
-        """Close a connection to the STT service.
-        
-        Args:
-            session_id: Session ID returned from create_connection
-        """
-        print(f"Closing STT session: {session_id}")
-        
-        if session_id in self.active_sessions:
-            try:
-                # Get the Deepgram connection
-                dg_connection = self.active_sessions[session_id]["connection"]
-                
-                # Close the connection
-                dg_connection.finish()
-                print(f"Closed Deepgram connection for session {session_id}")
-            except Exception as e:
-                print(f"Error closing Deepgram connection: {e}")
-                import traceback
-                traceback.print_exc()
-            
-            # Clean up
-            del self.active_sessions[session_id]
+
+        return session
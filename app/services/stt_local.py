@@ -0,0 +1,175 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+import asyncio
+import importlib.util
+import logging
+import multiprocessing
+import shutil
+
+from app.services import stt_worker
+from app.services.stt import STTService, STTSession
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+
+# Decode the broadcaster's WebM/Opus to raw PCM as it arrives: probe as
+# little as possible and flush every packet, so decoding adds no buffering
+DECODER_ARGS = (
+    "-hide_banner", "-loglevel", "error",
+    "-fflags", "nobuffer", "-probesize", "4096", "-analyzeduration", "0",
+    "-i", "pipe:0",
+    "-f", "s16le", "-ac", "1", "-ar", str(SAMPLE_RATE), "-flush_packets", "1",
+    "pipe:1",
+)
+
+# Most PCM read from the decoder per engine call; a session that falls behind
+# catches up in larger batches instead of queueing one call per chunk
+MAX_BATCH_BYTES = SAMPLE_RATE * stt_worker.SAMPLE_WIDTH * 2
+
+class LocalWorker:
+    """One engine process and the number of sessions pinned to it.
+
+    Engines keep per-session decoder state, so a session stays on one
+    process for its whole life.
+    """
+
+    def __init__(self, executor: ProcessPoolExecutor):
+        self.executor = executor
+        self.sessions = 0
+
+    async def run(self, function: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+class LocalSession(STTSession):
+    """A session decoded by ffmpeg and transcribed in a local engine process."""
+
+    def __init__(self, session_id: str, worker: LocalWorker, decoder: asyncio.subprocess.Process,
+                 max_buffered_chunks: int = 50, interim_results: bool = True):
+        """Initialize the session.
+
+        Args:
+            session_id: Session ID
+            worker: Engine process the session is pinned to
+            decoder: ffmpeg process turning broadcaster audio into PCM
+            max_buffered_chunks: Maximum audio chunks waiting to be decoded
+            interim_results: Whether to emit interim (non-final) hypotheses
+        """
+        super().__init__(session_id, max_buffered_chunks, interim_results)
+        self.worker = worker
+        self.decoder = decoder
+        self._reader_task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        super().start()
+        if self._reader_task is None:
+            self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def _send(self, audio_data: bytes) -> None:
+        self.decoder.stdin.write(audio_data)
+        await self.decoder.stdin.drain()
+
+    async def _read_loop(self) -> None:
+        """Feed decoded PCM to the engine until the decoder exits."""
+        leftover = b""
+        while True:
+            pcm = await self.decoder.stdout.read(MAX_BATCH_BYTES)
+            if not pcm:
+                return
+            pcm = leftover + pcm
+            # Engines take whole samples
+            cut = len(pcm) - len(pcm) % stt_worker.SAMPLE_WIDTH
+            pcm, leftover = pcm[:cut], pcm[cut:]
+            try:
+                results = await self.worker.run(stt_worker.accept, self.session_id, pcm)
+            except Exception:
+                logger.exception("Local STT engine failed", extra={"session": self.session_id})
+                return
+            self._emit_all(results)
+
+    def _emit_all(self, results: List[stt_worker.Result]) -> None:
+        for text, is_final, start, duration, confidence in results:
+            self.emit(text, is_final, start=start, duration=duration, confidence=confidence)
+
+    async def _finish(self) -> None:
+        try:
+            self.decoder.stdin.close()
+            if self._reader_task is not None:
+                try:
+                    await asyncio.wait_for(self._reader_task, timeout=5.0)
+                except asyncio.TimeoutError:
+                    logger.warning("Timed out decoding the end of the stream", extra={"session": self.session_id})
+            # Decode the audio left at the end of the stream and free the engine's state for the session
+            self._emit_all(await self.worker.run(stt_worker.finish, self.session_id))
+        finally:
+            self.worker.sessions -= 1
+            if self.decoder.returncode is None:
+                self.decoder.kill()
+            await self.decoder.wait()
+
+class LocalSTTService(STTService):
+    """Speech-to-text on this machine's CPUs.
+
+    Each of `workers` processes loads one copy of the model; sessions are
+    pinned to the least busy one. Broadcaster audio is decoded to PCM by
+    an ffmpeg process per session and transcribed in chunks as it arrives.
+    Nothing leaves the host.
+    """
+
+    name = "local STT"
+
+    def __init__(self, engine: str = "whisper", model: str = "small", language: str = "ko", workers: int = 1,
+                 options: Optional[Dict[str, Any]] = None, ffmpeg: str = "ffmpeg",
+                 max_buffered_chunks: int = 50, interim_results: bool = True):
+        """Initialize the STT service.
+
+        Args:
+            engine: "whisper" (faster-whisper) or "vosk"
+            model: faster-whisper model size or path, or Vosk model directory
+            language: Spoken language code (used by engines that take one)
+            workers: Engine processes to run
+            options: Extra engine options (e.g. compute_type, threads, step)
+            ffmpeg: ffmpeg executable
+            max_buffered_chunks: Per-session bound on audio waiting to be decoded
+            interim_results: Whether to emit interim (non-final) hypotheses
+        """
+        engine_class = stt_worker.ENGINES.get(engine)
+        if engine_class is None:
+            raise ValueError(f"Unknown local STT engine: {engine}")
+        if importlib.util.find_spec(engine_class.module) is None:
+            raise ValueError(f"Local STT engine '{engine}' requires the {engine_class.module} package")
+        self.ffmpeg = shutil.which(ffmpeg)
+        if self.ffmpeg is None:
+            raise ValueError("Local STT requires ffmpeg to decode broadcaster audio")
+
+        super().__init__(max_buffered_chunks, interim_results)
+
+        # Spawned rather than forked: the server process has threads running
+        context = multiprocessing.get_context("spawn")
+        self.workers: List[LocalWorker] = []
+        for _ in range(max(1, workers)):
+            executor = ProcessPoolExecutor(
+                max_workers=1,
+                mp_context=context,
+                initializer=stt_worker.init_worker,
+                initargs=(engine, model, language, SAMPLE_RATE, options or {}),
+            )
+            # Load the model now rather than during the first broadcast
+            executor.submit(stt_worker.ready)
+            self.workers.append(LocalWorker(executor))
+        logger.info("Starting %d local STT worker(s) with %s model %s", len(self.workers), engine, model)
+
+    async def _open_session(self, session_id: str) -> STTSession:
+        worker = min(self.workers, key=lambda worker: worker.sessions)
+        decoder = await asyncio.create_subprocess_exec(
+            self.ffmpeg, *DECODER_ARGS,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        worker.sessions += 1
+        return LocalSession(session_id, worker, decoder, self.max_buffered_chunks, self.interim_results)
+
+    async def close(self) -> None:
+        for worker in self.workers:
+            worker.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,110 @@
+from typing import Any, Dict, List, Optional
+import asyncio
+import json
+import logging
+import time
+
+from app.services.stt import STTService, STTSession
+
+logger = logging.getLogger(__name__)
+
+def load_script(path: str, interval: float = 2.0) -> List[Dict[str, Any]]:
+    """Read a replay script.
+
+    Each non-empty line is either a JSON object or plain text. Objects
+    take "text" and optionally "is_final" (default true), "at" (seconds
+    after the first audio to emit it), and "start"/"duration" (the audio
+    it covers, in seconds from the start of the stream). A plain text line
+    is a final. Missing times continue from the previous line: finals are
+    spaced `interval` seconds apart and emitted as their audio ends.
+
+    Args:
+        path: Script file
+        interval: Seconds of speech assumed per final without times
+
+    Returns:
+        Cues as dicts with text, is_final, at, start and duration
+    """
+    cues: List[Dict[str, Any]] = []
+    utterance_start = 0.0  # Where the current utterance's audio began
+    at = 0.0
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line) if line.startswith("{") else {"text": line}
+            is_final = bool(entry.get("is_final", True))
+            start = float(entry.get("start", utterance_start))
+            if "at" in entry:
+                at = float(entry["at"])
+            elif "duration" in entry:
+                at = start + float(entry["duration"])
+            else:
+                at = max(at, start + (interval if is_final else 0.0))
+            duration = float(entry.get("duration", max(0.0, at - start)))
+            cues.append({"text": entry["text"], "is_final": is_final, "at": at, "start": start, "duration": duration})
+            if is_final:
+                utterance_start = start + duration
+    return cues
+
+class ReplaySession(STTSession):
+    """A session that plays a script, timed from the first audio received."""
+
+    def __init__(self, session_id: str, cues: List[Dict[str, Any]], max_buffered_chunks: int = 50, interim_results: bool = True):
+        """Initialize the session.
+
+        Args:
+            session_id: Session ID
+            cues: Script from load_script
+            max_buffered_chunks: Maximum audio chunks waiting to be consumed
+            interim_results: Whether to emit interim (non-final) hypotheses
+        """
+        super().__init__(session_id, max_buffered_chunks, interim_results)
+        self.cues = cues
+        self._player: Optional[asyncio.Task] = None
+
+    async def _send(self, audio_data: bytes) -> None:
+        # The audio itself is ignored; it only starts the clock
+        if self._player is None:
+            self._player = asyncio.create_task(self._play())
+
+    async def _play(self) -> None:
+        for cue in self.cues:
+            delay = self.stream_started + cue["at"] - time.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.emit(cue["text"], cue["is_final"], start=cue["start"], duration=cue["duration"], confidence=1.0)
+
+    async def _finish(self) -> None:
+        # Like a live provider, nothing is transcribed past the end of the audio
+        if self._player is not None:
+            self._player.cancel()
+            await asyncio.gather(self._player, return_exceptions=True)
+
+class ReplaySTTService(STTService):
+    """Plays a transcript script instead of recognizing speech.
+
+    For tests and demos without an STT provider: every session replays the
+    same script in real time once the broadcaster starts sending audio.
+    """
+
+    name = "replay STT"
+
+    def __init__(self, path: str, interval: float = 2.0, max_buffered_chunks: int = 50, interim_results: bool = True):
+        """Initialize the STT service.
+
+        Args:
+            path: Script file (see load_script)
+            interval: Seconds of speech assumed per final without times
+            max_buffered_chunks: Per-session bound on audio waiting to be consumed
+            interim_results: Whether to emit interim (non-final) hypotheses
+        """
+        if not path:
+            raise ValueError("Replay STT requires a script path")
+        super().__init__(max_buffered_chunks, interim_results)
+        self.cues = load_script(path, interval)
+        logger.info("Loaded %d replay STT cues from %s", len(self.cues), path)
+
+    async def _open_session(self, session_id: str) -> STTSession:
+        return ReplaySession(session_id, self.cues, self.max_buffered_chunks, self.interim_results)
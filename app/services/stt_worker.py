@@ -0,0 +1,217 @@
+"""Speech recognition engines for the local STT provider.
+
+This module runs inside the provider's worker processes. It imports only
+the standard library at the top; each engine imports its model library
+when a worker starts, so the server never loads a model itself.
+
+Audio arrives as 16-bit little-endian mono PCM. Engines are fed in
+FRAME_SECONDS frames, whatever size the caller batches them in, and
+return results as (text, is_final, start, duration, confidence) with
+times in seconds from the start of the session's stream.
+"""
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import math
+
+# (text, is_final, start, duration, confidence)
+Result = Tuple[str, bool, float, float, float]
+
+SAMPLE_WIDTH = 2  # bytes per 16-bit sample
+FRAME_SECONDS = 0.1
+
+class VoskEngine:
+    """Vosk (Kaldi) models: true streaming decoders with their own endpointing."""
+
+    module = "vosk"
+
+    def __init__(self, model: str, language: str, sample_rate: int, **options: Any):
+        from vosk import Model, SetLogLevel
+        SetLogLevel(-1)
+        self.model = Model(model)
+        self.sample_rate = sample_rate
+
+    def stream(self) -> "VoskStream":
+        return VoskStream(self)
+
+class VoskStream:
+    """One session's Kaldi recognizer."""
+
+    def __init__(self, engine: VoskEngine):
+        from vosk import KaldiRecognizer
+        self.recognizer = KaldiRecognizer(engine.model, engine.sample_rate)
+        self.recognizer.SetWords(True)
+        self.bytes_per_second = engine.sample_rate * SAMPLE_WIDTH
+        self.position = 0.0  # Seconds of audio accepted
+        self.utterance_start = 0.0
+        self.partial = ""
+
+    def accept(self, pcm: bytes) -> List[Result]:
+        results: List[Result] = []
+        frame = int(self.bytes_per_second * FRAME_SECONDS)
+        for offset in range(0, len(pcm), frame):
+            chunk = pcm[offset:offset + frame]
+            self.position += len(chunk) / self.bytes_per_second
+            if self.recognizer.AcceptWaveform(chunk):
+                results.append(self._final(json.loads(self.recognizer.Result())))
+                continue
+            partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+            if partial != self.partial:
+                self.partial = partial
+                results.append((partial, False, self.utterance_start, self.position - self.utterance_start, 0.0))
+        return results
+
+    def finish(self) -> List[Result]:
+        return [self._final(json.loads(self.recognizer.FinalResult()))]
+
+    def _final(self, result: Dict[str, Any]) -> Result:
+        words = result.get("result") or []
+        start = words[0]["start"] if words else self.utterance_start
+        end = words[-1]["end"] if words else self.position
+        confidence = sum(word.get("conf", 0.0) for word in words) / len(words) if words else 0.0
+        self.utterance_start = self.position
+        self.partial = ""
+        return (result.get("text", ""), True, start, end - start, confidence)
+
+class WhisperEngine:
+    """faster-whisper (CTranslate2) models, which only transcribe whole clips."""
+
+    module = "faster_whisper"
+
+    def __init__(self, model: str, language: str, sample_rate: int, compute_type: str = "int8",
+                 threads: int = 0, step: float = 1.0, max_window: float = 10.0, **options: Any):
+        import numpy
+        from faster_whisper import WhisperModel
+        self.numpy = numpy
+        self.model = WhisperModel(model, device="cpu", compute_type=compute_type, cpu_threads=threads)
+        self.language = language
+        self.sample_rate = sample_rate
+        self.step = step
+        self.max_window = max_window
+
+    def stream(self) -> "WhisperStream":
+        return WhisperStream(self)
+
+    def transcribe(self, pcm: bytes) -> Tuple[str, float]:
+        """Transcribe a clip, returning its text and confidence."""
+        np = self.numpy
+        audio = np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0
+        segments, _ = self.model.transcribe(
+            audio,
+            language=self.language,
+            beam_size=1,
+            condition_on_previous_text=False,
+            without_timestamps=True,
+            vad_filter=False,
+        )
+        segments = list(segments)
+        if not segments:
+            return "", 0.0
+        text = "".join(segment.text for segment in segments).strip()
+        confidence = math.exp(sum(segment.avg_logprob for segment in segments) / len(segments))
+        return text, confidence
+
+class WhisperStream:
+    """Chunked decoding of one session's audio.
+
+    Audio accumulates into the current utterance window, which is
+    re-decoded as an interim every step seconds of new audio. A pause of
+    silence seconds after speech, or the window reaching max_window
+    seconds, decodes it once more as a final and starts a new window.
+    Windows that never contained speech are not decoded; a short pre-roll
+    of the preceding silence is kept so soft word onsets are not cut.
+    """
+
+    def __init__(self, engine: WhisperEngine, silence: float = 0.6, threshold: float = 0.01, preroll: float = 0.3):
+        self.engine = engine
+        self.bytes_per_second = engine.sample_rate * SAMPLE_WIDTH
+        self.silence = silence
+        self.threshold = threshold  # RMS level, as a fraction of full scale, that counts as speech
+        self.preroll_bytes = int(self.bytes_per_second * preroll) // SAMPLE_WIDTH * SAMPLE_WIDTH
+        self.window = bytearray()
+        self.window_start = 0.0
+        self.position = 0.0
+        self.speech = False
+        self.trailing_silence = 0.0
+        self.undecoded = 0.0
+
+    def accept(self, pcm: bytes) -> List[Result]:
+        results: List[Result] = []
+        frame = int(self.bytes_per_second * FRAME_SECONDS)
+        for offset in range(0, len(pcm), frame):
+            result = self._accept_frame(pcm[offset:offset + frame])
+            if result is not None:
+                results.append(result)
+        return results
+
+    def finish(self) -> List[Result]:
+        return [self._decode(True)] if self.speech else []
+
+    def _accept_frame(self, chunk: bytes) -> Optional[Result]:
+        seconds = len(chunk) / self.bytes_per_second
+        self.position += seconds
+        loud = self._rms(chunk) >= self.threshold
+
+        if not self.speech and not loud:
+            # Leading silence: keep only the pre-roll
+            self.window += chunk
+            del self.window[:max(0, len(self.window) - self.preroll_bytes)]
+            self.window_start = self.position - len(self.window) / self.bytes_per_second
+            return None
+
+        self.window += chunk
+        self.speech = True
+        self.trailing_silence = 0.0 if loud else self.trailing_silence + seconds
+        self.undecoded += seconds
+
+        window_seconds = len(self.window) / self.bytes_per_second
+        if self.trailing_silence >= self.silence or window_seconds >= self.engine.max_window:
+            return self._decode(True)
+        if self.undecoded >= self.engine.step:
+            self.undecoded = 0.0
+            return self._decode(False)
+        return None
+
+    def _decode(self, is_final: bool) -> Result:
+        text, confidence = self.engine.transcribe(bytes(self.window))
+        start, duration = self.window_start, len(self.window) / self.bytes_per_second
+        if is_final:
+            self.window = bytearray()
+            self.window_start = self.position
+            self.speech = False
+            self.trailing_silence = 0.0
+            self.undecoded = 0.0
+        return (text, is_final, start, duration, confidence)
+
+    def _rms(self, chunk: bytes) -> float:
+        np = self.engine.numpy
+        samples = np.frombuffer(chunk, dtype=np.int16).astype(np.float32)
+        if not len(samples):
+            return 0.0
+        return float(np.sqrt(np.mean(samples * samples))) / 32768.0
+
+ENGINES = {"vosk": VoskEngine, "whisper": WhisperEngine}
+
+# Per-process state, set up by init_worker
+_engine: Any = None
+_streams: Dict[str, Any] = {}
+
+def init_worker(engine: str, model: str, language: str, sample_rate: int, options: Dict[str, Any]) -> None:
+    """Load the model; run once when a worker process starts."""
+    global _engine
+    _engine = ENGINES[engine](model, language, sample_rate, **options)
+
+def ready() -> bool:
+    """No-op used to start a worker (and load its model) ahead of the first session."""
+    return _engine is not None
+
+def accept(session_id: str, pcm: bytes) -> List[Result]:
+    """Decode more of a session's audio."""
+    stream = _streams.get(session_id)
+    if stream is None:
+        stream = _streams[session_id] = _engine.stream()
+    return stream.accept(pcm)
+
+def finish(session_id: str) -> List[Result]:
+    """Decode whatever a session has left and forget it."""
+    stream = _streams.pop(session_id, None)
+    return stream.finish() if stream is not None else []
@@ -0,0 +1,116 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+import time
+
+from app.services import metrics
+
+# Pipeline stages timed on every caption, in order. A caption's trace is
+# [audio end as epoch ms, then ms after that for each later stage].
+TRACE_STAGES = ("audio", "stt", "translate_start", "translate_end", "fanout")
+
+# Receipts further than this from the trace start are clock or client errors
+MAX_GLASS_TO_GLASS = 300.0  # seconds
+
+def now_ms() -> int:
+    """Wall clock time in integer milliseconds."""
+    return int(time.time() * 1000)
+
+def encode_trace(times: List[float]) -> List[int]:
+    """Compact a caption's stage times for the wire.
+
+    Args:
+        times: Wall times in seconds, one per TRACE_STAGES entry
+
+    Returns:
+        [first time as epoch ms, then ms after it for each later stage]
+    """
+    base = int(times[0] * 1000)
+    return [base] + [max(0, int(t * 1000) - base) for t in times[1:]]
+
+class ClockOffset:
+    """Estimates a viewer's clock offset from timed ping/pong exchanges.
+
+    Each exchange gives the viewer's clock reading at some point during a
+    round trip; assuming it was taken halfway, offset = client time - (sent
+    + rtt / 2). The sample with the smallest round trip of the last few is
+    trusted, since queueing delay only ever adds to one leg.
+    """
+
+    __slots__ = ("_samples",)
+
+    def __init__(self, samples: int = 8):
+        self._samples: Deque[Tuple[int, int]] = deque(maxlen=samples)  # (rtt, offset) in ms
+
+    def add(self, sent_ms: int, client_ms: int, received_ms: int) -> None:
+        """Record one exchange (server send time, viewer's time, server receive time)."""
+        rtt = received_ms - sent_ms
+        if rtt < 0:
+            return
+        self._samples.append((rtt, client_ms - (sent_ms + rtt // 2)))
+
+    @property
+    def offset(self) -> Optional[int]:
+        """Viewer clock minus server clock in ms, or None before any exchange."""
+        if not self._samples:
+            return None
+        return min(self._samples)[1]
+
+class DeliveryTracker:
+    """Rolling glass-to-glass latency per room, from viewer receipts.
+
+    Glass-to-glass runs from the end of the spoken audio to the caption
+    being shown on a viewer's screen. Each room keeps its most recent
+    samples for /debug/rooms until its broadcast ends or its last viewer
+    on this worker leaves; every sample also goes to the Prometheus
+    histogram.
+    """
+
+    def __init__(self, window: int = 256):
+        """Initialize the tracker.
+
+        Args:
+            window: Samples kept per room
+        """
+        self.window = window
+        self._rooms: Dict[str, Deque[float]] = {}
+
+    def record(self, room_id: str, trace_start_ms: int, shown_ms: int, clock: ClockOffset) -> Optional[float]:
+        """Record a receipt for a displayed caption.
+
+        Args:
+            room_id: Room the caption belongs to
+            trace_start_ms: First entry of the caption's trace
+            shown_ms: Viewer's clock when the caption was shown
+            clock: The viewer's clock offset estimate
+
+        Returns:
+            Glass-to-glass seconds, or None if the receipt was discarded
+        """
+        offset = clock.offset
+        if offset is None:
+            return None
+        latency = (shown_ms - offset - trace_start_ms) / 1000
+        if not 0.0 <= latency <= MAX_GLASS_TO_GLASS:
+            return None
+        samples = self._rooms.get(room_id)
+        if samples is None:
+            samples = self._rooms[room_id] = deque(maxlen=self.window)
+        samples.append(latency)
+        metrics.GLASS_TO_GLASS.observe(latency)
+        return latency
+
+    def stats(self, room_id: str) -> Optional[Dict[str, float]]:
+        """Receipt count and p50/p95 glass-to-glass seconds for a room."""
+        samples = self._rooms.get(room_id)
+        if not samples:
+            return None
+        ordered = sorted(samples)
+        return {
+            "receipts": len(ordered),
+            "p50": round(ordered[len(ordered) // 2], 3),
+            "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 3),
+        }
+
+    def end_room(self, room_id: str) -> None:
+        """Forget a room's samples."""
+        self._rooms.pop(room_id, None)
@@ -1,27 +1,133 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, List, AsyncIterator, Deque, Tuple
+from collections import deque
 import asyncio
+import logging
+import time
 import openai
 from openai import AsyncOpenAI
 
-class OpenAITranslationService:
-    """Service for handling text translation using OpenAI models."""
+from app.services import metrics
+from app.services.translation_cache import TranslationCache
+from app.utils.log import RateLimitedLog
+
+logger = logging.getLogger(__name__)
+
+# An outage fails every caption in every language; log each language now and then
+_error_log = RateLimitedLog(logger)
+
+# Starts the caption sent in place of a failed translation (followed by the source text)
+TRANSLATION_ERROR_PREFIX = "[Translation Error]"
+
+class TranslationContext:
+    """Rolling window of recent source/translation pairs for one room and language."""
     
-    def __init__(self, api_key: str, model: str = "gpt-4o"):
-        """Initialize the OpenAI translation service.
+    def __init__(self, max_pairs: int = 4):
+        """Initialize the context window.
         
         Args:
-            api_key: OpenAI API key
-            model: OpenAI model to use for translation
+            max_pairs: Number of recent pairs to keep
         """
-        self.api_key = api_key
-        self.model = model
-        self.client = AsyncOpenAI(api_key=api_key)
+        self.pairs: Deque[Tuple[str, str]] = deque(maxlen=max_pairs)
+    
+    def add(self, source: str, translation: str) -> None:
+        """Record a translated segment; segments must be added in caption order."""
+        if source and translation and self.pairs.maxlen:
+            self.pairs.append((source, translation))
+
+class TranslationService:
+    """Base class for translation engines.
+    
+    Handles the cache and errors; engines implement _complete, and
+    _complete_stream if they can stream. The context window is only read
+    here: callers add each finished pair in caption order, so the prompt
+    prefix stays the same from one request to the next. Engine errors
+    propagate out of _translate_cached and _stream_cached, which lets
+    FallbackTranslationService retry with another engine; translate and
+    translate_stream turn them into an error caption.
+    """
+    
+    name = "translation"
+    
+    def __init__(self, model: str, cache: Optional[TranslationCache] = None):
+        """Initialize the service.
         
+        Args:
+            model: Model name, part of cache keys
+            cache: Optional cache consulted before calling the engine
+        """
+        self.model = model
+        self.cache = cache
+    
+    async def _complete(
+        self, 
+        text: str, 
+        source_lang: str, 
+        target_lang: str, 
+        context: Optional[TranslationContext]
+    ) -> str:
+        """Translate text with the engine, raising on failure."""
+        raise NotImplementedError
+    
+    async def _complete_stream(
+        self, 
+        text: str, 
+        source_lang: str, 
+        target_lang: str, 
+        context: Optional[TranslationContext]
+    ) -> AsyncIterator[str]:
+        """Translate text with the engine, yielding deltas; by default in one piece."""
+        yield await self._complete(text, source_lang, target_lang, context)
+    
+    async def close(self) -> None:
+        """Release engine resources at shutdown."""
+    
+    async def _cached(self, text: str, source_lang: str, target_lang: str) -> Optional[str]:
+        # Repeated phrases are served from the cache without calling the engine
+        if self.cache is None:
+            return None
+        return await self.cache.get(self.cache.make_key(text, source_lang, target_lang, self.model))
+    
+    async def _remember(self, text: str, source_lang: str, target_lang: str, translated_text: str) -> None:
+        if self.cache is not None and translated_text:
+            await self.cache.set(self.cache.make_key(text, source_lang, target_lang, self.model), translated_text)
+    
+    async def _translate_cached(
+        self, 
+        text: str, 
+        source_lang: str, 
+        target_lang: str, 
+        context: Optional[TranslationContext]
+    ) -> str:
+        cached = await self._cached(text, source_lang, target_lang)
+        if cached is not None:
+            return cached
+        translated_text = await self._complete(text, source_lang, target_lang, context)
+        await self._remember(text, source_lang, target_lang, translated_text)
+        return translated_text
+    
+    async def _stream_cached(
+        self, 
+        text: str, 
+        source_lang: str, 
+        target_lang: str, 
+        context: Optional[TranslationContext]
+    ) -> AsyncIterator[str]:
+        cached = await self._cached(text, source_lang, target_lang)
+        if cached is not None:
+            yield cached
+            return
+        pieces: List[str] = []
+        async for delta in self._complete_stream(text, source_lang, target_lang, context):
+            pieces.append(delta)
+            yield delta
+        await self._remember(text, source_lang, target_lang, "".join(pieces).strip())
+    
     async def translate(
         self, 
         text: str, 
         source_lang: str = "ko", 
-        target_lang: str = "en"
+        target_lang: str = "en",
+        context: Optional[TranslationContext] = None
     ) -> str:
         """Translate text from source language to target language.
         
@@ -29,38 +135,227 @@ class OpenAITranslationService:
             text: Text to translate
             source_lang: Source language code
             target_lang: Target language code
+            context: Recent source/translation pairs sent ahead of the text
             
         Returns:
             Translated text
         """
         if not text:
             return ""
+        try:
+            return await self._translate_cached(text, source_lang, target_lang, context)
+        except Exception as e:
+            metrics.TRANSLATION_ERRORS.inc()
+            _error_log.warning(target_lang, "Translation error: %s", e, extra={"language": target_lang})
+            # Return original text if translation fails
+            return f"{TRANSLATION_ERROR_PREFIX} {text}"
+    
+    async def translate_stream(
+        self, 
+        text: str, 
+        source_lang: str = "ko", 
+        target_lang: str = "en",
+        context: Optional[TranslationContext] = None
+    ) -> AsyncIterator[str]:
+        """Translate text, yielding pieces of the translation as they are generated.
+        
+        Joining everything yielded gives the same result as translate().
+        Cached translations are yielded in one piece.
         
+        Args:
+            text: Text to translate
+            source_lang: Source language code
+            target_lang: Target language code
+            context: Recent source/translation pairs sent ahead of the text
+            
+        Yields:
+            Translated text deltas
+        """
+        if not text:
+            return
+        produced = False
+        try:
+            async for delta in self._stream_cached(text, source_lang, target_lang, context):
+                produced = True
+                yield delta
+        except Exception as e:
+            metrics.TRANSLATION_ERRORS.inc()
+            _error_log.warning(target_lang, "Translation error: %s", e, extra={"language": target_lang})
+            # Only fall back to the original text if nothing was produced yet
+            if not produced:
+                yield f"{TRANSLATION_ERROR_PREFIX} {text}"
+
+class OpenAITranslationService(TranslationService):
+    """Service for handling text translation using OpenAI models."""
+    
+    name = "openai"
+    
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-4o",
+        cache: Optional[TranslationCache] = None,
+        base_url: Optional[str] = None
+    ):
+        """Initialize the OpenAI translation service.
+        
+        Args:
+            api_key: OpenAI API key
+            model: OpenAI model to use for translation
+            cache: Optional cache consulted before calling the API
+            base_url: API base URL (None for OpenAI's own)
+        """
+        super().__init__(model, cache)
+        self.api_key = api_key
+        self.client = AsyncOpenAI(api_key=api_key, base_url=base_url)
+        
+    def _build_messages(
+        self, 
+        text: str, 
+        source_lang: str, 
+        target_lang: str, 
+        context: Optional[TranslationContext] = None
+    ) -> List[Dict[str, str]]:
+        """Build the chat messages for a translation request.
+        
+        The system prompt depends only on the language pair and recent pairs
+        follow it oldest first, so consecutive requests share a long common
+        prefix that provider-side prompt caching can reuse.
+        """
         # Create system prompt for translation
         system_prompt = f"""You are a professional translator. 
 Translate the following text from {source_lang} to {target_lang}.
 Provide ONLY the translation, with no additional text, explanations, or notes.
 Maintain the original meaning, tone, and style as closely as possible.
 """
+        messages = [{"role": "system", "content": system_prompt}]
+        if context is not None:
+            for source, translation in context.pairs:
+                messages.append({"role": "user", "content": source})
+                messages.append({"role": "assistant", "content": translation})
+        messages.append({"role": "user", "content": text})
+        return messages
+    
+    async def _complete(
+        self, 
+        text: str, 
+        source_lang: str, 
+        target_lang: str, 
+        context: Optional[TranslationContext]
+    ) -> str:
+        started = time.perf_counter()
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self._build_messages(text, source_lang, target_lang, context),
+            temperature=0.3,  # Lower temperature for more consistent translations
+            max_tokens=1024,
+        )
+        
+        # Extract translated text
+        translated_text = response.choices[0].message.content.strip()
+        metrics.TRANSLATION_COMPLETE.observe(time.perf_counter() - started)
+        return translated_text
+    
+    async def _complete_stream(
+        self, 
+        text: str, 
+        source_lang: str, 
+        target_lang: str, 
+        context: Optional[TranslationContext]
+    ) -> AsyncIterator[str]:
+        started = time.perf_counter()
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=self._build_messages(text, source_lang, target_lang, context),
+            temperature=0.3,
+            max_tokens=1024,
+            stream=True,
+        )
+        leading = True
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                # Don't lead with whitespace the non-streaming path would strip
+                if leading:
+                    delta = delta.lstrip()
+                    if not delta:
+                        continue
+                    leading = False
+                yield delta
+        metrics.TRANSLATION_STREAM.observe(time.perf_counter() - started)
+
+class FallbackTranslationService(TranslationService):
+    """Switches to a fallback engine when the primary fails or is slow.
+    
+    A translation falls back if the primary raises, or takes longer than
+    timeout seconds (to its first delta, when streaming). Each engine keeps
+    its own cache entries, so fallback translations are never served
+    later in place of the primary's.
+    """
+    
+    def __init__(self, primary: TranslationService, fallback: TranslationService, timeout: float = 3.0):
+        """Initialize the service.
         
+        Args:
+            primary: Engine tried first
+            fallback: Engine used when the primary fails or is slow
+            timeout: Seconds to wait for the primary
+        """
+        # The cache is the engines' shared one, here for stats only
+        super().__init__(primary.model, primary.cache)
+        self.name = f"{primary.name}+{fallback.name}"
+        self.primary = primary
+        self.fallback = fallback
+        self.timeout = timeout
+    
+    def _fell_back(self, target_lang: str, error: Exception) -> None:
+        metrics.TRANSLATION_FALLBACKS.inc()
+        _error_log.warning(
+            ("fallback", target_lang), "Falling back to %s translation: %s", self.fallback.name, str(error) or "timed out",
+            extra={"language": target_lang},
+        )
+    
+    async def _translate_cached(
+        self, 
+        text: str, 
+        source_lang: str, 
+        target_lang: str, 
+        context: Optional[TranslationContext]
+    ) -> str:
         try:
-            # Call OpenAI API
-            response = await self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": text}
-                ],
-                temperature=0.3,  # Lower temperature for more consistent translations
-                max_tokens=1024,
+            return await asyncio.wait_for(
+                self.primary._translate_cached(text, source_lang, target_lang, context), self.timeout
             )
-            
-            # Extract translated text
-            translated_text = response.choices[0].message.content.strip()
-            return translated_text
-            
         except Exception as e:
-            # Log error
-            print(f"Translation error: {e}")
-            # Return original text if translation fails
-            return f"[Translation Error] {text}"
+            self._fell_back(target_lang, e)
+        return await self.fallback._translate_cached(text, source_lang, target_lang, context)
+    
+    async def _stream_cached(
+        self, 
+        text: str, 
+        source_lang: str, 
+        target_lang: str, 
+        context: Optional[TranslationContext]
+    ) -> AsyncIterator[str]:
+        stream = self.primary._stream_cached(text, source_lang, target_lang, context)
+        try:
+            try:
+                first = await asyncio.wait_for(stream.__anext__(), self.timeout)
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                self._fell_back(target_lang, e)
+                async for delta in self.fallback._stream_cached(text, source_lang, target_lang, context):
+                    yield delta
+                return
+            yield first
+            async for delta in stream:
+                yield delta
+        finally:
+            await stream.aclose()
+    
+    async def close(self) -> None:
+        await self.primary.close()
+        await self.fallback.close()
@@ -0,0 +1,145 @@
+from typing import Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import asyncio
+import sqlite3
+import threading
+import time
+import unicodedata
+
+class TranslationCache:
+    """LRU/TTL cache for translations with an optional SQLite backing store.
+
+    Memory hits are served without leaving the event loop. When a database
+    path is given, entries are also written to SQLite so hits survive
+    restarts; database access runs in a worker thread.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 86400, db_path: Optional[str] = None):
+        """Initialize the cache.
+
+        Args:
+            max_entries: Maximum entries kept in memory
+            ttl: Seconds an entry stays valid
+            db_path: SQLite file for persistent entries, or None for memory only
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            # Expired rows are never served, so drop them on startup
+            self._db.execute("DELETE FROM translations WHERE created < ?", (time.time() - ttl,))
+            self._db.commit()
+
+    @staticmethod
+    def make_key(text: str, source_lang: str, target_lang: str, model: str) -> str:
+        """Build a cache key from normalized text, language pair and model.
+
+        Args:
+            text: Source text
+            source_lang: Source language code
+            target_lang: Target language code
+            model: Model that produced the translation
+
+        Returns:
+            Cache key
+        """
+        normalized = " ".join(unicodedata.normalize("NFC", text).split())
+        return "\x1f".join((model, source_lang, target_lang, normalized))
+
+    async def get(self, key: str) -> Optional[str]:
+        """Look up a translation.
+
+        Args:
+            key: Key from make_key
+
+        Returns:
+            Cached translation, or None on a miss
+        """
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, created = entry
+            if now - created < self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self._db is not None:
+            row = await asyncio.to_thread(self._db_get, key)
+            if row is not None and now - row[1] < self.ttl:
+                self._remember(key, row[0], row[1])
+                self.hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        """Store a translation.
+
+        Args:
+            key: Key from make_key
+            value: Translated text
+        """
+        created = time.time()
+        self._remember(key, value, created)
+        if self._db is not None:
+            await asyncio.to_thread(self._db_set, key, value, created)
+
+    def _remember(self, key: str, value: str, created: float) -> None:
+        """Insert into the in-memory LRU, evicting the oldest entries."""
+        self._entries[key] = (value, created)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _db_get(self, key: str) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            # Closed at shutdown while a lookup was on its way here
+            if self._db is None:
+                return None
+            return self._db.execute(
+                "SELECT value, created FROM translations WHERE key = ?", (key,)
+            ).fetchone()
+
+    def _db_set(self, key: str, value: str, created: float) -> None:
+        with self._db_lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO translations (key, value, created) VALUES (?, ?, ?)",
+                (key, value, created),
+            )
+            self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current size."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "persistent": self._db is not None,
+        }
+
+    def close(self) -> None:
+        """Close the backing store."""
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,159 @@
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import functools
+import importlib.util
+import logging
+import multiprocessing
+import os
+import time
+
+from app.services import metrics, translation_worker
+from app.services.translation import TranslationContext, TranslationService
+from app.services.translation_cache import TranslationCache
+
+logger = logging.getLogger(__name__)
+
+# Segments waiting for a model batch: (model path, source, target) -> [(text, future)]
+BatchKey = Tuple[str, str, str]
+
+def parse_models(spec: str) -> Dict[str, str]:
+    """Parse "ko-en=/models/opus-mt-ko-en,*=/models/nllb" into {pair: model directory}.
+
+    "*" names the model used for pairs without their own.
+    """
+    models: Dict[str, str] = {}
+    for entry in spec.split(","):
+        if entry.strip():
+            pair, _, path = entry.partition("=")
+            models[pair.strip().lower()] = path.strip()
+    return models
+
+class LocalTranslationService(TranslationService):
+    """Translation with CTranslate2 models on this machine's CPUs.
+
+    Models run in a pool of worker processes, each holding every
+    configured model. Segments are micro-batched dynamically: a segment
+    goes straight to an idle worker, and while all workers are busy,
+    segments from every room queue up per model and language pair and go
+    out together as one batch when a worker frees up. Batching costs no
+    added latency when the pool is idle and raises throughput under load.
+    Models translate sentence by sentence, without the room's context
+    window.
+    """
+
+    name = "local"
+
+    def __init__(self, models: Dict[str, str], workers: int = 1, threads: int = 0, max_batch: int = 16,
+                 compute_type: str = "int8", cache: Optional[TranslationCache] = None):
+        """Initialize the local translation service.
+
+        Args:
+            models: Language pair ("ko-en", or "*" for any) to CTranslate2 model directory
+            workers: Engine processes to run
+            threads: CPU threads per engine process (0 lets CTranslate2 decide)
+            max_batch: Most segments translated in one batch
+            compute_type: CTranslate2 compute type on CPU
+            cache: Optional cache consulted before translating
+        """
+        for module in ("ctranslate2", "sentencepiece"):
+            if importlib.util.find_spec(module) is None:
+                raise ValueError(f"Local translation requires the {module} package")
+        if not models:
+            raise ValueError("Local translation requires at least one model")
+        for path in models.values():
+            if not os.path.isdir(path):
+                raise ValueError(f"Local translation model not found: {path}")
+
+        # Cache entries are tied to the set of models that produced them
+        super().__init__("ct2:" + ",".join(sorted(os.path.basename(os.path.normpath(p)) for p in set(models.values()))), cache)
+        self.models = models
+        self.workers = max(1, workers)
+        self.max_batch = max_batch
+        self._pending: Dict[BatchKey, List[Tuple[str, asyncio.Future]]] = {}
+        self._busy = 0
+        self._dispatch_scheduled = False
+
+        # Spawned rather than forked: the server process has threads running
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=translation_worker.init_worker,
+            initargs=(sorted(set(models.values())), threads, compute_type),
+        )
+        # Load the models now rather than during the first caption
+        for _ in range(self.workers):
+            self.executor.submit(translation_worker.ready)
+        logger.info("Starting %d local translation worker(s) for %s", self.workers, ", ".join(sorted(models)))
+
+    def model_for(self, source_lang: str, target_lang: str) -> str:
+        """Model directory for a language pair."""
+        pair = f"{source_lang.split('-')[0]}-{target_lang.split('-')[0]}".lower()
+        path = self.models.get(pair) or self.models.get("*")
+        if path is None:
+            raise ValueError(f"No local translation model for {pair}")
+        return path
+
+    async def _complete(
+        self,
+        text: str,
+        source_lang: str,
+        target_lang: str,
+        context: Optional[TranslationContext]
+    ) -> str:
+        future = asyncio.get_running_loop().create_future()
+        key = (self.model_for(source_lang, target_lang), source_lang, target_lang)
+        self._pending.setdefault(key, []).append((text, future))
+        if not self._dispatch_scheduled:
+            # Dispatch once the current loop iteration has run, so segments
+            # submitted together (every language of a caption) share a batch
+            self._dispatch_scheduled = True
+            asyncio.get_running_loop().call_soon(self._dispatch)
+        return await future
+
+    def _dispatch(self) -> None:
+        """Hand queued segments to idle workers, oldest language pair first."""
+        self._dispatch_scheduled = False
+        loop = asyncio.get_running_loop()
+        while self._busy < self.workers and self._pending:
+            key = next(iter(self._pending))
+            waiting = [request for request in self._pending.pop(key) if not request[1].done()]
+            batch, rest = waiting[:self.max_batch], waiting[self.max_batch:]
+            if rest:
+                self._pending[key] = rest  # Back of the line, behind other pairs
+            if not batch:
+                continue
+
+            path, source_lang, target_lang = key
+            try:
+                done = loop.run_in_executor(
+                    self.executor, translation_worker.translate_batch,
+                    path, source_lang, target_lang, [text for text, _ in batch],
+                )
+            except Exception as e:
+                # The pool is broken or shut down
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self._busy += 1
+            done.add_done_callback(functools.partial(self._finished, batch, time.perf_counter()))
+
+    def _finished(self, batch: List[Tuple[str, asyncio.Future]], started: float, done: asyncio.Future) -> None:
+        self._busy -= 1
+        metrics.TRANSLATION_LOCAL.observe(time.perf_counter() - started)
+        metrics.TRANSLATION_BATCH_SIZE.observe(len(batch))
+        error = None if done.cancelled() else done.exception()
+        for i, (_, future) in enumerate(batch):
+            if future.done():
+                continue  # The caller gave up (e.g. a fallback timeout)
+            if done.cancelled():
+                future.cancel()
+            elif error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[i])
+        self._dispatch()
+
+    async def close(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
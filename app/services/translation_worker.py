@@ -0,0 +1,97 @@
+"""CTranslate2 translation models for the local translation engine.
+
+This module runs inside the engine's worker processes. It imports only
+the standard library at the top; ctranslate2 and sentencepiece are
+imported when a worker starts and loads its models.
+
+A model directory holds a CTranslate2 conversion plus the SentencePiece
+files of the original model:
+
+- Marian (OPUS-MT), one language pair per model: source.spm and target.spm
+- NLLB-200, many languages per model: sentencepiece.bpe.model
+"""
+from typing import Any, Dict, List
+import os
+
+# Greedy decoding: captions favour latency over the last bit of quality
+BEAM_SIZE = 1
+MAX_DECODING_LENGTH = 256
+
+# NLLB language codes for the languages captions are commonly requested in
+NLLB_CODES = {
+    "ar": "arb_Arab", "de": "deu_Latn", "en": "eng_Latn", "es": "spa_Latn",
+    "fr": "fra_Latn", "hi": "hin_Deva", "id": "ind_Latn", "it": "ita_Latn",
+    "ja": "jpn_Jpan", "ko": "kor_Hang", "nl": "nld_Latn", "pl": "pol_Latn",
+    "pt": "por_Latn", "ru": "rus_Cyrl", "th": "tha_Thai", "tr": "tur_Latn",
+    "uk": "ukr_Cyrl", "vi": "vie_Latn", "zh": "zho_Hans", "zh-tw": "zho_Hant",
+}
+
+def nllb_code(language: str) -> str:
+    """NLLB code for a language code like "ko", "ko-KR" or "zh-TW"."""
+    language = language.lower()
+    code = NLLB_CODES.get(language) or NLLB_CODES.get(language.split("-")[0])
+    if code is None:
+        raise ValueError(f"No NLLB code for language: {language}")
+    return code
+
+class MarianModel:
+    """A single-pair OPUS-MT model."""
+
+    def __init__(self, translator: Any, path: str):
+        import sentencepiece
+        self.translator = translator
+        self.source = sentencepiece.SentencePieceProcessor(model_file=os.path.join(path, "source.spm"))
+        self.target = sentencepiece.SentencePieceProcessor(model_file=os.path.join(path, "target.spm"))
+
+    def translate(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        tokens = [self.source.encode(text, out_type=str) + ["</s>"] for text in texts]
+        results = self.translator.translate_batch(
+            tokens, beam_size=BEAM_SIZE, max_decoding_length=MAX_DECODING_LENGTH,
+        )
+        return [self.target.decode(result.hypotheses[0]) for result in results]
+
+class NllbModel:
+    """A multilingual NLLB-200 model; the target language is forced with a prefix token."""
+
+    def __init__(self, translator: Any, path: str):
+        import sentencepiece
+        self.translator = translator
+        self.tokenizer = sentencepiece.SentencePieceProcessor(model_file=os.path.join(path, "sentencepiece.bpe.model"))
+
+    def translate(self, texts: List[str], source_lang: str, target_lang: str) -> List[str]:
+        source, target = nllb_code(source_lang), nllb_code(target_lang)
+        tokens = [[source] + self.tokenizer.encode(text, out_type=str) + ["</s>"] for text in texts]
+        results = self.translator.translate_batch(
+            tokens,
+            target_prefix=[[target]] * len(texts),
+            beam_size=BEAM_SIZE,
+            max_decoding_length=MAX_DECODING_LENGTH,
+        )
+        # Drop the forced language token
+        return [self.tokenizer.decode(result.hypotheses[0][1:]) for result in results]
+
+def load_model(path: str, threads: int = 0, compute_type: str = "int8") -> Any:
+    """Load a model directory, telling Marian and NLLB apart by their tokenizer files."""
+    import ctranslate2
+    translator = ctranslate2.Translator(
+        path, device="cpu", compute_type=compute_type, inter_threads=1, intra_threads=threads,
+    )
+    if os.path.exists(os.path.join(path, "sentencepiece.bpe.model")):
+        return NllbModel(translator, path)
+    return MarianModel(translator, path)
+
+# Per-process state, set up by init_worker
+_models: Dict[str, Any] = {}
+
+def init_worker(paths: List[str], threads: int, compute_type: str) -> None:
+    """Load every configured model; run once when a worker process starts."""
+    for path in paths:
+        _models[path] = load_model(path, threads, compute_type)
+
+def ready() -> bool:
+    """No-op used to start a worker (and load its models) ahead of the first caption."""
+    return bool(_models)
+
+def translate_batch(path: str, source_lang: str, target_lang: str, texts: List[str]) -> List[str]:
+    """Translate a batch of texts with one model."""
+    return [text.strip() for text in _models[path].translate(texts, source_lang, target_lang)]
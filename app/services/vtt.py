@@ -0,0 +1,270 @@
+from typing import Dict, Any, List, Optional, Deque, Tuple
+from collections import deque
+import hashlib
+import uuid
+
+from app.services.room_backend import RoomBackend
+
+def format_timestamp(seconds: float) -> str:
+    """Format seconds as a WebVTT timestamp (HH:MM:SS.mmm)."""
+    millis = max(0, round(seconds * 1000))
+    hours, millis = divmod(millis, 3600_000)
+    minutes, millis = divmod(millis, 60_000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+def escape_cue_text(text: str) -> str:
+    """Escape text for a WebVTT cue payload."""
+    text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    # Blank lines would end the cue early
+    return "\n".join(line for line in text.splitlines() if line.strip())
+
+def etag_for(body: bytes) -> str:
+    """Strong ETag for a response body."""
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+class VttSegment:
+    """A finished WebVTT segment; immutable once created."""
+
+    __slots__ = ("index", "duration", "body", "etag")
+
+    def __init__(self, index: int, duration: float, body: bytes):
+        self.index = index
+        self.duration = duration
+        self.body = body
+        self.etag = etag_for(body)
+
+class VttStream:
+    """Rolling WebVTT segments and HLS playlist for one room and language.
+
+    Captions are cut into fixed-length segments on the room's clock.
+    Segments are finished lazily, whenever a caption arrives or the
+    playlist is read, so there is no timer per stream. Only the last
+    window_segments segments are kept, so memory stays fixed.
+    """
+
+    def __init__(
+        self,
+        epoch: str,
+        start_time: float,
+        segment_duration: float = 6.0,
+        window_segments: int = 10,
+        max_cue_duration: float = 5.0,
+        first_index: int = 0,
+    ):
+        """Initialize the stream.
+
+        Args:
+            epoch: Token identifying this broadcast in segment URLs
+            start_time: Event loop time at which the stream starts (media time 0)
+            segment_duration: Seconds of captions per segment
+            window_segments: Finished segments kept and listed in the playlist
+            max_cue_duration: Longest a caption stays on screen
+            first_index: Segment the stream starts at (for languages added mid-broadcast)
+        """
+        self.epoch = epoch
+        self.start_time = start_time
+        self.segment_duration = segment_duration
+        self.max_cue_duration = max_cue_duration
+        self.segments: Deque[VttSegment] = deque(maxlen=window_segments)
+        self.ended = False
+        self._open_index = first_index
+        # (start, end, text) for cues in the open segment; the last cue's end
+        # is tentative until the next caption replaces it
+        self._cues: List[Tuple[float, float, str]] = []
+        self._playlist: Optional[Tuple[bytes, str]] = None
+        # What the room backend has: segments before shared_index, and this playlist
+        self.shared_index = first_index
+        self.shared_playlist: Optional[bytes] = None
+
+    def _segment_bounds(self, index: int) -> Tuple[float, float]:
+        return index * self.segment_duration, (index + 1) * self.segment_duration
+
+    def add_caption(self, text: str, ts: float) -> None:
+        """Add a caption shown from event loop time ts."""
+        if self.ended or not text.strip():
+            return
+        self.advance(ts)
+        start = max(ts - self.start_time, self._segment_bounds(self._open_index)[0])
+        if self._cues:
+            previous_start, previous_end, previous_text = self._cues[-1]
+            # A caption timed before the previous one starts with it; the two
+            # overlap rather than the previous one being cut down to nothing
+            start = max(start, previous_start)
+            if start > previous_start:
+                self._cues[-1] = (previous_start, min(previous_end, start), previous_text)
+        self._cues.append((start, start + self.max_cue_duration, text))
+
+    def advance(self, now: float) -> None:
+        """Finish every segment that ends at or before event loop time now."""
+        while not self.ended and self._segment_bounds(self._open_index)[1] <= now - self.start_time:
+            self._finish_segment()
+
+    def end(self, now: float) -> None:
+        """Finish the stream; the playlist gets an end marker."""
+        if self.ended:
+            return
+        self.advance(now)
+        if self._cues or now - self.start_time > self._segment_bounds(self._open_index)[0]:
+            self._finish_segment(end=now - self.start_time)
+        self.ended = True
+        self._playlist = None
+
+    def _finish_segment(self, end: Optional[float] = None) -> None:
+        seg_start, seg_end = self._segment_bounds(self._open_index)
+        if end is not None:
+            seg_end = max(seg_start, min(seg_end, end))
+
+        lines = ["WEBVTT", "X-TIMESTAMP-MAP=MPEGTS:0,LOCAL:00:00:00.000", ""]
+        carried: List[Tuple[float, float, str]] = []
+        for start, cue_end, text in self._cues:
+            if cue_end > seg_end:
+                # Still on screen when the next segment starts: repeat it there
+                if end is None:
+                    carried.append((seg_end, cue_end, text))
+                cue_end = seg_end
+            if cue_end <= start:
+                continue
+            lines.append(f"{format_timestamp(start)} --> {format_timestamp(cue_end)}")
+            lines.append(escape_cue_text(text))
+            lines.append("")
+
+        self.segments.append(VttSegment(self._open_index, seg_end - seg_start, "\n".join(lines).encode()))
+        self._open_index += 1
+        self._cues = carried
+        self._playlist = None
+
+    def segment(self, index: int) -> Optional[VttSegment]:
+        """A finished segment still in the window, or None."""
+        if not self.segments:
+            return None
+        offset = index - self.segments[0].index
+        if 0 <= offset < len(self.segments):
+            return self.segments[offset]
+        return None
+
+    def playlist(self) -> Tuple[bytes, str]:
+        """The HLS media playlist for the window, and its ETag."""
+        if self._playlist is None:
+            lines = [
+                "#EXTM3U",
+                "#EXT-X-VERSION:3",
+                f"#EXT-X-TARGETDURATION:{int(self.segment_duration + 0.999)}",
+                f"#EXT-X-MEDIA-SEQUENCE:{self.segments[0].index if self.segments else 0}",
+            ]
+            for segment in self.segments:
+                lines.append(f"#EXTINF:{segment.duration:.3f},")
+                lines.append(f"{self.epoch}/{segment.index}.vtt")
+            if self.ended:
+                lines.append("#EXT-X-ENDLIST")
+            body = ("\n".join(lines) + "\n").encode()
+            self._playlist = (body, etag_for(body))
+        return self._playlist
+
+class VttService:
+    """Segmented WebVTT output for every live room and language.
+
+    A room's streams stay up for one playlist window after its broadcast
+    ends, so players can fetch the last segments and see the end marker.
+    Ended rooms are forgotten lazily as broadcasts start and end or their
+    playlists are read. Streams live on the worker running the room's
+    broadcaster; share() copies their output to the room backend for the
+    other workers.
+    """
+
+    def __init__(self, segment_duration: float = 6.0, window_segments: int = 10):
+        """Initialize the service.
+
+        Args:
+            segment_duration: Seconds of captions per segment
+            window_segments: Finished segments kept per stream
+        """
+        self.segment_duration = segment_duration
+        self.window_segments = window_segments
+        # room_id -> (epoch, start time, language -> stream)
+        self.rooms: Dict[str, Tuple[str, float, Dict[str, VttStream]]] = {}
+        self.ended_at: Dict[str, float] = {}  # room_id -> event loop time its broadcast ended
+
+    def start_room(self, room_id: str, now: float) -> str:
+        """Start a new broadcast for a room, replacing any previous one.
+
+        Returns:
+            The broadcast's epoch, to pass to end_room
+        """
+        self._evict(now)
+        epoch = uuid.uuid4().hex[:12]
+        self.rooms[room_id] = (epoch, now, {})
+        self.ended_at.pop(room_id, None)
+        return epoch
+
+    def end_room(self, room_id: str, epoch: str, now: float) -> None:
+        """Mark a room's streams as finished, unless a newer broadcast replaced them."""
+        room = self.rooms.get(room_id)
+        if room is not None and room[0] == epoch:
+            for stream in room[2].values():
+                stream.end(now)
+            self.ended_at[room_id] = now
+        self._evict(now)
+
+    def _evict(self, now: float) -> None:
+        """Forget rooms that ended more than a playlist window ago."""
+        retention = self.segment_duration * self.window_segments
+        for room_id, ended_at in list(self.ended_at.items()):
+            if now - ended_at >= retention:
+                del self.ended_at[room_id]
+                self.rooms.pop(room_id, None)
+
+    def add_caption(self, room_id: str, caption: Dict[str, Any]) -> None:
+        """Add a translated caption message to its language's stream."""
+        if room_id not in self.rooms or not caption.get("language"):
+            return
+        epoch, start_time, streams = self.rooms[room_id]
+        stream = streams.get(caption["language"])
+        if stream is None:
+            stream = streams[caption["language"]] = VttStream(
+                epoch,
+                start_time,
+                self.segment_duration,
+                self.window_segments,
+                first_index=int(max(0.0, caption["ts"] - start_time) // self.segment_duration),
+            )
+        stream.add_caption(caption.get("translation", ""), caption["ts"])
+
+    async def share(self, room_id: str, epoch: str, backend: RoomBackend, now: float) -> None:
+        """Copy a broadcast's new segments and changed playlists to the room backend.
+
+        Other workers serve them from there, so VTT requests need not reach
+        the worker running the broadcaster. Segments are written before the
+        playlist that lists them.
+        """
+        room = self.rooms.get(room_id)
+        if room is None or room[0] != epoch:
+            return
+        # Listed for a window after it finishes, plus the playlist's cache time
+        ttl = (self.window_segments + 1) * self.segment_duration
+        for language, stream in list(room[2].items()):
+            stream.advance(now)
+            playlist, _ = stream.playlist()
+            if playlist == stream.shared_playlist:
+                continue
+            files = [
+                (f"{stream.epoch}/{segment.index}.vtt", segment.body)
+                for segment in stream.segments if segment.index >= stream.shared_index
+            ]
+            files.append(("playlist.m3u8", playlist))
+            await backend.store_vtt(room_id, language, files, ttl)
+            stream.shared_playlist = playlist
+            if stream.segments:
+                stream.shared_index = stream.segments[-1].index + 1
+
+    def stream(self, room_id: str, language: str, now: float) -> Optional[VttStream]:
+        """A room's stream for a language, brought up to date."""
+        ended_at = self.ended_at.get(room_id)
+        if ended_at is not None and now - ended_at >= self.segment_duration * self.window_segments:
+            self._evict(now)
+        room = self.rooms.get(room_id)
+        if room is None or language not in room[2]:
+            return None
+        stream = room[2][language]
+        stream.advance(now)
+        return stream
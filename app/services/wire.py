@@ -0,0 +1,114 @@
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import time
+
+from starlette.websockets import WebSocket
+
+try:
+    import msgpack as _msgpack
+except ImportError:  # The compact format is only offered when msgpack is installed
+    _msgpack = None
+
+# Wire formats a viewer can negotiate
+FORMAT_JSON = "json"        # Text frames with the full JSON message (default)
+FORMAT_COMPACT = "compact"  # Binary MessagePack frames with integer tags
+
+# WebSocket subprotocols offered by viewers, mapped to wire formats
+SUBPROTOCOLS = {
+    "unbabel.json": FORMAT_JSON,
+    "unbabel.msgpack": FORMAT_COMPACT,
+}
+
+# Compact encoding: message types and field names become small integers.
+# Keep in sync with static/js/wire.js; only ever append.
+TYPE_TAGS = {
+    "caption": 1,
+    "caption_partial": 2,
+    "caption_stream": 3,
+    "caption_history": 4,
+    "connection_established": 5,
+    "language_set": 6,
+    "error": 7,
+}
+FIELD_TAGS = {
+    "type": 0,
+    "ts": 1,
+    "original": 2,
+    "translation": 3,
+    "language": 4,
+    "segment_id": 5,
+    "segment_ids": 6,
+    "seq": 7,
+    "since": 8,
+    "captions": 9,
+    "truncated": 10,
+    "room_id": 11,
+    "message": 12,
+    "format": 13,
+    "ts_base": 14,
+    "trace": 15,
+    "receipts": 16,
+    "server_time": 17,
+}
+
+# Compact timestamps are integer milliseconds after this process-wide base,
+# which viewers receive in the connection_established message. Caption
+# timestamps come from the event loop clock, which is time.monotonic().
+TS_BASE = float(int(time.monotonic()))
+
+def negotiate(websocket: WebSocket) -> Tuple[str, Optional[str]]:
+    """Pick a wire format from the subprotocols the client offered.
+
+    Args:
+        websocket: Socket that has not been accepted yet
+
+    Returns:
+        (wire format, subprotocol to accept or None)
+    """
+    for subprotocol in websocket.scope.get("subprotocols", []):
+        wire_format = SUBPROTOCOLS.get(subprotocol)
+        if wire_format == FORMAT_COMPACT and _msgpack is None:
+            continue
+        if wire_format is not None:
+            return wire_format, subprotocol
+    return FORMAT_JSON, None
+
+def encode_json(message: Dict[str, Any]) -> str:
+    """Encode a message as compact JSON text."""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+def _compact_fields(message: Dict[str, Any]) -> Dict[Any, Any]:
+    fields: Dict[Any, Any] = {}
+    for key, value in message.items():
+        if value is None:
+            continue
+        if key == "type":
+            value = TYPE_TAGS.get(value, value)
+        elif key == "ts" and isinstance(value, float):
+            value = round((value - TS_BASE) * 1000)
+        elif key == "captions":
+            value = [_compact_fields(caption) for caption in value]
+        # Unknown fields keep their names so new fields never break old viewers
+        fields[FIELD_TAGS.get(key, key)] = value
+    return fields
+
+def encode_compact(message: Dict[str, Any]) -> bytes:
+    """Encode a message as a MessagePack map with integer tags.
+
+    None fields are omitted and timestamps are sent as integer
+    milliseconds after TS_BASE.
+    """
+    return _msgpack.packb(_compact_fields(message))
+
+async def send_message(websocket: WebSocket, wire_format: str, message: Dict[str, Any]) -> None:
+    """Send one message to a socket in its negotiated format.
+
+    Args:
+        websocket: Socket to send to
+        wire_format: FORMAT_JSON or FORMAT_COMPACT
+        message: Message dict
+    """
+    if wire_format == FORMAT_COMPACT:
+        await websocket.send_bytes(encode_compact(message))
+    else:
+        await websocket.send_text(encode_json(message))
@@ -5,17 +5,151 @@ from app.config import settings
 @lru_cache()
 def get_stt_service():
     """Get or create a singleton instance of the STT service."""
+    if settings.stt_provider == "local":
+        from app.services.stt_local import LocalSTTService
+        return LocalSTTService(
+            engine=settings.local_stt_engine,
+            model=settings.local_stt_model,
+            language=settings.source_language,
+            workers=settings.local_stt_workers,
+            options={
+                "compute_type": settings.local_stt_compute_type,
+                "threads": settings.local_stt_threads,
+                "step": settings.local_stt_step,
+            },
+            max_buffered_chunks=settings.stt_max_buffered_chunks,
+            interim_results=settings.stt_interim_results,
+        )
+    if settings.stt_provider == "replay":
+        from app.services.stt_replay import ReplaySTTService
+        return ReplaySTTService(
+            settings.stt_replay_path,
+            max_buffered_chunks=settings.stt_max_buffered_chunks,
+            interim_results=settings.stt_interim_results,
+        )
     from app.services.stt import DeepgramSTTService
-    return DeepgramSTTService(settings.deepgram_api_key)
+    return DeepgramSTTService(
+        settings.deepgram_api_key,
+        url=settings.deepgram_url,
+        max_buffered_chunks=settings.stt_max_buffered_chunks,
+        interim_results=settings.stt_interim_results,
+    )
 
 @lru_cache()
-def get_translation_service():
-    """Get or create a singleton instance of the translation service."""
+def get_translation_cache():
+    """Get or create a singleton instance of the translation cache shared by all engines."""
+    from app.services.translation_cache import TranslationCache
+    return TranslationCache(
+        max_entries=settings.translation_cache_size,
+        ttl=settings.translation_cache_ttl,
+        db_path=settings.translation_cache_path or None,
+    )
+
+@lru_cache()
+def get_openai_translation_service():
+    """Get or create a singleton instance of the OpenAI translation service."""
     from app.services.translation import OpenAITranslationService
-    return OpenAITranslationService(settings.openai_api_key, settings.openai_model)
+    return OpenAITranslationService(
+        settings.openai_api_key,
+        settings.openai_model,
+        cache=get_translation_cache(),
+        base_url=settings.openai_base_url or None,
+    )
+
+@lru_cache()
+def get_local_translation_service():
+    """Get or create a singleton instance of the local CTranslate2 translation service."""
+    from app.services.translation_local import LocalTranslationService, parse_models
+    return LocalTranslationService(
+        parse_models(settings.local_translation_models),
+        workers=settings.local_translation_workers,
+        threads=settings.local_translation_threads,
+        max_batch=settings.local_translation_max_batch,
+        cache=get_translation_cache(),
+    )
+
+@lru_cache()
+def get_translation_service():
+    """Get or create a singleton instance of the default translation service."""
+    if settings.translation_provider == "local":
+        return get_local_translation_service()
+    service = get_openai_translation_service()
+    if settings.translation_fallback == "local":
+        from app.services.translation import FallbackTranslationService
+        return FallbackTranslationService(
+            service,
+            get_local_translation_service(),
+            timeout=settings.translation_fallback_timeout,
+        )
+    return service
+
+def get_room_translation_service(provider: str):
+    """The translation service a broadcaster asked for by name ("openai" or "local")."""
+    if provider == "local":
+        return get_local_translation_service()
+    if provider == "openai":
+        return get_openai_translation_service()
+    raise ValueError(f"Unknown translation provider: {provider}")
+
+@lru_cache()
+def get_room_backend():
+    """Get or create a singleton instance of the room backend."""
+    from app.services.room_backend import RoomBackend, RedisRoomBackend
+    if settings.room_backend == "redis":
+        return RedisRoomBackend(settings.redis_url)
+    return RoomBackend()
+
+@lru_cache()
+def get_vtt_service():
+    """Get or create a singleton instance of the WebVTT segment service."""
+    from app.services.vtt import VttService
+    return VttService(
+        segment_duration=settings.vtt_segment_duration,
+        window_segments=settings.vtt_window_segments,
+    )
+
+@lru_cache()
+def get_journal():
+    """Get or create a singleton instance of the transcript journal, or None if disabled."""
+    if not settings.journal_dir:
+        return None
+    from app.services.journal import TranscriptJournal
+    return TranscriptJournal(
+        settings.journal_dir,
+        max_segment_bytes=settings.journal_max_segment_bytes,
+        max_segment_age=settings.journal_max_segment_age,
+        flush_interval=settings.journal_flush_interval,
+    )
+
+@lru_cache()
+def get_heartbeat_manager():
+    """Get or create a singleton instance of the viewer heartbeat manager."""
+    from app.services.heartbeat import HeartbeatManager
+    return HeartbeatManager(
+        interval=settings.ws_heartbeat_interval,
+        timeout=settings.ws_heartbeat_timeout,
+    )
+
+@lru_cache()
+def get_delivery_tracker():
+    """Get or create a singleton instance of the glass-to-glass delivery tracker."""
+    from app.services.trace import DeliveryTracker
+    return DeliveryTracker(window=settings.trace_receipt_window)
+
+@lru_cache()
+def get_static_assets():
+    """Get or create a singleton instance of the in-memory static assets."""
+    from pathlib import Path
+    from app.services.assets import StaticAssets
+    return StaticAssets(str(Path(__file__).parent.parent.parent / "static"), watch=settings.debug)
 
 @lru_cache()
 def get_broadcast_service():
     """Get or create a singleton instance of the broadcast service."""
     from app.services.broadcast import BroadcastService
-    return BroadcastService()
+    return BroadcastService(
+        max_queue=settings.fanout_queue_size,
+        slow_policy=settings.fanout_slow_policy,
+        backend=get_room_backend(),
+        history_size=settings.caption_history_size,
+    )
@@ -0,0 +1,148 @@
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, Optional, Tuple
+import atexit
+import json
+import logging
+import queue
+import sys
+import time
+
+# Record attributes rendered as structured fields when set via extra=
+STRUCTURED_FIELDS = ("room", "session", "seq", "language", "suppressed")
+
+class StructuredFormatter(logging.Formatter):
+    """Plain text with structured fields appended as key=value."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(
+            f"{name}={getattr(record, name)}"
+            for name in STRUCTURED_FIELDS
+            if getattr(record, name, None) is not None
+        )
+        return f"{line} {fields}" if fields else line
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, in the shape Cloud Logging parses."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "severity": record.levelname,
+            "time": self.formatTime(record),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name in STRUCTURED_FIELDS:
+            value = getattr(record, name, None)
+            if value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves formatting to the listener thread.
+
+    The stock handler formats every record on the calling thread (the
+    event loop); here the record is queued as is, so log arguments must
+    not be mutated after the call.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+_listener: Optional[QueueListener] = None
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """Per-logger levels from "app.services.stt=DEBUG,app.routes=WARNING"."""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.strip().partition("=")
+        if name and level:
+            levels[name.strip()] = logging.getLevelName(level.strip().upper())
+    return {name: level for name, level in levels.items() if isinstance(level, int)}
+
+def setup_logging(level: str = "INFO", module_levels: str = "", fmt: str = "text") -> None:
+    """Route the app's logs through a queue to a writer thread.
+
+    Log calls on the event loop only append to an in-memory queue; a
+    QueueListener thread formats and writes them to stdout.
+
+    Args:
+        level: Level for the "app" logger
+        module_levels: Comma-separated logger=LEVEL overrides
+        fmt: "text" or "json"
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if fmt == "json" else StructuredFormatter())
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, stream, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(level.upper())
+    app_logger.addHandler(_DeferredQueueHandler(log_queue))
+    app_logger.propagate = False
+    for name, module_level in parse_levels(module_levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+class RateLimitedLog:
+    """Log at most once per key per interval, counting what was skipped.
+
+    For per-chunk and per-viewer events: the first record for a key is
+    logged, repeats within interval are only counted, and the next record
+    logged carries the count as suppressed=N.
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = 10.0, max_keys: int = 1024):
+        """Initialize the limiter.
+
+        Args:
+            logger: Logger to write to
+            interval: Seconds between records for the same key
+            max_keys: Keys tracked before stale ones are forgotten
+        """
+        self.logger = logger
+        self.interval = interval
+        self.max_keys = max_keys
+        self._keys: Dict[Any, Tuple[float, int]] = {}  # key -> (last logged, suppressed since)
+
+    def log(self, level: int, key: Any, msg: str, *args: Any, extra: Optional[Dict[str, Any]] = None) -> None:
+        """Log msg for key unless it was logged less than interval ago."""
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        last, suppressed = self._keys.get(key, (0.0, 0))
+        if last and now - last < self.interval:
+            self._keys[key] = (last, suppressed + 1)
+            return
+        if len(self._keys) >= self.max_keys and key not in self._keys:
+            self._keys = {k: v for k, v in self._keys.items() if now - v[0] < self.interval}
+        self._keys[key] = (now, 0)
+        if suppressed:
+            extra = dict(extra or {}, suppressed=suppressed)
+        self.logger.log(level, msg, *args, extra=extra)
+
+    def debug(self, key: Any, msg: str, *args: Any, extra: Optional[Dict[str, Any]] = None) -> None:
+        self.log(logging.DEBUG, key, msg, *args, extra=extra)
+
+    def info(self, key: Any, msg: str, *args: Any, extra: Optional[Dict[str, Any]] = None) -> None:
+        self.log(logging.INFO, key, msg, *args, extra=extra)
+
+    def warning(self, key: Any, msg: str, *args: Any, extra: Optional[Dict[str, Any]] = None) -> None:
+        self.log(logging.WARNING, key, msg, *args, extra=extra)
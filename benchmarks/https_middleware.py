@@ -0,0 +1,130 @@
+"""Per-request cost of the HTTPS middleware on viewer page loads.
+
+Drives GET /view/{room_id} through the full app in-process (no sockets)
+as it runs on Cloud Run, once with the previous BaseHTTPMiddleware that
+rewrote HTML bodies and once with the pure ASGI scheme middleware, and
+reports latency and allocations per request.
+
+Usage:
+    python -m benchmarks.https_middleware [--requests N]
+"""
+from typing import List, Tuple
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import time
+import tracemalloc
+
+os.environ.setdefault("K_SERVICE", "benchmark")  # Behave as on Cloud Run
+os.environ.setdefault("DEBUG", "false")  # Production page caching
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, HTMLResponse
+
+from app.middleware import HTTPSSchemeMiddleware, is_cloud_run
+from app.routes import pages, assets
+
+class LegacyHTTPSRedirectMiddleware(BaseHTTPMiddleware):
+    """The middleware this replaced, kept here as the baseline."""
+
+    async def dispatch(self, request: Request, call_next):
+        if is_cloud_run() and request.url.scheme == "http":
+            request.scope["scheme"] = "https"
+        response = await call_next(request)
+        if is_cloud_run() and isinstance(response, HTMLResponse):
+            body = b""
+            async for chunk in response.body_iterator:
+                body += chunk
+            body_str = body.decode("utf-8")
+            body_str = re.sub(r'(src|href)=(["\'])http://', r'\1=\2https://', body_str)
+            response = Response(
+                content=body_str,
+                status_code=response.status_code,
+                headers=dict(response.headers),
+                media_type=response.media_type
+            )
+        return response
+
+def build_app(middleware) -> FastAPI:
+    """The page routes behind the same middleware stack as app.main."""
+    app = FastAPI()
+    app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True, allow_methods=["*"], allow_headers=["*"])
+    app.include_router(pages.router)
+    app.include_router(assets.router)
+    app.add_middleware(middleware)
+    return app
+
+def page_scope() -> dict:
+    return {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/view/benchmark-room",
+        "raw_path": b"/view/benchmark-room",
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"unbabel.example.run.app"), (b"x-forwarded-proto", b"https")],
+        "client": ("203.0.113.7", 51234),
+        "server": ("10.0.0.2", 8080),
+    }
+
+async def request_once(app: FastAPI) -> bytes:
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(page_scope(), receive, send)
+    return b"".join(body)
+
+async def measure(app: FastAPI, requests: int) -> Tuple[List[float], float, bytes]:
+    """Latencies (seconds), mean peak bytes allocated per request, and the page."""
+    page = b""
+    for _ in range(50):  # Warm up template and route caches
+        page = await request_once(app)
+
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        await request_once(app)
+        latencies.append(time.perf_counter() - start)
+
+    # Peak memory above the starting point while each request runs
+    peaks = []
+    tracemalloc.start()
+    for _ in range(200):
+        current = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await request_once(app)
+        peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    tracemalloc.stop()
+    return latencies, statistics.fmean(peaks), page
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Timed requests per middleware")
+    args = parser.parse_args()
+
+    print(f"{'middleware':<26} {'p50 us':>8} {'p99 us':>8} {'mean us':>8} {'peak B/req':>11}  https links")
+    for name, middleware in (("BaseHTTPMiddleware (old)", LegacyHTTPSRedirectMiddleware), ("pure ASGI scheme", HTTPSSchemeMiddleware)):
+        latencies, peak, page = asyncio.run(measure(build_app(middleware), args.requests))
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2] * 1e6
+        p99 = latencies[int(len(latencies) * 0.99)] * 1e6
+        mean = statistics.fmean(latencies) * 1e6
+        secure = b'http://' not in page and b'https://' in page
+        print(f"{name:<26} {p50:>8.1f} {p99:>8.1f} {mean:>8.1f} {peak:>11.0f}  {'yes' if secure else 'NO'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,347 @@
+"""Load test: N broadcasters and M viewers against a local server.
+
+Starts the Deepgram and OpenAI stubs (benchmarks.stubs) in this process
+and the app in a subprocess pointed at them, so nothing leaves the
+machine and no API keys are needed. Each broadcaster streams a 250 ms
+audio chunk at a time to /ws/stream/{room_id}; viewers are spread over
+the rooms (and --languages) on /ws/view/{room_id}.
+
+Reports:
+    - Caption throughput: captions produced and delivered per second
+    - End-to-end latency: end of an utterance's audio to each viewer
+      receiving its caption, p50/p95/p99
+    - Fan-out spread: first to last viewer receiving the same caption
+    - Server-side fan-out time and event loop lag, from /metrics
+    - Server memory per viewer (resident set growth as viewers connect)
+
+Usage:
+    python -m benchmarks.loadtest [--broadcasters N] [--viewers M] [--duration S]
+        [--stt-latency S] [--translation-latency S] [--app-env KEY=VALUE ...]
+"""
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+import uvicorn
+import websockets
+from prometheus_client.parser import text_string_to_metric_families
+
+from app.services.wire import FIELD_TAGS, TYPE_TAGS
+from benchmarks import stubs
+
+# Viewers connect this many at a time
+CONNECT_BATCH = 200
+
+# Compact-format tags back to names
+FIELD_NAMES = {tag: name for name, tag in FIELD_TAGS.items()}
+TYPE_NAMES = {tag: name for name, tag in TYPE_TAGS.items()}
+
+class Results:
+    """Timings gathered by the simulated clients (time.monotonic())."""
+
+    def __init__(self):
+        self.utterance_ends: Dict[Tuple[str, int], float] = {}  # (room, utterance) -> last chunk sent
+        self.latencies: List[float] = []  # Utterance end to a viewer receiving the caption
+        self.receipts: Dict[Tuple[str, str, int], List[float]] = defaultdict(list)  # (room, language, utterance) -> receive times
+        self.viewers_connected = 0
+        self.measuring = False
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))] if ordered else float("nan")
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process (Linux), or None if unavailable."""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def histogram(metrics_text: str, name: str, labels: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+    """Cumulative buckets, sum and count of one series in a /metrics scrape."""
+    result: Dict[str, Any] = {"buckets": {}, "sum": 0.0, "count": 0.0}
+    for family in text_string_to_metric_families(metrics_text):
+        if family.name != name:
+            continue
+        for sample in family.samples:
+            sample_labels = {k: v for k, v in sample.labels.items() if k != "le"}
+            if labels and sample_labels != labels:
+                continue
+            if sample.name.endswith("_bucket"):
+                result["buckets"][float(sample.labels["le"])] = sample.value
+            elif sample.name.endswith("_sum"):
+                result["sum"] = sample.value
+            elif sample.name.endswith("_count"):
+                result["count"] = sample.value
+    return result
+
+def histogram_delta(before: Dict[str, Any], after: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "buckets": {le: count - before["buckets"].get(le, 0.0) for le, count in after["buckets"].items()},
+        "sum": after["sum"] - before["sum"],
+        "count": after["count"] - before["count"],
+    }
+
+def histogram_quantile(series: Dict[str, Any], q: float) -> float:
+    """Quantile estimated from cumulative buckets, as Prometheus does."""
+    buckets = sorted(series["buckets"].items())
+    if not buckets or not series["count"]:
+        return float("nan")
+    rank = q * series["count"]
+    lower_bound, lower_count = 0.0, 0.0
+    for upper_bound, count in buckets:
+        if count >= rank:
+            if upper_bound == float("inf"):
+                return lower_bound
+            if count == lower_count:
+                return upper_bound
+            return lower_bound + (upper_bound - lower_bound) * (rank - lower_count) / (count - lower_count)
+        lower_bound, lower_count = upper_bound, count
+    return lower_bound
+
+def decode(frame: Any) -> Dict[str, Any]:
+    """A viewer message from a JSON or compact frame."""
+    if isinstance(frame, str):
+        return json.loads(frame)
+    import msgpack
+    fields = msgpack.unpackb(frame, strict_map_key=False)
+    message = {FIELD_NAMES.get(key, key): value for key, value in fields.items()}
+    message["type"] = TYPE_NAMES.get(message.get("type"), message.get("type"))
+    return message
+
+async def broadcaster(base_url: str, room_id: str, chunk_bytes: int, stop: asyncio.Event, results: Results) -> None:
+    """Stream audio chunks in real time until stopped."""
+    chunk = bytes(chunk_bytes)
+    async with websockets.connect(f"{base_url}/ws/stream/{room_id}", max_size=None) as websocket:
+        async def drain():
+            # Captions are echoed to the broadcaster too; keep its socket moving
+            async for _ in websocket:
+                pass
+
+        drainer = asyncio.create_task(drain())
+        loop = asyncio.get_running_loop()
+        next_send = loop.time()
+        chunks = 0
+        try:
+            while not stop.is_set():
+                await websocket.send(chunk)
+                index, position = divmod(chunks, stubs.CHUNKS_PER_UTTERANCE)
+                if position == stubs.CHUNKS_PER_UTTERANCE - 1:
+                    results.utterance_ends[(room_id, index)] = time.monotonic()
+                chunks += 1
+                next_send += stubs.CHUNK_SECONDS
+                await asyncio.sleep(max(0.0, next_send - loop.time()))
+        finally:
+            drainer.cancel()
+
+async def viewer(
+    base_url: str,
+    room_id: str,
+    language: str,
+    compact: bool,
+    connected: asyncio.Event,
+    results: Results,
+) -> None:
+    """Receive captions until the connection closes, recording when each arrives."""
+    subprotocols = ["unbabel.msgpack"] if compact else None
+    try:
+        async with websockets.connect(
+            f"{base_url}/ws/view/{room_id}?language={language}",
+            subprotocols=subprotocols,
+            max_size=None,
+            open_timeout=60,
+        ) as websocket:
+            results.viewers_connected += 1
+            connected.set()
+            async for frame in websocket:
+                if frame == "ping":
+                    await websocket.send("pong")
+                    continue
+                if not results.measuring:
+                    continue
+                received = time.monotonic()
+                message = decode(frame)
+                if message.get("type") != "caption":
+                    continue
+                index = stubs.utterance_index(message.get("original", ""))
+                sent = results.utterance_ends.get((room_id, index))
+                if sent is not None:
+                    results.latencies.append(received - sent)
+                    results.receipts[(room_id, language, index)].append(received)
+    except (OSError, asyncio.TimeoutError, websockets.InvalidHandshake):
+        connected.set()
+    except websockets.ConnectionClosed:
+        pass
+
+async def wait_for_app(client: httpx.AsyncClient, url: str, process: Optional[subprocess.Popen]) -> None:
+    for _ in range(300):
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("App exited during startup")
+        try:
+            await client.get(f"{url}/metrics")
+            return
+        except httpx.TransportError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("App did not start")
+
+async def run(args: argparse.Namespace) -> None:
+    # Stubs share this process's event loop with the simulated clients
+    stub_server = uvicorn.Server(uvicorn.Config(
+        stubs.build_app(args.stt_latency, args.translation_latency, args.token_interval),
+        host="127.0.0.1", port=args.stub_port, log_level="warning",
+    ))
+    stub_task = asyncio.create_task(stub_server.serve())
+    while not stub_server.started:
+        await asyncio.sleep(0.05)
+
+    process = None
+    if args.target:
+        http_url = args.target.rstrip("/")
+    else:
+        http_url = f"http://127.0.0.1:{args.app_port}"
+        env = dict(
+            os.environ,
+            DEEPGRAM_API_KEY="stub",
+            OPENAI_API_KEY="stub",
+            DEEPGRAM_URL=f"http://127.0.0.1:{args.stub_port}",
+            OPENAI_BASE_URL=f"http://127.0.0.1:{args.stub_port}/v1",
+            DEBUG="false",
+            LOG_LEVEL="WARNING",
+        )
+        for item in args.app_env:
+            key, _, value = item.partition("=")
+            env[key] = value
+        # The uvicorn command doesn't read app settings; pass the ones it applies
+        deflate = env.get("WS_PER_MESSAGE_DEFLATE", "True").lower() == "true"
+        process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1",
+             "--port", str(args.app_port), "--log-level", "warning", "--no-access-log",
+             "--ws-per-message-deflate", str(deflate)],
+            env=env,
+        )
+    ws_url = "ws" + http_url[len("http"):]
+
+    results = Results()
+    stop = asyncio.Event()
+    tasks: List[asyncio.Task] = []
+    languages = [language.strip() for language in args.languages.split(",") if language.strip()]
+    try:
+        async with httpx.AsyncClient(timeout=30) as client:
+            await wait_for_app(client, http_url, process)
+
+            rooms = [f"load-{i}" for i in range(args.broadcasters)]
+            for room_id in rooms:
+                tasks.append(asyncio.create_task(broadcaster(ws_url, room_id, args.chunk_bytes, stop, results)))
+            await asyncio.sleep(1.0)  # Let rooms register before viewers look them up
+
+            rss_before = rss_bytes(process.pid) if process else None
+            for start in range(0, args.viewers, CONNECT_BATCH):
+                events = []
+                for i in range(start, min(args.viewers, start + CONNECT_BATCH)):
+                    connected = asyncio.Event()
+                    events.append(connected)
+                    tasks.append(asyncio.create_task(viewer(
+                        ws_url, rooms[i % len(rooms)], languages[(i // len(rooms)) % len(languages)],
+                        args.compact, connected, results,
+                    )))
+                await asyncio.gather(*(event.wait() for event in events))
+            await asyncio.sleep(1.0)
+            rss_after = rss_bytes(process.pid) if process else None
+
+            # Measure only once every room is producing captions for its full audience
+            await asyncio.sleep(args.warmup)
+            metrics_before = (await client.get(f"{http_url}/metrics")).text
+            results.measuring = True
+            started = time.monotonic()
+            await asyncio.sleep(args.duration)
+            results.measuring = False
+            elapsed = time.monotonic() - started
+            metrics_after = (await client.get(f"{http_url}/metrics")).text
+    finally:
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if process is not None:
+            # Shutdown talks to the stubs, so keep this loop running meanwhile
+            process.terminate()
+            try:
+                await asyncio.wait_for(asyncio.to_thread(process.wait), 15)
+            except asyncio.TimeoutError:
+                process.kill()
+        stub_server.should_exit = True
+        await stub_task
+
+    def server_series(name: str, labels: Optional[Dict[str, str]] = None) -> Dict[str, Any]:
+        return histogram_delta(histogram(metrics_before, name, labels), histogram(metrics_after, name, labels))
+
+    def ms(value: float) -> str:
+        return f"{value * 1000:8.1f}"
+
+    captions = len(results.receipts)
+    deliveries = len(results.latencies)
+    spreads = [max(times) - min(times) for times in results.receipts.values() if len(times) > 1]
+    print(f"rooms {args.broadcasters}, viewers {results.viewers_connected}/{args.viewers} connected, "
+          f"languages {','.join(languages)}, format {'compact' if args.compact else 'json'}, {elapsed:.0f}s measured")
+    print(f"captions     {captions / elapsed:8.1f}/s produced   {deliveries / elapsed:10.1f}/s delivered")
+    print(f"{'':24} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    if results.latencies:
+        print(f"{'end-to-end':<24} {ms(percentile(results.latencies, 0.5))} {ms(percentile(results.latencies, 0.95))} "
+              f"{ms(percentile(results.latencies, 0.99))} {ms(max(results.latencies))}")
+    if spreads:
+        print(f"{'fan-out spread':<24} {ms(percentile(spreads, 0.5))} {ms(percentile(spreads, 0.95))} "
+              f"{ms(percentile(spreads, 0.99))} {ms(max(spreads))}")
+    for label, name, labels in (
+        ("server fan-out publish", "unbabel_fanout_seconds", {"stage": "publish"}),
+        ("server fan-out deliver", "unbabel_fanout_seconds", {"stage": "deliver"}),
+        ("server caption latency", "unbabel_caption_latency_seconds", None),
+        ("event loop lag", "unbabel_event_loop_lag_seconds", None),
+    ):
+        series = server_series(name, labels)
+        if series["count"]:
+            print(f"{label:<24} {ms(histogram_quantile(series, 0.5))} {ms(histogram_quantile(series, 0.95))} "
+                  f"{ms(histogram_quantile(series, 0.99))} {'':>8}  (mean {series['sum'] / series['count'] * 1000:.2f})")
+    if rss_before is not None and rss_after is not None and results.viewers_connected:
+        per_viewer = (rss_after - rss_before) / results.viewers_connected
+        print(f"memory       {rss_before / 2**20:.1f} MiB -> {rss_after / 2**20:.1f} MiB, "
+              f"{per_viewer / 1024:.1f} KiB per viewer")
+    dropped = sum(
+        sample.value
+        for family in text_string_to_metric_families(metrics_after)
+        if family.name == "unbabel_viewers_dropped"
+        for sample in family.samples if sample.name.endswith("_total")
+    )
+    print(f"viewers dropped by server {dropped:.0f}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--broadcasters", type=int, default=1, help="Rooms, one broadcaster each")
+    parser.add_argument("--viewers", type=int, default=100, help="Viewers, spread over the rooms")
+    parser.add_argument("--languages", default="en", help="Comma-separated target languages, spread over each room's viewers")
+    parser.add_argument("--compact", action="store_true", help="Viewers use the compact MessagePack format")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds measured")
+    parser.add_argument("--warmup", type=float, default=5.0, help="Seconds after viewers connect before measuring")
+    parser.add_argument("--chunk-bytes", type=int, default=1000, help="Bytes per 250 ms audio chunk")
+    parser.add_argument("--stt-latency", type=float, default=0.3, help="Stub Deepgram: end of utterance to final transcript")
+    parser.add_argument("--translation-latency", type=float, default=0.4, help="Stub OpenAI: seconds before the first token")
+    parser.add_argument("--token-interval", type=float, default=0.03, help="Stub OpenAI: seconds between streamed words")
+    parser.add_argument("--app-port", type=int, default=8401)
+    parser.add_argument("--stub-port", type=int, default=8400)
+    parser.add_argument("--app-env", action="append", default=[], metavar="KEY=VALUE", help="Extra app settings")
+    parser.add_argument("--target", help="Test an already running app at this URL instead (it must use the stubs)")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+"""Microbenchmarks for the hot paths, checked against a JSON baseline.
+
+Each benchmark times one function in isolation, with in-process fake
+sockets and no network:
+
+    fanout.publish/N       BroadcastService.broadcast_to_room with N viewers (call only)
+    fanout.deliver/N       the same, until every viewer's writer has sent the frame
+    serialize.json         caption to a JSON text frame
+    serialize.compact      caption to a MessagePack frame
+    connection_manager/N   ConnectionManager.broadcast (one send_json per socket)
+    stt.handoff            Deepgram transcript callback to the session's iterator
+    translation.prompt     building chat messages with a full context window
+    translation.cache_hit  translate() answered from the memory cache
+    middleware.page        GET /view/{room_id} through the HTTPS scheme middleware
+
+Results are microseconds per call (best of several repeats for single
+calls, median of rounds for fan-out), with the garbage collector off
+while timing. With --check, any benchmark slower than its baseline by
+more than --threshold exits non-zero, so a change that makes fan-out
+twice as slow fails the build.
+
+Shared CI machines run at different speeds from one job to the next, so
+each run also times a fixed pure-Python calibration workload and
+comparisons are scaled by it. Record baselines with --save on hardware
+like the host that runs --check.
+
+Usage:
+    python -m benchmarks.microbench [--check] [--save] [--threshold 1.5] [--only PREFIX]
+"""
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import types
+
+os.environ.setdefault("K_SERVICE", "benchmark")  # Behave as on Cloud Run
+os.environ.setdefault("DEBUG", "false")  # Production page caching
+
+from deepgram import LiveTranscriptionEvents
+from starlette.websockets import WebSocketState
+
+from app.services.broadcast import BroadcastService, Frame
+from app.services.stt import DeepgramSTTService
+from app.services.translation import OpenAITranslationService, TranslationContext
+from app.services.translation_cache import TranslationCache
+from app.services.wire import TS_BASE, encode_compact, FORMAT_JSON
+from app.middleware import HTTPSSchemeMiddleware
+from app.utils.websocket import ConnectionManager
+from benchmarks.https_middleware import build_app, request_once
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "microbench.json")
+
+# Result name of the machine speed reference
+CALIBRATION = "calibration"
+
+# A caption as the broadcast route builds it
+CAPTION = {
+    "type": "caption",
+    "ts": TS_BASE + 1234.5678,
+    "original": "먼저 지난 분기의 결과를 간단히 살펴보겠습니다.",
+    "translation": "First, let's briefly look at last quarter's results.",
+    "language": "en",
+    "segment_id": 42,
+    "segment_ids": [41, 42],
+    "seq": 17,
+    "trace": [1792199177055, 312, 318, 905, 906],
+}
+
+class FakeWebSocket:
+    """Accepts frames without doing I/O, counting them."""
+
+    def __init__(self, on_send: Optional[Callable[[], None]] = None):
+        self.client_state = WebSocketState.CONNECTED
+        self.on_send = on_send
+
+    async def send_text(self, text: str) -> None:
+        if self.on_send is not None:
+            self.on_send()
+
+    async def send_bytes(self, data: bytes) -> None:
+        if self.on_send is not None:
+            self.on_send()
+
+    async def send_json(self, data: Any) -> None:
+        # Starlette serializes before sending
+        json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+    async def close(self, code: int = 1000) -> None:
+        self.client_state = WebSocketState.DISCONNECTED
+
+def calibration_workload() -> None:
+    """Fixed interpreter-bound work that machine speed is measured by."""
+    message = dict(CAPTION)
+    for i in range(200):
+        message["seq"] = i
+        json.dumps(message)
+        sorted(message.items())
+
+def best_of(fn: Callable[[], Any], number: int, repeat: int = 5) -> float:
+    """Fastest mean seconds per call over several repeats."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+async def best_of_async(fn: Callable[[], Awaitable[Any]], number: int, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await fn()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+async def bench_fanout(viewers: int) -> Dict[str, float]:
+    """Publish and full-delivery time for one caption to a room of viewers."""
+    service = BroadcastService(max_queue=64)
+    delivered = 0
+    target = 0
+    done = asyncio.Event()
+
+    def on_send():
+        nonlocal delivered
+        delivered += 1
+        if delivered == target:
+            done.set()
+
+    channels = [
+        await service.subscribe("bench", FakeWebSocket(on_send), "en", wire_format=FORMAT_JSON)
+        for _ in range(viewers)
+    ]
+    await asyncio.sleep(0)  # Let the writers start waiting
+
+    publish: List[float] = []
+    deliver: List[float] = []
+    rounds = max(5, min(200, 20000 // viewers))
+    for seq in range(rounds + 2):
+        target = delivered + viewers
+        done.clear()
+        start = time.perf_counter()
+        await service.broadcast_to_room("bench", dict(CAPTION, seq=seq), "en")
+        published = time.perf_counter()
+        await done.wait()
+        finished = time.perf_counter()
+        if seq >= 2:  # The first rounds warm up the writers
+            publish.append(published - start)
+            deliver.append(finished - start)
+
+    for channel in channels:
+        await service.unsubscribe("bench", channel)
+    await service.close()
+    return {
+        f"fanout.publish/{viewers}": statistics.median(publish),
+        f"fanout.deliver/{viewers}": statistics.median(deliver),
+    }
+
+async def bench_serialize() -> Dict[str, float]:
+    return {
+        "serialize.json": best_of(lambda: Frame(CAPTION).text, 20000),
+        "serialize.compact": best_of(lambda: encode_compact(CAPTION), 20000),
+    }
+
+async def bench_connection_manager(sockets: int) -> Dict[str, float]:
+    manager = ConnectionManager()
+    manager.active_connections["bench"] = {FakeWebSocket() for _ in range(sockets)}
+    return {
+        f"connection_manager/{sockets}": await best_of_async(lambda: manager.broadcast(CAPTION, "bench"), 20),
+    }
+
+async def bench_stt_handoff() -> Dict[str, float]:
+    """Transcript callback through to the consumer, as Deepgram's client would call it."""
+    handlers: Dict[Any, Callable] = {}
+
+    class Connection:
+        def on(self, event, handler):
+            handlers[event] = handler
+
+        async def start(self, options):
+            return True
+
+        async def send(self, data):
+            pass
+
+        async def finish(self):
+            return True
+
+    service = DeepgramSTTService("benchmark-key", interim_results=True)
+    service.deepgram = types.SimpleNamespace(
+        listen=types.SimpleNamespace(asyncwebsocket=types.SimpleNamespace(v=lambda version: Connection()))
+    )
+    session_id = await service.create_connection()
+    await service.send_audio(session_id, bytes(1000))  # Starts the stream clock
+    transcripts = service.transcripts(session_id)
+    on_transcript = handlers[LiveTranscriptionEvents.Transcript]
+    alternative = types.SimpleNamespace(transcript=CAPTION["original"], confidence=0.98)
+    result = types.SimpleNamespace(
+        channel=types.SimpleNamespace(alternatives=[alternative]),
+        is_final=False, start=1.0, duration=0.5,
+    )
+
+    async def handoff():
+        await on_transcript(None, result=result)
+        await transcripts.__anext__()
+
+    elapsed = await best_of_async(handoff, 5000)
+    await service.close_connection(session_id)
+    return {"stt.handoff": elapsed}
+
+async def bench_translation() -> Dict[str, float]:
+    service = OpenAITranslationService("benchmark-key", cache=TranslationCache(max_entries=1000))
+    context = TranslationContext(4)
+    for i in range(4):
+        context.add(f"{CAPTION['original']} {i}", f"{CAPTION['translation']} {i}")
+    await service.cache.set(service.cache.make_key(CAPTION["original"], "ko", "en", service.model), CAPTION["translation"])
+    return {
+        "translation.prompt": best_of(lambda: service._build_messages(CAPTION["original"], "ko", "en", context), 20000),
+        "translation.cache_hit": await best_of_async(
+            lambda: service.translate(CAPTION["original"], "ko", "en", context), 20000
+        ),
+    }
+
+async def bench_middleware() -> Dict[str, float]:
+    app = build_app(HTTPSSchemeMiddleware)
+    for _ in range(50):
+        await request_once(app)
+    return {"middleware.page": await best_of_async(lambda: request_once(app), 500)}
+
+async def run_all(only: Optional[str]) -> Dict[str, float]:
+    """Seconds per call for each benchmark, plus the calibration workload."""
+    suites: List[Callable[[], Awaitable[Dict[str, float]]]] = [
+        lambda: bench_fanout(10),
+        lambda: bench_fanout(1000),
+        lambda: bench_fanout(10000),
+        bench_serialize,
+        lambda: bench_connection_manager(1000),
+        bench_stt_handoff,
+        bench_translation,
+        bench_middleware,
+    ]
+    results: Dict[str, float] = {}
+    # Sampled around every suite, since machine speed drifts during the run
+    calibration = []
+    gc.disable()
+    try:
+        for suite in suites:
+            calibration.append(best_of(calibration_workload, 20))
+            for name, seconds in (await suite()).items():
+                if only is None or name.startswith(only):
+                    results[name] = seconds
+        calibration.append(best_of(calibration_workload, 20))
+    finally:
+        gc.enable()
+    results[CALIBRATION] = statistics.median(calibration)
+    return results
+
+def compare(results: Dict[str, float], baseline: Dict[str, float]) -> Dict[str, float]:
+    """Slowdown of each result against its baseline, scaled to this machine's speed."""
+    speed = 1.0
+    if baseline.get(CALIBRATION):
+        speed = results[CALIBRATION] * 1e6 / baseline[CALIBRATION]
+    return {
+        name: seconds * 1e6 / (baseline[name] * speed)
+        for name, seconds in results.items()
+        if name != CALIBRATION and baseline.get(name)
+    }
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save", action="store_true", help="Write these results as the new baseline")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if any benchmark regressed past the threshold")
+    parser.add_argument("--threshold", type=float, default=1.5, help="Allowed slowdown against the baseline (ratio)")
+    parser.add_argument("--only", help="Run benchmarks whose name starts with this")
+    args = parser.parse_args()
+
+    baseline: Dict[str, Any] = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    baseline_results: Dict[str, float] = baseline.get("results_us", {})
+
+    results = asyncio.run(run_all(args.only))
+    ratios = compare(results, baseline_results)
+    regressions = [name for name, ratio in ratios.items() if ratio > args.threshold]
+    if args.check and regressions:
+        # Confirm on a second run; one noisy repeat shouldn't fail the build
+        print(f"Slower than {args.threshold}x: {', '.join(regressions)}; running again to confirm")
+        retry = compare(asyncio.run(run_all(args.only)), baseline_results)
+        ratios = {name: min(ratio, retry.get(name, ratio)) for name, ratio in ratios.items()}
+        regressions = [name for name, ratio in ratios.items() if ratio > args.threshold]
+
+    if baseline_results.get(CALIBRATION):
+        print(f"Machine speed against baseline: {baseline_results[CALIBRATION] / (results[CALIBRATION] * 1e6):.2f}x")
+    print(f"{'benchmark':<26} {'us/call':>10} {'baseline':>10} {'ratio':>7}")
+    for name, seconds in results.items():
+        if name == CALIBRATION:
+            continue
+        if name in ratios:
+            flag = "  REGRESSED" if name in regressions else ""
+            print(f"{name:<26} {seconds * 1e6:>10.2f} {baseline_results[name]:>10.2f} {ratios[name]:>6.2f}x{flag}")
+        else:
+            print(f"{name:<26} {seconds * 1e6:>10.2f} {'-':>10} {'-':>7}")
+
+    if args.save:
+        saved = dict(baseline_results)
+        saved.update({name: round(seconds * 1e6, 3) for name, seconds in results.items()})
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump({
+                "python": platform.python_version(),
+                "machine": f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPU",
+                "results_us": dict(sorted(saved.items())),
+            }, f, indent=2)
+            f.write("\n")
+        print(f"Saved baseline to {args.baseline}")
+
+    if args.check and regressions:
+        print(f"{len(regressions)} benchmark(s) slower than {args.threshold}x baseline: {', '.join(regressions)}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Local stand-ins for the Deepgram live transcription and OpenAI chat APIs.
+
+Point the app at them with DEEPGRAM_URL=http://127.0.0.1:PORT and
+OPENAI_BASE_URL=http://127.0.0.1:PORT/v1 to exercise the whole pipeline
+without API keys or cost.
+
+The Deepgram stub treats every CHUNKS_PER_UTTERANCE audio chunks on a
+connection as one utterance. It sends an interim result after each chunk,
+if the app asked for them, and a final result stt_latency seconds after
+the utterance's last chunk. Final text ends with "#<n>.", where n is the
+utterance's index on the connection, so the load test can match
+captions to the audio that produced them. The OpenAI stub answers with
+"[<target>] <source text>" after translation_latency seconds. When
+streaming, it sends one word every token_interval seconds.
+
+Usage:
+    python -m benchmarks.stubs [--port 8400] [--stt-latency 0.3] [--translation-latency 0.4]
+"""
+from typing import Any, Dict, List
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Audio chunks per scripted utterance (MediaRecorder sends one every 250 ms)
+CHUNKS_PER_UTTERANCE = 8
+CHUNK_SECONDS = 0.25
+
+# Scripted speech, cycled through by every connection
+SCRIPT = (
+    "오늘 발표를 시작하겠습니다",
+    "먼저 지난 분기의 결과를 간단히 살펴보겠습니다",
+    "매출은 전년 대비 약 십 퍼센트 증가했습니다",
+    "질문이 있으시면 언제든지 말씀해 주세요",
+    "다음 슬라이드에서 고객 의견과 향후 계획을 설명드리겠습니다",
+    "그리고 팀 여러분께 감사드립니다",
+)
+
+# Utterance marker at the end of final transcripts
+MARKER = re.compile(r"#(\d+)\.?\s*$")
+
+def utterance_index(text: str) -> int:
+    """Utterance index from a transcript or caption, or -1 if it has none."""
+    match = MARKER.search(text)
+    return int(match.group(1)) if match else -1
+
+def deepgram_result(transcript: str, start: float, duration: float, is_final: bool) -> str:
+    """A Deepgram live "Results" message."""
+    return json.dumps({
+        "type": "Results",
+        "channel_index": [0, 1],
+        "duration": duration,
+        "start": start,
+        "is_final": is_final,
+        "speech_final": is_final,
+        "channel": {"alternatives": [{"transcript": transcript, "confidence": 0.98, "words": []}]},
+        "metadata": {
+            "request_id": str(uuid.uuid4()),
+            "model_uuid": "stub",
+            "model_info": {"name": "stub", "version": "0", "arch": "stub"},
+        },
+    }, ensure_ascii=False)
+
+def build_app(stt_latency: float = 0.3, translation_latency: float = 0.4, token_interval: float = 0.03) -> FastAPI:
+    """The stub APIs as one ASGI app.
+
+    Args:
+        stt_latency: Seconds from an utterance's last audio chunk to its final result
+        translation_latency: Seconds before the first translated token
+        token_interval: Seconds between streamed words
+    """
+    app = FastAPI()
+    app.state.connections = 0
+    app.state.completions = 0
+
+    @app.websocket("/v1/listen")
+    async def listen(websocket: WebSocket):
+        await websocket.accept()
+        app.state.connections += 1
+        interim = websocket.query_params.get("interim_results", "").lower() == "true"
+        pending: List[asyncio.Task] = []
+        chunks = 0
+
+        async def send_final(transcript: str, start: float, duration: float) -> None:
+            await asyncio.sleep(stt_latency)
+            await websocket.send_text(deepgram_result(transcript, start, duration, True))
+
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("text") is not None:
+                    if json.loads(message["text"]).get("type") == "CloseStream":
+                        break
+                    continue  # KeepAlive
+                if not message.get("bytes"):
+                    continue
+
+                index, position = divmod(chunks, CHUNKS_PER_UTTERANCE)
+                chunks += 1
+                words = SCRIPT[index % len(SCRIPT)].split()
+                start = index * CHUNKS_PER_UTTERANCE * CHUNK_SECONDS
+                if position == CHUNKS_PER_UTTERANCE - 1:
+                    duration = CHUNKS_PER_UTTERANCE * CHUNK_SECONDS
+                    pending.append(asyncio.create_task(send_final(f"{' '.join(words)} #{index}.", start, duration)))
+                    pending = [task for task in pending if not task.done()]
+                elif interim:
+                    spoken = max(1, len(words) * (position + 1) // CHUNKS_PER_UTTERANCE)
+                    duration = (position + 1) * CHUNK_SECONDS
+                    await websocket.send_text(deepgram_result(" ".join(words[:spoken]), start, duration, False))
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in pending:
+                task.cancel()
+            app.state.connections -= 1
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body: Dict[str, Any] = await request.json()
+        app.state.completions += 1
+        text = body["messages"][-1]["content"]
+        target = re.search(r"to (\S+)\.", body["messages"][0]["content"])
+        translation = f"[{target.group(1) if target else 'xx'}] {text}"
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(translation_latency)
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": body.get("model", "stub"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": translation},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            })
+
+        def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "stub"),
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }, ensure_ascii=False) + "\n\n"
+
+        async def events():
+            await asyncio.sleep(translation_latency)
+            yield chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(translation.split(" ")):
+                if i:
+                    await asyncio.sleep(token_interval)
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--stt-latency", type=float, default=0.3, help="Seconds from end of utterance to final transcript")
+    parser.add_argument("--translation-latency", type=float, default=0.4, help="Seconds before the first translated token")
+    parser.add_argument("--token-interval", type=float, default=0.03, help="Seconds between streamed words")
+    args = parser.parse_args()
+    app = build_app(args.stt_latency, args.translation_latency, args.token_interval)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
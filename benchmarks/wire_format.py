@@ -0,0 +1,99 @@
+"""Bytes on the wire per caption for each viewer wire format.
+
+Replays a synthetic caption stream (interim partials, streamed
+translations and final captions, in the proportions a live room produces
+them) through each encoding, raw and with permessage-deflate as
+negotiated by browsers (raw deflate, shared context across messages).
+
+Usage:
+    python -m benchmarks.wire_format [--segments N]
+"""
+from typing import Dict, Any, List, Callable
+import argparse
+import random
+import time
+import zlib
+
+from app.services.wire import TS_BASE, encode_json, encode_compact
+
+# Vocabulary for synthetic sentences; random picks keep deflate from
+# simply matching whole repeated captions
+SOURCE_WORDS = (
+    "오늘 발표를 시작하겠습니다 먼저 지난 분기의 결과를 간단히 살펴보겠습니다 매출은 "
+    "전년 대비 약 퍼센트 증가했습니다 질문이 있으시면 언제든지 말씀해 주세요 다음 "
+    "슬라이드에서 고객 의견과 향후 계획을 설명드리겠습니다 그리고 팀 여러분께 감사드립니다"
+).split()
+TARGET_WORDS = (
+    "today we will begin the presentation first let's briefly look at last quarter's "
+    "results revenue increased by about percent year over year if you have any questions "
+    "please feel free to ask on the next slide I will explain customer feedback and future "
+    "plans and thank the team"
+).split()
+
+def sentence(rng: random.Random, words: List[str], low: int, high: int) -> str:
+    return " ".join(rng.choice(words) for _ in range(rng.randint(low, high))) + "."
+
+def caption_stream(segments: int) -> List[Dict[str, Any]]:
+    """Messages a viewer receives for a number of spoken segments."""
+    rng = random.Random(0)
+    messages = []
+    ts = TS_BASE + 1234.5
+    for seq in range(segments):
+        original = sentence(rng, SOURCE_WORDS, 4, 9)
+        translation = sentence(rng, TARGET_WORDS, 6, 14)
+        segment_id = seq + 1
+        words = original.split()
+        for i in range(1, len(words) + 1):
+            messages.append({"type": "caption_partial", "segment_id": segment_id, "original": " ".join(words[:i])})
+        target_words = translation.split()
+        for i in range(2, len(target_words) + 1, 2):
+            messages.append({
+                "type": "caption_stream", "original": original, "translation": " ".join(target_words[:i]),
+                "language": "en", "segment_id": segment_id, "seq": seq,
+            })
+        ts += rng.uniform(1.0, 4.0)
+        messages.append({
+            "type": "caption", "ts": ts, "original": original, "translation": translation,
+            "language": "en", "segment_id": segment_id, "segment_ids": [segment_id], "seq": seq,
+        })
+    return messages
+
+def deflated_sizes(payloads: List[bytes]) -> List[int]:
+    """Sizes after permessage-deflate with context takeover."""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    sizes = []
+    for payload in payloads:
+        data = compressor.compress(payload) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        sizes.append(len(data) - 4)  # The trailing 00 00 ff ff is not sent
+    return sizes
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=200, help="Spoken segments to replay")
+    args = parser.parse_args()
+
+    messages = caption_stream(args.segments)
+    captions = sum(1 for m in messages if m["type"] == "caption")
+    formats: Dict[str, Callable[[Dict[str, Any]], bytes]] = {
+        "json": lambda m: encode_json(m).encode(),
+        "compact": encode_compact,
+    }
+
+    print(f"{len(messages)} messages, {captions} captions\n")
+    print(f"{'format':<10} {'B/caption':>10} {'B/message':>10} {'deflate B/msg':>14} {'B/segment':>10} {'deflate B/seg':>14} {'encode us':>10}")
+    for name, encode in formats.items():
+        start = time.perf_counter()
+        payloads = [encode(m) for m in messages]
+        elapsed = time.perf_counter() - start
+
+        final_sizes = [len(p) for p, m in zip(payloads, messages) if m["type"] == "caption"]
+        raw_total = sum(len(p) for p in payloads)
+        deflated_total = sum(deflated_sizes(payloads))
+        print(
+            f"{name:<10} {sum(final_sizes) / captions:>10.1f} {raw_total / len(messages):>10.1f} "
+            f"{deflated_total / len(messages):>14.1f} {raw_total / captions:>10.1f} "
+            f"{deflated_total / captions:>14.1f} {elapsed / len(messages) * 1e6:>10.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
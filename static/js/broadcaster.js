@@ -83,7 +83,12 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Create new WebSocket connection
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${wsProtocol}//${window.location.host}/ws/stream/${roomId}`;
+    let wsUrl = `${wsProtocol}//${window.location.host}/ws/stream/${roomId}`;
+    // Pass a translation engine choice from the page URL (?translation=local)
+    const translationEngine = new URLSearchParams(window.location.search).get('translation');
+    if (translationEngine) {
+      wsUrl += `?translation=${encodeURIComponent(translationEngine)}`;
+    }
     websocket = new WebSocket(wsUrl);
 
     // WebSocket event handlers
@@ -143,6 +148,11 @@ document.addEventListener('DOMContentLoaded', () => {
         appendTranscript(transcriptTranslated, message.translation);
         break;
         
+      case 'caption_partial':
+      case 'caption_stream':
+        // Interim text and in-progress translations are only shown to viewers
+        break;
+        
       case 'viewer_count':
         viewerCount = message.count;
         viewerCountElement.textContent = viewerCount;
@@ -6,6 +6,8 @@ document.addEventListener('DOMContentLoaded', () => {
   const captionsTranslated = document.querySelector('#captions-translated .captions-content');
   const autoScrollButton = document.getElementById('auto-scroll');
   const clearCaptionsButton = document.getElementById('clear-captions');
+  const languageSelect = document.getElementById('language-select');
+  const translatedHeading = document.getElementById('translated-heading');
   const roomId = document.querySelector('meta[name="room-id"]').getAttribute('content');
 
   // Get the parent elements that have scrollbars
@@ -20,6 +22,12 @@ document.addEventListener('DOMContentLoaded', () => {
   const reconnectDelay = 1000;
   const captionHistory = [];
   const maxCaptionHistory = 100;
+  const partialCaptions = new Map(); // segment_id -> interim caption element
+  const streamingTranslations = new Map(); // segment_id -> in-progress translation element
+  let tsBase = 0; // Base for compact-format timestamps, sent on connect
+  let lastSeq = -1; // Sequence number of the last caption received; -1 asks for recent history
+  let sendReceipts = false; // Set when the server asks this viewer to report displayed captions
+  let targetLanguage = localStorage.getItem('unbabel-language') || languageSelect.value;
   
   // Set up MutationObserver to detect when new content is added
   const observerOptions = {
@@ -72,10 +80,13 @@ document.addEventListener('DOMContentLoaded', () => {
 
     // Create new WebSocket connection
     const wsProtocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
-    const wsUrl = `${wsProtocol}//${window.location.host}/ws/view/${roomId}`;
+    const wsUrl = `${wsProtocol}//${window.location.host}/ws/view/${roomId}?language=${encodeURIComponent(targetLanguage)}&since=${lastSeq}&receipts=1`;
     
     console.log(`Connecting to WebSocket at ${wsUrl}`);
-    websocket = new WebSocket(wsUrl);
+    // Offer the compact binary format when its decoder is loaded; the server picks
+    const subprotocols = window.UnbabelWire ? [window.UnbabelWire.SUBPROTOCOL, 'unbabel.json'] : [];
+    websocket = new WebSocket(wsUrl, subprotocols);
+    websocket.binaryType = 'arraybuffer';
 
     // WebSocket event handlers
     websocket.onopen = () => {
@@ -130,14 +141,22 @@ document.addEventListener('DOMContentLoaded', () => {
           return;
         }
         
+        // Timed ping: echo the server's time with ours so it can estimate clock offset
+        if (typeof event.data === 'string' && event.data.startsWith('ping ')) {
+          sendTimedPong(event.data.slice(5));
+          return;
+        }
+        
         // Handle pong message
         if (event.data === 'pong') {
           console.log('Received pong');
           return;
         }
         
-        // Handle normal messages
-        const message = JSON.parse(event.data);
+        // Handle normal messages; binary frames use the compact format
+        const message = typeof event.data === 'string'
+          ? JSON.parse(event.data)
+          : window.UnbabelWire.decode(event.data, tsBase);
         handleMessage(message);
       } catch (error) {
         console.error('Error handling message:', error, event.data);
@@ -150,8 +169,8 @@ document.addEventListener('DOMContentLoaded', () => {
     clearPingInterval(); // Clear any existing interval
     
     pingInterval = setInterval(() => {
-      // Check if connection is still alive
-      if (Date.now() - lastPongTime > pongTimeoutTime) {
+      // Check if connection is still alive (the server pings every interval too)
+      if (Date.now() - lastPongTime > pingIntervalTime + pongTimeoutTime) {
         console.warn('No pong received in time, reconnecting...');
         if (websocket) websocket.close();
         return;
@@ -173,16 +192,42 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
-  // Handle incoming messages
-  function handleMessage(message) {
+  // Answer a timed ping with the server's time and ours
+  function sendTimedPong(serverTime) {
+    if (websocket && websocket.readyState === WebSocket.OPEN) {
+      websocket.send(`pong ${serverTime} ${Date.now()}`);
+    }
+  }
+  
+  // Tell the server when a live caption was shown, for glass-to-glass latency
+  function sendReceipt(caption) {
+    if (sendReceipts && caption.trace && caption.trace.length && websocket && websocket.readyState === WebSocket.OPEN) {
+      websocket.send(JSON.stringify({ type: 'receipt', seq: caption.seq, t0: caption.trace[0], shown: Date.now() }));
+    }
+  }
+
+  // Handle incoming messages; captions replayed from history are not live
+  function handleMessage(message, live = true) {
     console.log('Received message:', message);
 
     switch (message.type) {
       case 'connection_established':
+        if (message.ts_base !== undefined) {
+          tsBase = message.ts_base;
+        }
+        sendReceipts = message.receipts === true;
+        if (sendReceipts && message.server_time !== undefined) {
+          sendTimedPong(message.server_time);
+        }
         updateStatus('connected', 'Connected');
         break;
         
       case 'caption':
+        // Remember where to resume from if the connection drops
+        if (typeof message.seq === 'number') {
+          lastSeq = message.seq;
+        }
+        
         // Add caption to history
         captionHistory.push(message);
         if (captionHistory.length > maxCaptionHistory) {
@@ -191,6 +236,26 @@ document.addEventListener('DOMContentLoaded', () => {
         
         // Display caption
         displayCaption(message);
+        if (live) {
+          sendReceipt(message);
+        }
+        break;
+        
+      case 'caption_history':
+        // Captions missed while disconnected, oldest first
+        message.captions.forEach((caption) => handleMessage(caption, false));
+        break;
+        
+      case 'caption_partial':
+        displayPartialCaption(message);
+        break;
+        
+      case 'caption_stream':
+        displayStreamingTranslation(message);
+        break;
+        
+      case 'language_set':
+        updateLanguageLabel(message.language);
         break;
         
       case 'error':
@@ -200,6 +265,21 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
 
+  // Show the current target language in the translation heading
+  function updateLanguageLabel(language) {
+    const option = Array.from(languageSelect.options).find(o => o.value === language);
+    translatedHeading.textContent = `Translated (${option ? option.textContent : language})`;
+  }
+
+  // Ask the server for captions in another language
+  function changeLanguage() {
+    targetLanguage = languageSelect.value;
+    localStorage.setItem('unbabel-language', targetLanguage);
+    if (websocket && websocket.readyState === WebSocket.OPEN) {
+      websocket.send(JSON.stringify({ type: 'set_language', language: targetLanguage }));
+    }
+  }
+
   // Update connection status
   function updateStatus(state, text) {
     statusLight.className = 'status-light ' + state;
@@ -208,13 +288,37 @@ document.addEventListener('DOMContentLoaded', () => {
 
   // Display caption
   function displayCaption(caption) {
-    // Create caption elements
-    const originalDiv = createCaptionElement(caption.original, caption.ts);
-    const translatedDiv = createCaptionElement(caption.translation, caption.ts);
+    // Finalize the interim elements for the merged segments; keep the first one
+    let partialDiv = null;
+    const segmentIds = (caption.segment_ids && caption.segment_ids.length) ? caption.segment_ids : [caption.segment_id];
+    segmentIds.forEach((segmentId) => {
+      const div = partialCaptions.get(segmentId);
+      partialCaptions.delete(segmentId);
+      if (!div) return;
+      if (partialDiv) {
+        div.remove();
+      } else {
+        partialDiv = div;
+      }
+    });
     
-    // Add to containers
-    captionsOriginal.appendChild(originalDiv);
-    captionsTranslated.appendChild(translatedDiv);
+    // Confirm the streamed translation for this segment if one is showing
+    const streamingDiv = streamingTranslations.get(caption.segment_id);
+    streamingTranslations.delete(caption.segment_id);
+    
+    // Create caption elements
+    if (streamingDiv) {
+      streamingDiv.classList.remove('partial');
+      streamingDiv.querySelector('.caption-text').textContent = caption.translation;
+    } else {
+      captionsTranslated.appendChild(createCaptionElement(caption.translation, caption.ts));
+    }
+    if (partialDiv) {
+      partialDiv.classList.remove('partial');
+      partialDiv.querySelector('.caption-text').textContent = caption.original;
+    } else {
+      captionsOriginal.appendChild(createCaptionElement(caption.original, caption.ts));
+    }
     
     // Auto-scroll if enabled
     if (autoScroll) {
@@ -222,6 +326,48 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   }
   
+  // Display or revise an interim caption in place
+  function displayPartialCaption(caption) {
+    let partialDiv = partialCaptions.get(caption.segment_id);
+    
+    // An empty interim means the segment was dropped
+    if (!caption.original) {
+      if (partialDiv) partialDiv.remove();
+      partialCaptions.delete(caption.segment_id);
+      return;
+    }
+    
+    if (partialDiv) {
+      partialDiv.querySelector('.caption-text').textContent = caption.original;
+    } else {
+      partialDiv = createCaptionElement(caption.original, caption.ts);
+      partialDiv.classList.add('partial');
+      partialCaptions.set(caption.segment_id, partialDiv);
+      captionsOriginal.appendChild(partialDiv);
+    }
+    
+    if (autoScroll) {
+      scrollCaptionsToBottom();
+    }
+  }
+  
+  // Render a translation while it is still being generated
+  function displayStreamingTranslation(caption) {
+    let streamingDiv = streamingTranslations.get(caption.segment_id);
+    if (streamingDiv) {
+      streamingDiv.querySelector('.caption-text').textContent = caption.translation;
+    } else {
+      streamingDiv = createCaptionElement(caption.translation, caption.ts);
+      streamingDiv.classList.add('partial');
+      streamingTranslations.set(caption.segment_id, streamingDiv);
+      captionsTranslated.appendChild(streamingDiv);
+    }
+    
+    if (autoScroll) {
+      scrollCaptionsToBottom();
+    }
+  }
+  
   // Dedicated function to handle scrolling
   function scrollCaptionsToBottom() {
     // Try multiple approaches to ensure scrolling works
@@ -301,6 +447,8 @@ document.addEventListener('DOMContentLoaded', () => {
     captionsOriginal.innerHTML = '';
     captionsTranslated.innerHTML = '';
     captionHistory.length = 0;
+    partialCaptions.clear();
+    streamingTranslations.clear();
   }
 
   // Toggle view function for mobile
@@ -334,6 +482,9 @@ document.addEventListener('DOMContentLoaded', () => {
   autoScrollButton.addEventListener('click', toggleAutoScroll);
   clearCaptionsButton.addEventListener('click', clearCaptions);
   document.getElementById('toggle-view').addEventListener('click', toggleView);
+  languageSelect.addEventListener('change', changeLanguage);
+  languageSelect.value = targetLanguage;
+  updateLanguageLabel(targetLanguage);
 
   // Initialize WebSocket connection
   setupWebSocket();
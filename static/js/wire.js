@@ -0,0 +1,98 @@
+// Decoder for the compact binary caption format (MessagePack with integer tags).
+// Tag tables must match app/services/wire.py.
+(function () {
+  const SUBPROTOCOL = 'unbabel.msgpack';
+
+  const TYPES = ['', 'caption', 'caption_partial', 'caption_stream', 'caption_history',
+    'connection_established', 'language_set', 'error'];
+  const FIELDS = ['type', 'ts', 'original', 'translation', 'language', 'segment_id',
+    'segment_ids', 'seq', 'since', 'captions', 'truncated', 'room_id', 'message',
+    'format', 'ts_base', 'trace', 'receipts', 'server_time'];
+
+  const textDecoder = new TextDecoder();
+
+  // Minimal MessagePack reader covering the types the server emits
+  function unpack(view, bytes) {
+    let offset = 0;
+
+    function str(length) {
+      const value = textDecoder.decode(bytes.subarray(offset, offset + length));
+      offset += length;
+      return value;
+    }
+
+    function array(length) {
+      const value = new Array(length);
+      for (let i = 0; i < length; i++) value[i] = read();
+      return value;
+    }
+
+    function map(length) {
+      const value = new Map();
+      for (let i = 0; i < length; i++) {
+        const key = read();
+        value.set(key, read());
+      }
+      return value;
+    }
+
+    function read() {
+      const byte = view.getUint8(offset++);
+      let value;
+      if (byte <= 0x7f) return byte;
+      if (byte >= 0xe0) return byte - 0x100;
+      if ((byte & 0xe0) === 0xa0) return str(byte & 0x1f);
+      if ((byte & 0xf0) === 0x90) return array(byte & 0x0f);
+      if ((byte & 0xf0) === 0x80) return map(byte & 0x0f);
+      switch (byte) {
+        case 0xc0: return null;
+        case 0xc2: return false;
+        case 0xc3: return true;
+        case 0xca: value = view.getFloat32(offset); offset += 4; return value;
+        case 0xcb: value = view.getFloat64(offset); offset += 8; return value;
+        case 0xcc: return view.getUint8(offset++);
+        case 0xcd: value = view.getUint16(offset); offset += 2; return value;
+        case 0xce: value = view.getUint32(offset); offset += 4; return value;
+        case 0xcf: value = Number(view.getBigUint64(offset)); offset += 8; return value;
+        case 0xd0: return view.getInt8(offset++);
+        case 0xd1: value = view.getInt16(offset); offset += 2; return value;
+        case 0xd2: value = view.getInt32(offset); offset += 4; return value;
+        case 0xd3: value = Number(view.getBigInt64(offset)); offset += 8; return value;
+        case 0xd9: return str(view.getUint8(offset++));
+        case 0xda: value = view.getUint16(offset); offset += 2; return str(value);
+        case 0xdb: value = view.getUint32(offset); offset += 4; return str(value);
+        case 0xdc: value = view.getUint16(offset); offset += 2; return array(value);
+        case 0xdd: value = view.getUint32(offset); offset += 4; return array(value);
+        case 0xde: value = view.getUint16(offset); offset += 2; return map(value);
+        case 0xdf: value = view.getUint32(offset); offset += 4; return map(value);
+      }
+      throw new Error(`Unsupported MessagePack type 0x${byte.toString(16)}`);
+    }
+
+    return read();
+  }
+
+  // Turn a tagged map back into the message shape the JSON format uses
+  function expand(fields, tsBase) {
+    const message = {};
+    fields.forEach((value, key) => {
+      const name = typeof key === 'number' ? FIELDS[key] : key;
+      if (name === 'type' && typeof value === 'number') {
+        value = TYPES[value];
+      } else if (name === 'ts' && typeof value === 'number') {
+        value = tsBase + value / 1000;
+      } else if (name === 'captions') {
+        value = value.map((caption) => expand(caption, tsBase));
+      }
+      message[name] = value;
+    });
+    return message;
+  }
+
+  // tsBase comes from the connection_established message
+  function decode(buffer, tsBase) {
+    return expand(unpack(new DataView(buffer), new Uint8Array(buffer)), tsBase || 0);
+  }
+
+  window.UnbabelWire = { SUBPROTOCOL, decode };
+})();
@@ -0,0 +1,157 @@
+import asyncio
+import json
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from app.services.broadcast import BroadcastService, SLOW_POLICY_DISCONNECT
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+class FakeWebSocket:
+    """Records the frames sent to it; blocks sends while `paused` is clear."""
+
+    def __init__(self):
+        self.client_state = WebSocketState.CONNECTED
+        self.sent = []
+        self.closed_with = None
+        self.paused = asyncio.Event()
+        self.paused.set()
+
+    async def send_text(self, text):
+        await self.paused.wait()
+        self.sent.append(json.loads(text))
+
+    async def close(self, code=1000):
+        self.closed_with = code
+        self.client_state = WebSocketState.DISCONNECTED
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def caption(seq, language="en"):
+    return {"type": "caption", "seq": seq, "language": language, "translation": f"{language}{seq}"}
+
+async def test_every_viewer_gets_its_language_in_order():
+    service = BroadcastService(max_queue=16)
+    english = [FakeWebSocket() for _ in range(20)]
+    french = FakeWebSocket()
+    channels = [await service.subscribe("room1", ws, "en") for ws in english]
+    channels.append(await service.subscribe("room1", french, "fr"))
+    await settle()
+
+    for seq in range(5):
+        await service.broadcast_to_room("room1", caption(seq), "en")
+        await service.broadcast_to_room("room1", caption(seq, "fr"), "fr")
+    await service.broadcast_to_room("room1", {"type": "caption_partial", "original": "x"})
+    await settle()
+
+    for ws in english:
+        assert [m.get("seq") for m in ws.sent] == [0, 1, 2, 3, 4, None]
+        assert ws.sent[-1]["type"] == "caption_partial"
+    assert [m.get("translation") for m in french.sent] == ["fr0", "fr1", "fr2", "fr3", "fr4", None]
+
+    for channel in channels:
+        await service.unsubscribe("room1", channel)
+    assert service.rooms == {}
+    await service.close()
+
+async def test_cancelled_writer_leaves_the_others_waiting():
+    service = BroadcastService(max_queue=16)
+    first, second = FakeWebSocket(), FakeWebSocket()
+    leaving = await service.subscribe("room1", first, "en")
+    staying = await service.subscribe("room1", second, "en")
+    await settle()
+
+    await service.unsubscribe("room1", leaving)
+    await service.broadcast_to_room("room1", caption(0), "en")
+    await settle()
+    assert first.sent == []
+    assert [m["seq"] for m in second.sent] == [0]
+    await service.unsubscribe("room1", staying)
+    await service.close()
+
+async def test_slow_viewer_coalesces_without_holding_up_others():
+    service = BroadcastService(max_queue=4)
+    slow, fast = FakeWebSocket(), FakeWebSocket()
+    slow_channel = await service.subscribe("room1", slow, "en")
+    fast_channel = await service.subscribe("room1", fast, "en")
+    await settle()
+
+    slow.paused.clear()
+    await service.broadcast_to_room("room1", caption(0), "en")
+    await settle()  # The slow writer is now stuck sending seq 0
+    for seq in range(1, 10):
+        await service.broadcast_to_room("room1", caption(seq), "en")
+        await settle()
+    assert [m["seq"] for m in fast.sent] == list(range(10))
+
+    slow.paused.set()
+    await settle()
+    # It skips to the newest frame instead of replaying the backlog
+    assert [m["seq"] for m in slow.sent] == [0, 9]
+    assert slow_channel.coalesced == 8
+    for channel in (slow_channel, fast_channel):
+        await service.unsubscribe("room1", channel)
+    await service.close()
+
+async def test_slow_viewer_is_disconnected_under_the_disconnect_policy():
+    service = BroadcastService(max_queue=2, slow_policy=SLOW_POLICY_DISCONNECT)
+    slow = FakeWebSocket()
+    channel = await service.subscribe("room1", slow, "en")
+    await settle()
+
+    slow.paused.clear()
+    for seq in range(5):
+        await service.broadcast_to_room("room1", caption(seq), "en")
+        await settle()
+    slow.paused.set()
+    await settle()
+    assert slow.closed_with == 1008
+    await service.unsubscribe("room1", channel)
+    await service.close()
+
+async def test_pull_subscriber_resumes_from_history():
+    service = BroadcastService(max_queue=16)
+    watcher = await service.subscribe("room1", FakeWebSocket(), "en")  # Keeps the room's history
+    for seq in range(3):
+        await service.broadcast_to_room("room1", caption(seq), "en")
+
+    channel = await service.subscribe("room1", None, "en", since=0)
+    frames = channel.frames()
+    backlog = await anext(frames)
+    assert [m["seq"] for m in backlog.message["captions"]] == [1, 2]
+
+    await service.broadcast_to_room("room1", caption(3), "en")
+    live = await asyncio.wait_for(anext(frames), 1.0)
+    assert live.message["seq"] == 3
+    assert await asyncio.wait_for(anext(channel.frames(idle_timeout=0.01)), 1.0) is None
+
+    await frames.aclose()
+    for subscriber in (channel, watcher):
+        await service.unsubscribe("room1", subscriber)
+    await service.close()
+
+async def test_active_languages_follow_viewers_changing_language():
+    service = BroadcastService(max_queue=16)
+    english, french = FakeWebSocket(), FakeWebSocket()
+    english_channel = await service.subscribe("room1", english, "en")
+    french_channel = await service.subscribe("room1", french, "fr")
+    assert sorted(await service.active_languages("room1")) == ["en", "fr"]
+
+    # Moving the only French viewer to English drops French from the room
+    moved = await service.set_language("room1", french_channel, "en")
+    assert await service.active_languages("room1") == ["en"]
+    await service.broadcast_to_room("room1", caption(0), "en")
+    await settle()
+    assert [m["seq"] for m in french.sent] == [0]
+
+    for channel in (english_channel, moved):
+        await service.unsubscribe("room1", channel)
+    assert await service.active_languages("room1") == []
+    await service.close()
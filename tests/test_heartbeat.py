@@ -0,0 +1,81 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketState
+
+from app.services.heartbeat import CLOSE_CODE_PING_TIMEOUT, HeartbeatManager
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+class FakeWebSocket:
+    """Records pings; answers each one through `on_ping` if set."""
+
+    def __init__(self, on_ping=None):
+        self.client_state = WebSocketState.CONNECTED
+        self.pings = []
+        self.closed_with = None
+        self.on_ping = on_ping
+
+    async def send_text(self, text):
+        self.pings.append(text)
+        if self.on_ping is not None:
+            self.on_ping()
+
+    async def close(self, code=1000):
+        self.closed_with = code
+        self.client_state = WebSocketState.DISCONNECTED
+
+def manager():
+    return HeartbeatManager(interval=0.4, timeout=0.2, tick=0.02)
+
+async def test_answering_viewers_are_pinged_every_interval():
+    heartbeats = manager()
+    websocket = FakeWebSocket()
+    heartbeat = heartbeats.register(websocket)
+    websocket.on_ping = lambda: heartbeats.touch(heartbeat)
+    try:
+        await asyncio.sleep(1.4)
+        assert websocket.pings == ["ping"] * 3
+        assert websocket.closed_with is None
+        assert len(heartbeats) == 1
+    finally:
+        await heartbeats.close()
+
+async def test_silent_viewers_are_closed_after_the_timeout():
+    heartbeats = manager()
+    websocket = FakeWebSocket()
+    heartbeats.register(websocket)
+    try:
+        await asyncio.sleep(0.5)
+        assert websocket.pings == ["ping"] and websocket.closed_with is None
+        await asyncio.sleep(0.3)
+        assert websocket.closed_with == CLOSE_CODE_PING_TIMEOUT
+        assert len(heartbeats) == 0
+    finally:
+        await heartbeats.close()
+
+async def test_unregistered_viewers_are_not_pinged():
+    heartbeats = manager()
+    websocket = FakeWebSocket()
+    heartbeats.unregister(heartbeats.register(websocket))
+    try:
+        await asyncio.sleep(0.6)
+        assert websocket.pings == [] and len(heartbeats) == 0
+    finally:
+        await heartbeats.close()
+
+async def test_timed_pings_carry_the_server_clock():
+    heartbeats = manager()
+    websocket = FakeWebSocket()
+    heartbeats.register(websocket, timed=True)
+    try:
+        await asyncio.sleep(0.5)
+        assert len(websocket.pings) == 1
+        word, server_ms = websocket.pings[0].split()
+        assert word == "ping" and server_ms.isdigit()
+    finally:
+        await heartbeats.close()
@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+from app.services.journal import TranscriptJournal, safe_room_dir
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+def test_room_dirs_are_distinct_and_contained():
+    names = {safe_room_dir(room_id) for room_id in ("a.b", "a_b", "a/b", "x" * 200, "x" * 200 + "y")}
+    assert len(names) == 5
+    for name in names:
+        assert os.sep not in name and not name.startswith(".")
+
+async def test_records_skip_damaged_lines(tmp_path, caplog):
+    journal = TranscriptJournal(str(tmp_path))
+    journal.append("room.1", {"seq": 0, "original": "first"})
+    journal.append("room_1", {"seq": 0, "original": "other room"})
+    await journal.close()
+
+    [path] = journal.segment_files("room.1")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"seq": 1, "orig\n{"seq": 2, "original": "third"}\n')
+
+    records = [record async for record in journal.records("room.1")]
+    assert [record["seq"] for record in records] == [0, 2]
+    assert "Skipped 1 undecodable records" in caplog.text
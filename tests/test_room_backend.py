@@ -0,0 +1,142 @@
+import asyncio
+import json
+import time
+
+import fakeredis
+import pytest
+
+from app.services.room_backend import RoomBackend, RedisRoomBackend
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+def redis_backend(server, **kwargs):
+    return RedisRoomBackend(client=fakeredis.aioredis.FakeRedis(server=server), **kwargs)
+
+async def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        await asyncio.sleep(0.01)
+
+async def test_memory_registry_unregisters_only_its_own_broadcast():
+    backend = RoomBackend()
+    await backend.register_room("room1", {"language": "ko-KR", "owner": "a"})
+    assert await backend.room_exists("room1")
+
+    # A reconnected broadcaster re-registered the room; the old teardown leaves it
+    await backend.register_room("room1", {"language": "ko-KR", "owner": "b"})
+    await backend.unregister_room("room1", "a")
+    assert await backend.room_exists("room1")
+
+    await backend.unregister_room("room1", "b")
+    assert not await backend.room_exists("room1")
+    assert await backend.list_rooms() == {}
+
+async def test_redis_registry_is_shared_and_unregistered(server):
+    first, second = redis_backend(server), redis_backend(server)
+    await first.register_room("room1", {"language": "ko-KR", "owner": "a"})
+
+    assert await second.room_exists("room1")
+    rooms = await second.list_rooms()
+    assert rooms["room1"]["language"] == "ko-KR"
+
+    await second.register_room("room1", {"language": "ko-KR", "owner": "b"})
+    await first.unregister_room("room1", "a")
+    assert await first.room_exists("room1")
+
+    await second.unregister_room("room1", "b")
+    assert not await first.room_exists("room1")
+    assert await first.list_rooms() == {}
+
+async def test_redis_registry_drops_rooms_of_dead_workers(server):
+    backend = redis_backend(server, refresh_interval=1.0)
+    client = fakeredis.aioredis.FakeRedis(server=server)
+    # Registered by a worker that stopped refreshing it
+    stale = {"language": "ko-KR", "owner": "gone", "updated": time.time() - 60}
+    await client.hset(RedisRoomBackend.ROOMS_KEY, "room1", json.dumps(stale))
+
+    assert not await backend.room_exists("room1")
+    assert await backend.list_rooms() == {}
+    assert not await client.hexists(RedisRoomBackend.ROOMS_KEY, "room1")
+
+async def test_redis_refresh_keeps_live_rooms(server):
+    backend = redis_backend(server, refresh_interval=0.05)
+    await backend.start(lambda *args: None)
+    try:
+        await backend.register_room("room1", {"language": "ko-KR", "owner": "a"})
+        await asyncio.sleep(0.3)  # Several stale periods
+        assert await backend.room_exists("room1")
+    finally:
+        await backend.close()
+    # Closing a worker removes the rooms it was broadcasting
+    assert not await redis_backend(server).room_exists("room1")
+
+async def test_redis_fans_out_across_workers(server):
+    received = []
+    publisher, subscriber = redis_backend(server), redis_backend(server)
+    await publisher.start(lambda *args: None)
+    await subscriber.start(lambda room_id, language, message, text: received.append((room_id, language, message)))
+    try:
+        await subscriber.subscribe("room1")
+        await asyncio.sleep(0.05)
+        message = {"type": "caption", "translation": "hello"}
+        await publisher.publish("room1", "en", message, json.dumps(message))
+        await publisher.publish("room2", None, message, json.dumps(message))
+        await wait_for(lambda: received)
+        await asyncio.sleep(0.05)
+        assert received == [("room1", "en", message)]
+
+        await subscriber.unsubscribe("room1")
+        await asyncio.sleep(0.05)
+        await publisher.publish("room1", "en", message, json.dumps(message))
+        await asyncio.sleep(0.1)
+        assert len(received) == 1
+    finally:
+        await publisher.close()
+        await subscriber.close()
+
+async def test_redis_language_counts_sum_workers(server):
+    first, second = redis_backend(server), redis_backend(server)
+    await first.start(lambda *args: None)
+    await second.start(lambda *args: None)
+    try:
+        await first.set_languages("room1", {"en": 2, "fr": 1})
+        await second.set_languages("room1", {"en": 3})
+        assert await first.language_counts("room1") == {"en": 5, "fr": 1}
+
+        await second.set_languages("room1", {})
+        assert await first.language_counts("room1") == {"en": 2, "fr": 1}
+    finally:
+        await first.close()
+    # A closed worker's viewers stop counting
+    assert await second.language_counts("room1") == {}
+    await second.close()
+
+async def test_caption_seq_high_water_mark():
+    backend = RoomBackend()
+    assert await backend.next_caption_seq("room1") == 0
+    for seq in (0, 1):
+        message = {"type": "caption", "seq": seq}
+        await backend.publish("room1", "en", message, json.dumps(message))
+    assert await backend.next_caption_seq("room1") == 2
+
+async def test_redis_caption_seq_is_shared_and_never_goes_back(server):
+    first, second = redis_backend(server), redis_backend(server)
+    for seq in (4, 2):
+        message = {"type": "caption", "seq": seq}
+        await first.publish("room1", "en", message, json.dumps(message))
+    partial = {"type": "caption_stream", "seq": 9}
+    await first.publish("room1", "en", partial, json.dumps(partial))
+
+    # A broadcaster reconnecting to another worker continues after seq 4
+    assert await second.next_caption_seq("room1") == 5
+    assert await second.next_caption_seq("room2") == 0
@@ -0,0 +1,29 @@
+import asyncio
+
+import pytest
+
+from app.services.scheduler import TranslationScheduler
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+async def test_drain_waits_for_every_segment_in_order():
+    delivered = []
+
+    async def translate(segment):
+        # Later segments finish first and wait in the reorder buffer
+        await asyncio.sleep(0.05 * (3 - segment["seq"]))
+        return [segment["text"]]
+
+    scheduler = TranslationScheduler(translate, lambda segment, captions: delivered.extend(captions), max_in_flight=3)
+    scheduler.start()
+    await scheduler.drain()  # Nothing submitted yet
+
+    for text in ("a", "b", "c"):
+        scheduler.submit({"text": text})
+    await asyncio.wait_for(scheduler.drain(), timeout=1.0)
+    assert delivered == ["a", "b", "c"]
+    await scheduler.close()
@@ -0,0 +1,45 @@
+import pytest
+
+from app.services.segmenter import Segmenter
+
+def fragment(text, segment_id=None, **times):
+    return {"text": text, "segment_id": segment_id, **times}
+
+def test_fragments_merge_until_a_sentence_ends():
+    segmenter = Segmenter(max_delay=5.0)
+    assert segmenter.add(fragment("so what", 1, audio_end=10.0, stt_at=10.2), 0.0) is None
+    assert segmenter.add(fragment("we found ", 2, audio_end=11.0, stt_at=11.2), 0.1) is None
+    segment = segmenter.add(fragment("was this.", 3), 0.2)
+
+    assert segment["text"] == "so what we found was this."
+    assert segment["segment_ids"] == [1, 2, 3] and segment["segment_id"] == 3
+    # Timed from the first fragment, where the sentence's audio started
+    assert segment["audio_end"] == 10.0 and segment["stt_at"] == 10.2
+    assert segmenter.time_until_flush(0.3) is None
+
+def test_closing_quotes_and_cjk_punctuation_end_a_sentence():
+    segmenter = Segmenter(max_delay=5.0)
+    for text in ('He said "stop!"', "안녕하세요。", "(really?)"):
+        assert segmenter.add(fragment(text), 0.0)["text"] == text
+    assert segmenter.add(fragment("e.g"), 0.0) is None
+
+def test_long_text_flushes_at_max_chars():
+    segmenter = Segmenter(max_delay=5.0, max_chars=12)
+    assert segmenter.add(fragment("hello"), 0.0) is None
+    # "hello world" is 11 characters with the joining space
+    assert segmenter.add(fragment("world"), 0.0) is None
+    assert segmenter.add(fragment("again"), 0.0)["text"] == "hello world again"
+
+def test_held_fragments_flush_at_the_latency_budget():
+    segmenter = Segmenter(max_delay=0.8)
+    assert segmenter.add(fragment("first"), 1.0) is None
+    assert segmenter.time_until_flush(1.5) == pytest.approx(0.3)
+    # The deadline runs from the first held fragment, not the latest
+    assert segmenter.add(fragment("second"), 1.8)["text"] == "first second"
+
+def test_flush_returns_held_fragments_once():
+    segmenter = Segmenter()
+    assert segmenter.flush() is None
+    segmenter.add(fragment("unfinished"), 0.0)
+    assert segmenter.flush()["text"] == "unfinished"
+    assert segmenter.flush() is None
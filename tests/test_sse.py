@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.routes.sse import sse_view
+from app.services.broadcast import BroadcastService
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+def request(last_event_id=None):
+    headers = [] if last_event_id is None else [(b"last-event-id", str(last_event_id).encode())]
+    return Request({"type": "http", "method": "GET", "path": "/sse/view/room1", "query_string": b"", "headers": headers})
+
+def parse(chunk):
+    """(event, id, data) of one SSE record."""
+    fields = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n") if not line.startswith("retry"))
+    return fields["event"], fields.get("id"), json.loads(fields["data"])
+
+async def open_stream(service, last_event_id=None, since=None):
+    response = await sse_view(request(last_event_id), "room1", "en", since, broadcast_service=service)
+    events = response.body_iterator
+    assert parse(await anext(events))[0] == "connection_established"
+    return events
+
+async def test_resume_from_last_event_id():
+    service = BroadcastService()
+    await service.backend.register_room("room1", {"owner": "a"})
+    # A live viewer keeps the room's history on this worker
+    first = await open_stream(service)
+    for seq in range(3):
+        await service.broadcast_to_room("room1", {"type": "caption", "seq": seq, "translation": f"t{seq}"}, "en")
+    assert [parse(await anext(first))[1] for _ in range(3)] == ["0", "1", "2"]
+
+    # The browser reconnects with the last ID it saw
+    resumed = await open_stream(service, last_event_id=0)
+    event, event_id, data = parse(await anext(resumed))
+    assert event == "caption_history" and event_id == "2"
+    assert [caption["seq"] for caption in data["captions"]] == [1, 2]
+
+    await service.broadcast_to_room("room1", {"type": "caption", "seq": 3, "translation": "t3"}, "en")
+    assert parse(await asyncio.wait_for(anext(resumed), 1.0))[1] == "3"
+
+    for events in (first, resumed):
+        await events.aclose()
+    assert service.rooms == {}
+    await service.close()
+
+async def test_last_event_id_takes_precedence_over_since():
+    service = BroadcastService()
+    await service.backend.register_room("room1", {"owner": "a"})
+    first = await open_stream(service)
+    for seq in range(3):
+        await service.broadcast_to_room("room1", {"type": "caption", "seq": seq, "translation": f"t{seq}"}, "en")
+
+    resumed = await open_stream(service, last_event_id=1, since="0")
+    _, _, data = parse(await anext(resumed))
+    assert [caption["seq"] for caption in data["captions"]] == [2]
+
+    for events in (first, resumed):
+        await events.aclose()
+    await service.close()
+
+async def test_unknown_rooms_are_not_found():
+    with pytest.raises(HTTPException) as error:
+        await sse_view(request(), "missing", "en", None, broadcast_service=BroadcastService())
+    assert error.value.status_code == 404
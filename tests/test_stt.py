@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+
+from app.services.stt import STTSession
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+class StalledSession(STTSession):
+    """A session whose provider accepts nothing until released."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.release = asyncio.Event()
+        self.sent = []
+
+    async def _send(self, audio_data):
+        await self.release.wait()
+        self.sent.append(audio_data)
+
+async def test_full_buffer_drops_new_chunks_and_keeps_the_header():
+    session = StalledSession("session", max_buffered_chunks=3)
+    session.start()
+    chunks = [b"header"] + [b"chunk%d" % i for i in range(6)]
+    accepted = [session.send_audio(chunk) for chunk in chunks]
+    await asyncio.sleep(0)
+
+    assert accepted == [True, True, True, False, False, False, False]
+    assert session.dropped_chunks == 4
+
+    session.release.set()
+    await session.close()
+    assert session.sent == chunks[:3]
@@ -0,0 +1,82 @@
+import sqlite3
+import types
+import unicodedata
+
+import pytest
+
+from app.services import translation_cache
+from app.services.translation_cache import TranslationCache
+
+pytestmark = pytest.mark.anyio
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall clock the cache sees, moved by hand."""
+    now = [1000.0]
+    monkeypatch.setattr(translation_cache, "time", types.SimpleNamespace(time=lambda: now[0]))
+    return now
+
+def test_keys_ignore_whitespace_and_unicode_normalization():
+    composed = TranslationCache.make_key("안녕  하세요 ", "ko", "en", "gpt-4o")
+    decomposed = TranslationCache.make_key(unicodedata.normalize("NFD", "안녕 하세요"), "ko", "en", "gpt-4o")
+    assert composed == decomposed
+    assert composed != TranslationCache.make_key("안녕 하세요", "ko", "fr", "gpt-4o")
+    assert composed != TranslationCache.make_key("안녕 하세요", "ko", "en", "local")
+
+async def test_least_recently_used_entries_are_evicted():
+    cache = TranslationCache(max_entries=2)
+    await cache.set("a", "A")
+    await cache.set("b", "B")
+    assert await cache.get("a") == "A"  # "b" is now the oldest
+    await cache.set("c", "C")
+
+    assert await cache.get("b") is None
+    assert await cache.get("a") == "A" and await cache.get("c") == "C"
+    assert cache.stats()["evictions"] == 1
+
+async def test_entries_expire_after_the_ttl(clock):
+    cache = TranslationCache(ttl=60)
+    await cache.set("a", "A")
+    clock[0] += 59
+    assert await cache.get("a") == "A"
+    clock[0] += 2
+    assert await cache.get("a") is None
+    assert cache.stats()["entries"] == 0
+
+async def test_sqlite_store_survives_a_restart(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    cache = TranslationCache(max_entries=1, ttl=60, db_path=path)
+    await cache.set("a", "A")
+    await cache.set("b", "B")
+    # Evicted from memory, still served from the database
+    assert await cache.get("a") == "A"
+    cache.close()
+
+    restarted = TranslationCache(ttl=60, db_path=path)
+    assert restarted.stats()["persistent"]
+    assert await restarted.get("b") == "B"
+    clock[0] += 61
+    assert await restarted.get("a") is None
+    restarted.close()
+
+async def test_expired_rows_are_dropped_on_startup(tmp_path, clock):
+    path = str(tmp_path / "cache.db")
+    cache = TranslationCache(ttl=60, db_path=path)
+    await cache.set("a", "A")
+    cache.close()
+
+    clock[0] += 61
+    TranslationCache(ttl=60, db_path=path).close()
+    with sqlite3.connect(path) as db:
+        assert db.execute("SELECT COUNT(*) FROM translations").fetchone()[0] == 0
+
+async def test_closed_cache_keeps_serving_memory(tmp_path):
+    cache = TranslationCache(db_path=str(tmp_path / "cache.db"))
+    cache.close()
+    await cache.set("a", "A")
+    assert await cache.get("a") == "A"
+    assert not cache.stats()["persistent"]
@@ -0,0 +1,82 @@
+import fakeredis
+import pytest
+
+from app.services.room_backend import RoomBackend, RedisRoomBackend
+from app.services.vtt import VttService
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+def caption(ts, text="hello"):
+    return {"type": "caption", "language": "en", "translation": text, "ts": ts}
+
+def test_ended_rooms_are_kept_for_one_window():
+    service = VttService(segment_duration=6.0, window_segments=2)
+    epoch = service.start_room("room1", 0.0)
+    service.add_caption("room1", caption(1.0))
+    service.end_room("room1", epoch, 10.0)
+
+    stream = service.stream("room1", "en", 21.0)
+    assert stream is not None and stream.ended
+    assert b"#EXT-X-ENDLIST" in stream.playlist()[0]
+
+    assert service.stream("room1", "en", 22.0) is None
+    assert "room1" not in service.rooms and "room1" not in service.ended_at
+
+def test_ended_rooms_are_evicted_as_other_broadcasts_end():
+    service = VttService(segment_duration=6.0, window_segments=2)
+    first = service.start_room("room1", 0.0)
+    service.end_room("room1", first, 1.0)
+    second = service.start_room("room2", 5.0)
+    service.end_room("room2", second, 20.0)
+    assert set(service.rooms) == {"room2"}
+
+def test_new_broadcast_replaces_an_ended_room():
+    service = VttService(segment_duration=6.0, window_segments=2)
+    old = service.start_room("room1", 0.0)
+    service.end_room("room1", old, 1.0)
+    new = service.start_room("room1", 5.0)
+    service.add_caption("room1", caption(6.0))
+
+    # The old broadcast's window passing doesn't drop the new one
+    stream = service.stream("room1", "en", 30.0)
+    assert stream is not None and stream.epoch == new and not stream.ended
+
+def test_caption_with_an_earlier_timestamp_keeps_the_previous_cue():
+    service = VttService(segment_duration=6.0, window_segments=2)
+    epoch = service.start_room("room1", 0.0)
+    service.add_caption("room1", caption(3.0, "FIRST"))
+    service.add_caption("room1", caption(2.5, "SECOND"))
+    service.end_room("room1", epoch, 5.0)
+
+    stream = service.stream("room1", "en", 5.0)
+    body = b"".join(segment.body for segment in stream.segments).decode()
+    assert "FIRST" in body and "SECOND" in body
+    assert body.index("FIRST") < body.index("SECOND")
+
+@pytest.mark.anyio
+async def test_shared_segments_are_served_by_other_workers():
+    server = fakeredis.FakeServer()
+    broadcaster = RedisRoomBackend(client=fakeredis.aioredis.FakeRedis(server=server))
+    viewer = RedisRoomBackend(client=fakeredis.aioredis.FakeRedis(server=server))
+    service = VttService(segment_duration=6.0, window_segments=2)
+    epoch = service.start_room("room1", 0.0)
+    service.add_caption("room1", caption(1.0))
+
+    await service.share("room1", epoch, broadcaster, 7.0)
+    stream = service.stream("room1", "en", 7.0)
+    assert await viewer.vtt_file("room1", "en", "playlist.m3u8") == stream.playlist()[0]
+    assert await viewer.vtt_file("room1", "en", f"{epoch}/0.vtt") == stream.segment(0).body
+
+    # A finished broadcast's teardown doesn't share a newer one's streams
+    await service.share("room1", "older-broadcast", broadcaster, 20.0)
+    assert await viewer.vtt_file("room1", "en", f"{epoch}/1.vtt") is None
+
+    service.end_room("room1", epoch, 20.0)
+    await service.share("room1", epoch, broadcaster, 20.0)
+    assert b"#EXT-X-ENDLIST" in await viewer.vtt_file("room1", "en", "playlist.m3u8")
+    assert await viewer.vtt_file("room1", "en", f"{epoch}/3.vtt") == service.stream("room1", "en", 20.0).segment(3).body
+
+    # A single worker serves its rooms itself
+    assert await RoomBackend().vtt_file("room1", "en", "playlist.m3u8") is None
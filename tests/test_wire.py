@@ -0,0 +1,55 @@
+import json
+import re
+import types
+from pathlib import Path
+
+import msgpack
+
+from app.services.wire import (
+    FIELD_TAGS, FORMAT_COMPACT, FORMAT_JSON, TS_BASE, TYPE_TAGS, encode_compact, encode_json, negotiate,
+)
+
+WIRE_JS = Path(__file__).resolve().parent.parent / "static" / "js" / "wire.js"
+
+def socket(*subprotocols):
+    return types.SimpleNamespace(scope={"subprotocols": list(subprotocols)})
+
+def js_names(table):
+    source = re.search(rf"const {table} = \[(.*?)\];", WIRE_JS.read_text(), re.S).group(1)
+    return re.findall(r"'(\w*)'", source)
+
+def test_negotiate_picks_the_first_known_subprotocol():
+    assert negotiate(socket()) == (FORMAT_JSON, None)
+    assert negotiate(socket("other", "unbabel.msgpack", "unbabel.json")) == (FORMAT_COMPACT, "unbabel.msgpack")
+    assert negotiate(socket("unbabel.json", "unbabel.msgpack")) == (FORMAT_JSON, "unbabel.json")
+
+def test_json_is_compact_and_keeps_non_ascii_text():
+    text = encode_json({"type": "caption", "original": "안녕하세요", "seq": 3})
+    assert text == '{"type":"caption","original":"안녕하세요","seq":3}'
+    assert json.loads(text)["original"] == "안녕하세요"
+
+def test_compact_encoding_tags_fields_and_drops_none():
+    message = {
+        "type": "caption_history",
+        "since": 4,
+        "segment_id": None,
+        "new_field": "kept by name",
+        "captions": [{"type": "caption", "ts": TS_BASE + 1.5, "translation": "hello", "seq": 5}],
+    }
+    decoded = msgpack.unpackb(encode_compact(message), strict_map_key=False)
+    assert decoded == {
+        FIELD_TAGS["type"]: TYPE_TAGS["caption_history"],
+        FIELD_TAGS["since"]: 4,
+        "new_field": "kept by name",
+        FIELD_TAGS["captions"]: [{
+            FIELD_TAGS["type"]: TYPE_TAGS["caption"],
+            FIELD_TAGS["ts"]: 1500,
+            FIELD_TAGS["translation"]: "hello",
+            FIELD_TAGS["seq"]: 5,
+        }],
+    }
+
+def test_tag_tables_match_the_browser_decoder():
+    # Tags are positions in wire.js's tables; type 0 is unused there
+    assert js_names("TYPES") == [""] + sorted(TYPE_TAGS, key=TYPE_TAGS.get)
+    assert js_names("FIELDS") == sorted(FIELD_TAGS, key=FIELD_TAGS.get)